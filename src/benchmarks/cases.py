@@ -0,0 +1,295 @@
+import os
+import json
+import tempfile
+import functools
+from itertools import combinations
+import numpy as np
+import pandas as pd
+import Levenshtein
+
+from stats.games.registry import EVALUATOR_REGISTRY
+from stats.generator_stats import GeneratorStats
+from stats.pairwise_distances import PairwiseDistanceEngine, mean_distance
+from stats.diversity_archive import DiversityArchive, coverage_curve
+from stats.benchmark_session import normalize_matrix
+from stats.diversity_estimation import DiversitySettings
+from stats.level_corpus import LevelCorpus, CHUNK_SIZE
+from stats.games.mario.mario_synthetic_levels import SyntheticLevelSettings, generate_levels
+from stats.games.mario.mario_synthetic_simulation import SyntheticSimulator
+from stats.games.mario.mario_tiles import encode_levels
+import stats.games.mario.mario_visual_integrity as mario_visual_integrity
+import stats.games.mario.mario_characteristics as mario_characteristics
+import stats.games.mario.mario_batch_visual_integrity as mario_batch_visual_integrity
+import stats.games.mario.mario_batch_characteristics as mario_batch_characteristics
+
+from benchmarks.suite import BenchmarkCase, benchmark, quiet
+from benchmarks.fixtures import all_levels, recorded_simulations, RecordedSimulation, stand_in_simulator
+
+GAME_NAME = "Super Mario Bros"
+
+# Numbers of levels of the diversity benchmarks
+diversity_set_sizes = [50, 100, 200]
+
+# Set of levels of the end-to-end and storage benchmarks
+end_to_end_set = "levels_GAN"
+
+# Number of synthetic levels of the scale benchmarks
+scale_set_size = 2000
+
+# When False, the benchmarks that simulate levels use the recorded results instead of the simulator (see RecordedSimulation)
+use_real_simulator = False
+
+def evaluator():
+    return EVALUATOR_REGISTRY[GAME_NAME]
+
+@functools.cache
+def valid_levels():
+    """
+    Levels of the checked-in sets with valid characters and size, without the trailing newline.
+    """
+    game_evaluator = evaluator()
+    levels = [level[:-1] if level.endswith("\n") else level for level in all_levels()]
+    return [level for level in levels if game_evaluator.validate_characters(level) and game_evaluator.validate_size(level)]
+
+@functools.cache
+def valid_tiles():
+    game_evaluator = evaluator()
+    return encode_levels(valid_levels(), game_evaluator.num_rows, game_evaluator.num_cols)
+
+@functools.cache
+def playable_actions():
+    """
+    Recorded actions of the playable levels, sorted by level so the sets are the same in every run.
+    """
+    return [actions for _, (is_playable, actions) in sorted(recorded_simulations().items()) if is_playable and len(actions) > 0]
+
+@functools.cache
+def normalized_characteristics():
+    values = np.array([list(characteristics.values()) for characteristics in mario_batch_characteristics.evaluate_characteristics_batch(valid_tiles())], dtype=np.float64)
+    return normalize_matrix(values, values.min(axis=0), values.max(axis=0))
+
+def simulation():
+    return quiet() if use_real_simulator else RecordedSimulation()
+
+def evaluate_set(folder_name, parallelization, max_workers=None):
+    with simulation():
+        return GeneratorStats(os.path.join("levels", folder_name), parallelization, max_workers if max_workers is not None else os.cpu_count())
+
+@functools.cache
+def evaluated_set(folder_name):
+    """
+    GeneratorStats of a set of levels with its diversity and coverage, as saved in the initial stats.
+    """
+    with quiet():
+        generator_stats = evaluate_set(folder_name, False, 1)
+        with PairwiseDistanceEngine(1) as engine:
+            generator_stats.compute_content_diversity(engine)
+            generator_stats.compute_a_star_diversity(engine)
+    return generator_stats
+
+def reference_coverage(values, n_intervals):
+    # The set of covered cells of the original implementation of the diversity archive
+    covered_cells = set()
+    for row in values:
+        position = np.clip(np.floor(row * n_intervals), 0, n_intervals - 1)
+        covered_cells.add(tuple(position))
+    return len(covered_cells)
+
+def naive_mean_distance(sequences):
+    distances = [Levenshtein.distance(a, b) for a, b in combinations(sequences, 2)]
+    return sum(distances) / len(distances) if len(distances) > 0 else 0
+
+def compare_close(result, reference_result):
+    if len(result) != len(reference_result):
+        return f"{len(result)} results instead of {len(reference_result)}."
+    for i, (values, reference_values) in enumerate(zip(result, reference_result)):
+        if values.keys() != reference_values.keys():
+            return f"Different characteristics in level {i}."
+        if not np.allclose(list(values.values()), list(reference_values.values()), rtol=1e-9, atol=1e-12, equal_nan=True):
+            return f"Different characteristics in level {i}: {values} != {reference_values}."
+    return None
+
+def compare_mean(result, reference_result):
+    return None if abs(result - reference_result) <= 1e-9 * max(1, abs(reference_result)) else f"{result} != {reference_result}."
+
+def compare_tables(result, reference_result):
+    try:
+        pd.testing.assert_frame_equal(result, reference_result, check_dtype=False)
+    except AssertionError as e:
+        return str(e).splitlines()[0]
+    return None
+
+@benchmark("validation")
+def validation_cases():
+    game_evaluator = evaluator()
+    levels = [level[:-1] if level.endswith("\n") else level for level in all_levels()]
+    valid_characters = set(game_evaluator.get_valid_characters())
+
+    def validate():
+        return [(game_evaluator.validate_characters(level), game_evaluator.validate_size(level)) for level in levels]
+
+    def naive_validate():
+        results = []
+        for level in levels:
+            rows = level.splitlines()
+            results.append((all(character in valid_characters for row in rows for character in row), \
+                            len(rows) == game_evaluator.num_rows and all(len(row) == game_evaluator.num_cols for row in rows)))
+        return results
+
+    def prescreen():
+        return list(mario_batch_visual_integrity.prescreen_levels(levels, game_evaluator.num_rows, game_evaluator.num_cols)[0])
+
+    def naive_prescreen():
+        return [characters and size and mario_visual_integrity.validate_visual_integrity(level) for level, (characters, size) in zip(levels, naive_validate())]
+
+    return [
+        BenchmarkCase("validation/characters_and_size", validate, naive_validate),
+        BenchmarkCase("validation/prescreen", prescreen, naive_prescreen),
+    ]
+
+@benchmark("visual_integrity")
+def visual_integrity_cases():
+    game_evaluator = evaluator()
+    levels = valid_levels()
+
+    def reference():
+        return [mario_visual_integrity.validate_visual_integrity(level) for level in levels]
+
+    return [
+        BenchmarkCase("visual_integrity/batch", lambda: [bool(valid) for valid in mario_batch_visual_integrity.validate_visual_integrity_batch(valid_tiles())[0]], reference),
+        BenchmarkCase("visual_integrity/evaluator", lambda: [game_evaluator.validate_visual_integrity(game_evaluator.parse_level(level)) for level in levels], reference),
+        BenchmarkCase("visual_integrity/reference", reference),
+    ]
+
+@benchmark("characteristics")
+def characteristics_cases():
+    game_evaluator = evaluator()
+    levels = valid_levels()
+
+    def reference():
+        return [mario_characteristics.evaluate_characteristics(level) for level in levels]
+
+    return [
+        BenchmarkCase("characteristics/batch", lambda: mario_batch_characteristics.evaluate_characteristics_batch(valid_tiles()), reference, compare_close),
+        BenchmarkCase("characteristics/evaluator_batch", lambda: game_evaluator.evaluate_characteristics_batch([game_evaluator.parse_level(level) for level in levels]), reference, compare_close),
+        BenchmarkCase("characteristics/reference", reference),
+    ]
+
+@benchmark("diversity")
+def diversity_cases():
+    cases = []
+
+    for n in diversity_set_sizes:
+        levels = ["".join(level.splitlines()) for level in valid_levels()[:n]]
+        actions = playable_actions()[:n]
+
+        def content(levels=levels, workers=1):
+            with PairwiseDistanceEngine(workers) as engine:
+                return mean_distance(engine.pairwise_levenshtein(levels))
+
+        def a_star(actions=actions, workers=1):
+            with PairwiseDistanceEngine(workers) as engine:
+                return mean_distance(engine.pairwise_levenshtein(actions))
+
+        cases.append(BenchmarkCase(f"diversity/content_{len(levels)}", content, functools.partial(naive_mean_distance, levels), compare_mean))
+        cases.append(BenchmarkCase(f"diversity/a_star_{len(actions)}", a_star, functools.partial(naive_mean_distance, [list(sequence) for sequence in actions]), compare_mean))
+
+    # The parallel engine on the largest set, which must give the same distances
+    cases.append(BenchmarkCase(f"diversity/content_{len(levels)}_parallel", functools.partial(content, workers=os.cpu_count()), functools.partial(content, workers=1), compare_mean))
+
+    return cases
+
+@benchmark("coverage")
+def coverage_cases():
+    values = normalized_characteristics()
+    n_intervals = 10
+    resolutions = [5, 10, 20, 50]
+
+    def archive_coverage():
+        archive = DiversityArchive(n_intervals)
+        archive.add_values(values)
+        return archive.get_coverage()
+
+    return [
+        BenchmarkCase("coverage/archive", archive_coverage, lambda: reference_coverage(values, n_intervals)),
+        BenchmarkCase("coverage/curve", lambda: coverage_curve(values, resolutions), lambda: {resolution: reference_coverage(values, resolution) for resolution in resolutions}),
+        # A set without valid levels (its archive has no dimensions yet)
+        BenchmarkCase("coverage/curve_empty", lambda: coverage_curve(np.empty((0, 0)), resolutions), lambda: {resolution: 0 for resolution in resolutions}),
+    ]
+
+@benchmark("storage")
+def storage_cases():
+    generator_stats = evaluated_set(end_to_end_set)
+    output_folder = tempfile.mkdtemp(prefix="benchmark_stats_")
+    csv_path = os.path.join(output_folder, generator_stats.generator_name + "_stats.csv")
+    npz_path = os.path.join(output_folder, generator_stats.generator_name + "_stats.npz")
+
+    with quiet():
+        generator_stats.save(output_folder, formats=("csv", "npz"))
+
+    expected = generator_stats.levels_stats.to_dataframe()
+
+    return [
+        BenchmarkCase("storage/save_csv", lambda: generator_stats.save(output_folder, formats=("csv",))),
+        BenchmarkCase("storage/save_npz", lambda: generator_stats.save(output_folder, formats=("npz",))),
+        BenchmarkCase("storage/load_csv", lambda: GeneratorStats(csv_path, False, 1).levels_stats.to_dataframe(), lambda: expected, compare_tables),
+        BenchmarkCase("storage/load_npz", lambda: GeneratorStats(npz_path, False, 1).levels_stats.to_dataframe(), lambda: expected, compare_tables),
+    ]
+
+@benchmark("end_to_end")
+def end_to_end_cases():
+    def sequential():
+        return evaluate_set(end_to_end_set, False, 1).levels_stats.to_dataframe()
+
+    def parallel():
+        return evaluate_set(end_to_end_set, True).levels_stats.to_dataframe().sort_values("level_name", ignore_index=True)
+
+    return [
+        BenchmarkCase("end_to_end/sequential", sequential),
+        BenchmarkCase("end_to_end/parallel", parallel, lambda: sequential().sort_values("level_name", ignore_index=True), compare_tables),
+    ]
+
+@functools.cache
+def synthetic_corpus(n_levels):
+    """
+    Packed corpus of n_levels synthetic levels, with the expected results of the checks of every level.
+    """
+    levels, expected = zip(*generate_levels(n_levels, SyntheticLevelSettings(seed=0)))
+
+    folder_path = tempfile.mkdtemp(prefix="benchmark_synthetic_")
+    with open(os.path.join(folder_path, "properties.json"), "w") as f:
+        json.dump({"Generator Name": "Synthetic", "Game Name": GAME_NAME}, f)
+
+    game_evaluator = evaluator()
+    names = [f"level{i}.txt" for i in range(n_levels)]
+    chunks = (list(levels[start:start + CHUNK_SIZE]) for start in range(0, n_levels, CHUNK_SIZE))
+    LevelCorpus.write(folder_path, names, chunks, game_evaluator.valid_characters, game_evaluator.num_rows, game_evaluator.num_cols)
+
+    expected = pd.DataFrame(list(expected))
+    expected.insert(0, "level_name", names)
+    return folder_path, expected.sort_values("level_name", ignore_index=True)
+
+@benchmark("scale")
+def scale_cases():
+    folder_path, expected = synthetic_corpus(scale_set_size)
+    checks = list(expected.columns[1:])
+    diversity_settings = DiversitySettings(mode="sampled", sample_pairs=10000, seed=0)
+    resolutions = [5, 10, 20, 50]
+
+    def evaluate(parallelization):
+        with stand_in_simulator(SyntheticSimulator()):
+            return GeneratorStats(folder_path, parallelization, os.cpu_count() if parallelization else 1, diversity_settings = diversity_settings)
+
+    def results():
+        df = evaluate(True).levels_stats.to_dataframe()
+        return df[["level_name"] + checks].astype({check: bool for check in checks}).sort_values("level_name", ignore_index=True)
+
+    with quiet():
+        _, values = DiversityArchive(10).generator_values(evaluate(False))
+    values = normalize_matrix(values, values.min(axis=0), values.max(axis=0))
+
+    return [
+        BenchmarkCase(f"scale/generate_{scale_set_size}", lambda: len(list(generate_levels(scale_set_size, SyntheticLevelSettings(seed=0))))),
+        BenchmarkCase(f"scale/end_to_end_{scale_set_size}", results, lambda: expected, compare_tables),
+        BenchmarkCase(f"scale/coverage_curve_{scale_set_size}", lambda: coverage_curve(values, resolutions), lambda: {resolution: reference_coverage(values, resolution) for resolution in resolutions}),
+    ]
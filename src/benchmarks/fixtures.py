@@ -0,0 +1,90 @@
+import os
+import glob
+import functools
+from contextlib import contextmanager
+import pandas as pd
+
+import stats.games.mario.mario_simulation_data as mario_simulation_data
+from stats.generator_stats import iter_level_files
+from stats.action_sequences import parse_actions
+
+# Folders with the checked-in sets of levels and their initial stats (whose simulation results are replayed)
+levels_folder = "levels"
+initial_stats_folder = "initial_stats"
+
+# Number of levels taken from every set by the benchmarks of the per-level stages (None to take all of them)
+levels_per_set = 30
+
+@functools.cache
+def level_sets():
+    """
+    The checked-in sets of levels, as {folder name: [(level name, level), ...]} sorted by name.
+    """
+    sets = {}
+    for folder_path in sorted(glob.glob(os.path.join(levels_folder, "*"))):
+        if os.path.isdir(folder_path):
+            sets[os.path.basename(folder_path)] = sorted((level_path.split("/")[-1], level) for level_path, level in iter_level_files(folder_path))
+    return sets
+
+def all_levels():
+    """
+    The first levels_per_set levels of every checked-in set.
+    """
+    return [level for levels in level_sets().values() for _, level in levels[:levels_per_set]]
+
+@functools.cache
+def recorded_simulations():
+    """
+    Playability and actions of every level of the checked-in initial stats, as {level: (is_playable, actions)}.
+    """
+    simulations = {}
+    for stats_file in sorted(glob.glob(os.path.join(initial_stats_folder, "*_initial_stats.csv"))):
+        df = pd.read_csv(stats_file, comment="#")
+        for level, is_playable, actions in zip(df["level"], df["is_playable"], df["actions"]):
+            simulations[level.rstrip("\n")] = (bool(is_playable), parse_actions(actions if isinstance(actions, str) else ""))
+    return simulations
+
+class RecordedSimulation:
+    """
+    Stand-in simulator (see mario_simulation_data.stand_in_simulator) that replays the results recorded in the
+    checked-in initial stats while the block runs, so the rest of the pipeline can be measured without Java. Levels
+    without recorded results are reported as not playable (and counted in n_missing).
+    """
+    def __init__(self):
+        self.simulations = recorded_simulations()
+        self.n_missing = 0
+        self.original = None
+
+    def simulation_data(self, level_file, level=None):
+        if level is None:
+            with open(level_file, "r") as f:
+                level = f.read()
+
+        result = self.simulations.get(str(level).rstrip("\n"))
+        if result is None:
+            self.n_missing += 1
+            return False, parse_actions([])
+        return result
+
+    def checksum(self):
+        return "recorded"
+
+    def __enter__(self):
+        self.original = mario_simulation_data.stand_in_simulator
+        mario_simulation_data.stand_in_simulator = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        mario_simulation_data.stand_in_simulator = self.original
+
+@contextmanager
+def stand_in_simulator(simulator):
+    """
+    Simulates the levels with simulator (e.g. a SyntheticSimulator) while the block runs.
+    """
+    previous_simulator = mario_simulation_data.stand_in_simulator
+    mario_simulation_data.stand_in_simulator = simulator
+    try:
+        yield simulator
+    finally:
+        mario_simulation_data.stand_in_simulator = previous_simulator
@@ -0,0 +1,180 @@
+import os
+import io
+import json
+import time
+import platform
+import statistics
+import subprocess
+import contextlib
+
+# Ratio between the median time of a benchmark and the one of the previous run above which it is reported as slower
+regression_threshold = 1.25
+
+# Minimum duration (in seconds) of each measurement. Fast benchmarks are run several times per measurement
+min_measurement_time = 0.2
+
+class BenchmarkCase:
+    """
+    A fast path to time, with the reference implementation whose results it must reproduce.
+
+    Args:
+        name (str): Name of the benchmark, as "group/name".
+        run (callable): The code to time. It returns the result checked against the reference.
+        reference (callable): Reference implementation (None if the result is not checked).
+        compare (callable): Compares the results of run and reference, returning None if they are the same or a
+            message describing the difference (exact equality by default).
+    """
+    def __init__(self, name, run, reference=None, compare=None):
+        self.name = name
+        self.run = run
+        self.reference = reference
+        self.compare = compare if compare is not None else default_compare
+
+def default_compare(result, reference_result):
+    return None if result == reference_result else "The results are different."
+
+# Functions that receive no arguments and return the list of BenchmarkCase of every group (see the benchmark decorator)
+BENCHMARK_GROUPS = {}
+
+def benchmark(group):
+    """
+    Registers a function that builds the benchmark cases of a group. The cases are only built (e.g. their fixtures
+    loaded) when the group is run.
+    """
+    def register(function):
+        if group in BENCHMARK_GROUPS:
+            raise ValueError(f"Benchmark group {group} is already registered.")
+        BENCHMARK_GROUPS[group] = function
+        return function
+    return register
+
+def select_cases(patterns=None):
+    """
+    Builds the benchmark cases whose names contain any of the patterns (every case if None). The groups whose name
+    does not match a pattern that names a group (as "group" or "group/case") are not built.
+    """
+    groups = list(BENCHMARK_GROUPS)
+    if patterns:
+        named_groups = [group for group in groups if any(pattern.split("/")[0] == group for pattern in patterns)]
+        if len(named_groups) == len(patterns):
+            groups = named_groups
+
+    cases = []
+    for group in groups:
+        cases.extend(case for case in BENCHMARK_GROUPS[group]() if not patterns or any(pattern in case.name for pattern in patterns))
+    return cases
+
+@contextlib.contextmanager
+def quiet():
+    # Progress bars and messages of the pipeline are hidden while it is measured
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+def measure(function, repeat, min_time=min_measurement_time):
+    """
+    Times a function: each of the repeat measurements runs it as many times as needed to last min_time.
+
+    Returns:
+        dict: The minimum, median and mean time (in seconds) of one call, and the number of calls per measurement.
+    """
+    with quiet():
+        start = time.perf_counter()
+        function()
+        first_time = time.perf_counter() - start
+
+        number = max(1, int(min_time / first_time)) if first_time > 0 else 1000
+
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                function()
+            times.append((time.perf_counter() - start) / number)
+
+    return {"min": min(times), "median": statistics.median(times), "mean": statistics.fmean(times), "number": number, "repeat": repeat}
+
+def check(case):
+    """
+    Runs the fast path and the reference of a case, returning None if they agree or the description of the difference.
+    """
+    if case.reference is None:
+        return None
+
+    with quiet():
+        result = case.run()
+        reference_result = case.reference()
+
+    return case.compare(result, reference_result)
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+def machine_id():
+    """
+    Identifier of the machine and the Python version, since times are only comparable on the same ones.
+    """
+    return f"{platform.node()}|{platform.machine()}|{os.cpu_count()}|{platform.python_version()}"
+
+class BenchmarkHistory:
+    """
+    History of benchmark runs, stored as one JSON document per line (the most recent at the end).
+
+    Args:
+        path (str): Path of the history file.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def runs(self):
+        if not os.path.exists(self.path):
+            return []
+
+        runs = []
+        with open(self.path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    runs.append(json.loads(line))
+                except ValueError:
+                    print(f"WARNING: Invalid line in the benchmark history {self.path}.")
+        return runs
+
+    def previous_results(self, machine):
+        """
+        Latest result of every benchmark measured on the machine, with the commit where it was measured.
+        """
+        results = {}
+        for run in self.runs():
+            if run.get("machine") != machine:
+                continue
+            for name, result in run["results"].items():
+                results[name] = result | {"commit": run.get("commit")}
+        return results
+
+    def append(self, run):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(run) + "\n")
+
+def find_regressions(results, previous_results, threshold=regression_threshold):
+    """
+    Returns (name, ratio, previous commit) for every benchmark whose median time is more than threshold times the
+    median time of its previous run.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = previous_results.get(name)
+        if previous is None or previous["median"] <= 0:
+            continue
+
+        ratio = result["median"] / previous["median"]
+        if ratio > threshold:
+            regressions.append((name, ratio, previous.get("commit")))
+    return regressions
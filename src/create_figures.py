@@ -144,6 +144,27 @@ def make_evaluation(stats, evaluation_info, output_folder):
     # Save the plot
     plt.savefig(os.path.join(output_folder, evaluation_name, "grouped_plot.eps"), format='eps')
 
+    # Plot the coverage for every number of intervals per dimension, if it has been computed
+    curve_stats = [stat for stat in evaluation_stats if stat.coverage_curve is not None]
+    if len(curve_stats) > 0:
+        fig, ax = plt.subplots(figsize=(10, 6))
+
+        # Define marker styles for each generator
+        markers = ['o', 's', '^', 'D', 'v', 'x', '*', 'P', 'h', '+']
+
+        for i, stat in enumerate(curve_stats):
+            resolutions = sorted(stat.coverage_curve.keys())
+            ax.plot(resolutions, [stat.coverage_curve[resolution] for resolution in resolutions], marker=markers[i % len(markers)], label=stat.generator_name)
+
+        ax.set_xlabel("Intervalos por dimensión", fontsize=16)
+        ax.set_ylabel("Celdas cubiertas", fontsize=16)
+        ax.set_yscale("log")
+        ax.legend(title="Generador", fontsize=12, title_fontsize=14)
+        ax.tick_params(axis='both', labelsize=14)
+        plt.tight_layout()
+
+        plt.savefig(os.path.join(output_folder, evaluation_name, "coverage_curve.eps"), format='eps')
+
 def create_figures(all_stats):
     print("\nCreating figures...")
 
@@ -1,10 +1,25 @@
 import os
 import sys
 import argparse
-import math
 import psutil
-
-from stats.generator_stats import GeneratorStats
+from contextlib import nullcontext
+
+import stats.simulation_orchestrator as simulation_orchestrator
+import stats.evaluation_scheduler as evaluation_scheduler
+import stats.profiling as profiling
+import stats.games.mario.mario_simulation_data as mario_simulation_data
+
+from stats.generator_stats import GeneratorStats, iter_level_files
+from stats.games.registry import EVALUATOR_REGISTRY
+from stats.level_manifest import build_manifest, manifest_from_table, manifest_path, load_manifest, save_manifest, compare_manifests
+from stats.evaluation_cache import EvaluationCache
+from stats.diversity_estimation import DiversitySettings
+from stats.distance_store import DistanceStore
+from stats.normalization import normalize_generators, stream_normalization
+from stats.evaluation_scheduler import EvaluationScheduler
+from stats.autoscaler import Autoscaler
+from stats.profiling import Profile
+from stats.games.mario.mario_synthetic_simulation import SyntheticSimulator
 from create_figures import create_figures
 
 def compute_max_workers_dynamic(ram_per_worker_mb=512, max_ram_usage=0.75, cpu_factor=0.75, max_workers=None):
@@ -64,6 +79,30 @@ if __name__ == "__main__":
     parser.add_argument("--do_not_use_parallelization", action='store_true', help="Deactivate the parallelization.")
     parser.add_argument("--max_workers", type=int, default=None, help="Set the maximum number of workers to use in the parallelization.")
     parser.add_argument("--create_figures", action='store_true', help="Create the figures for the evaluation.")
+    parser.add_argument("--diversity_mode", choices=["exact", "sampled"], default="exact", help="Compute the diversity from every pair of levels (exact) or estimate it from random pairs (sampled).")
+    parser.add_argument("--diversity_sample_pairs", type=int, default=None, help="Maximum number of random pairs used to estimate each diversity in the sampled mode.")
+    parser.add_argument("--diversity_ci_width", type=float, default=None, help="Stop sampling pairs when the confidence interval of the diversity is narrower than this width.")
+    parser.add_argument("--diversity_confidence", type=float, default=0.95, help="Confidence level of the interval of the sampled diversity.")
+    parser.add_argument("--stats_format", choices=["csv", "npz", "both"], default="both", help="Format of the stats files: CSV (export format), columnar .npz (fast to load with --continue_evaluation) or both.")
+    parser.add_argument("--do_not_use_cache", action='store_true', help="Deactivate the cache of per-level evaluation results.")
+    parser.add_argument("--cache_path", type=str, default=os.path.join(".cache", "evaluation_cache.sqlite"), help="Path of the cache of per-level evaluation results.")
+    parser.add_argument("--cache_max_size_mb", type=float, default=1024, help="Maximum size (in MB) of the cache of per-level evaluation results.")
+    parser.add_argument("--coverage_resolutions", type=int, nargs="+", default=None, help="Also compute the coverage for these numbers of intervals per dimension (e.g. 5 10 20 50), from the same normalized characteristics.")
+    parser.add_argument("--streaming_normalization", action='store_true', help="Normalize the stats loading one generator at a time from the initial_stats folder, for evaluations that do not fit in memory.")
+    parser.add_argument("--concurrent_generators", type=int, default=evaluation_scheduler.concurrent_generators, help="Number of sets of levels evaluated at the same time with the parallelization, sharing the same pools of workers.")
+    parser.add_argument("--autoscale", action='store_true', help="Change the number of levels evaluated at the same time during the run, according to the memory and the CPU used.")
+    parser.add_argument("--autoscale_max_workers", type=int, default=None, help="Maximum number of levels evaluated at the same time with --autoscale (by default, the number of CPU cores).")
+    parser.add_argument("--autoscale_memory_ceiling_mb", type=float, default=None, help="Maximum memory (in MB) of the program and its simulation processes with --autoscale (by default, 85%% of the total RAM).")
+    parser.add_argument("--autoscale_target_cpu", type=float, default=0.9, help="Target CPU utilisation (between 0 and 1) with --autoscale.")
+    parser.add_argument("--autoscale_log", type=str, default=None, help="CSV file where the decisions of --autoscale are logged.")
+    parser.add_argument("--simulation_timeout", type=float, default=simulation_orchestrator.timeout, help="Maximum time (in seconds) of the simulation of a level. Levels whose simulation takes longer are marked as timed out. 0 means no limit.")
+    parser.add_argument("--simulation_retries", type=int, default=simulation_orchestrator.max_retries, help="Number of times a simulation process that fails is launched again.")
+    parser.add_argument("--simulation_memory_budget_mb", type=float, default=None, help="Memory (in MB) that all the simulation processes can use at the same time, each one counted at its maximum heap size. By default, 75%% of the available RAM.")
+    parser.add_argument("--profile", action='store_true', help="Record the wall and CPU time of every stage of the evaluation and the cost of every level, and save them in the folder \"profiles\".")
+    parser.add_argument("--distance_store_path", type=str, default=os.path.join(".cache", "distances"), help="Folder where the pairwise distances of each set of levels are stored, so only the pairs with new or changed levels are computed again.")
+    parser.add_argument("--synthetic_simulator", action='store_true', help="Simulate the levels with a deterministic synthetic simulator instead of the Java one, to test the evaluation at scale without Java.")
+    parser.add_argument("--synthetic_simulation_latency", type=float, default=0.0, help="Seconds that every simulation of the synthetic simulator takes.")
+    parser.add_argument("--synthetic_action_length", type=int, nargs=2, default=[200, 240], metavar=("MIN", "MAX"), help="Minimum and maximum number of actions of the playable levels with the synthetic simulator.")
     args = parser.parse_args()
 
     use_parallelization = False if args.do_not_use_parallelization else True
@@ -76,6 +115,26 @@ if __name__ == "__main__":
     else:
         max_workers = None
 
+    # Settings of the simulation processes
+    simulation_orchestrator.timeout = args.simulation_timeout if args.simulation_timeout > 0 else None
+    simulation_orchestrator.max_retries = args.simulation_retries
+    simulation_orchestrator.memory_budget_mb = args.simulation_memory_budget_mb
+
+    if args.synthetic_simulator:
+        try:
+            mario_simulation_data.stand_in_simulator = SyntheticSimulator(latency = args.synthetic_simulation_latency, min_actions = args.synthetic_action_length[0], max_actions = args.synthetic_action_length[1])
+        except ValueError as e:
+            print(f"ERROR: Invalid settings of the synthetic simulator: {e}")
+            sys.exit(1)
+        print("Levels are simulated with the synthetic simulator.")
+
+    cache = None if args.do_not_use_cache else EvaluationCache(args.cache_path, args.cache_max_size_mb)
+    distance_store = None if args.do_not_use_cache else DistanceStore(args.distance_store_path)
+
+    stats_formats = ("csv", "npz") if args.stats_format == "both" else (args.stats_format,)
+
+    diversity_settings = DiversitySettings(mode=args.diversity_mode, sample_pairs=args.diversity_sample_pairs, ci_width=args.diversity_ci_width, confidence=args.diversity_confidence)
+
     # Create the output folder for initial stats (raw characteristics, content diversity and A* diversity)
     output_folder_initial_stats = "initial_stats"
     make_dir(output_folder_initial_stats)
@@ -88,14 +147,36 @@ if __name__ == "__main__":
     output_folder_final_stats = "final_stats"
     make_dir(output_folder_final_stats)
 
+    # Create the output folder for the profiles of the evaluation (wall and CPU time of every stage)
+    output_folder_profiles = "profiles"
+    run_profile = None
+    if args.profile:
+        profiling.enabled = True
+        make_dir(output_folder_profiles)
+        run_profile = Profile("run")
+
     input_folder = "levels" # Folder where the different folders of levels are stored
     levels_folders = [folder for folder in os.listdir(input_folder) if os.path.isdir(os.path.join(input_folder, folder))]
 
     all_stats = []
+    initial_stats_files = [] # Stats files normalized in the streaming mode
 
     if args.continue_evaluation:
-        stats_files = [f for f in os.listdir(output_folder_initial_stats) if f.endswith(".csv")]
-        for stats_file in stats_files:
+        # Columnar .npz files are preferred, since they load much faster than the CSV files of the same generator,
+        # unless the CSV file is newer (e.g. written by a later run with --stats_format csv)
+        stats_files = {}
+        for f in sorted(os.listdir(output_folder_initial_stats)):
+            name, extension = os.path.splitext(f)
+            if extension == ".npz" or (extension == ".csv" and name not in stats_files):
+                stats_files[name] = f
+
+        for name, f in stats_files.items():
+            csv_path = os.path.join(output_folder_initial_stats, name + ".csv")
+            if f.endswith(".npz") and os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(os.path.join(output_folder_initial_stats, f)):
+                print(f"WARNING: {name}.csv is newer than {f}. The stats are loaded from the CSV file.")
+                stats_files[name] = name + ".csv"
+
+        for stats_file in stats_files.values():
             print("\nLoading stats from " + stats_file + "...")
 
             generator_stats = GeneratorStats(os.path.join(output_folder_initial_stats, stats_file), use_parallelization, max_workers)
@@ -103,77 +184,117 @@ if __name__ == "__main__":
             if generator_stats.ignore:
                 continue
 
+            # Evaluate again the levels of the folder that are new or have changed since the stats were saved, and
+            # drop the deleted ones (the manifest is derived from the stats if they were saved without it)
+            generator_manifest_path = manifest_path(output_folder_initial_stats, generator_stats.generator_name)
+            stored_manifest = load_manifest(generator_manifest_path)
+
+            if os.path.isdir(generator_stats.folder_path):
+                current_manifest = build_manifest((level_path.split("/")[-1], level) for level_path, level in iter_level_files(generator_stats.folder_path))
+                changed, deleted = compare_manifests(stored_manifest if stored_manifest is not None else manifest_from_table(generator_stats.levels_stats), current_manifest)
+
+                # The levels whose simulation timed out or failed are simulated again, since both can be transient
+                changed_names = set(changed)
+                incomplete = generator_stats.levels_stats.flag("timed_out") | generator_stats.levels_stats.flag("simulation_failed")
+                incomplete_levels = [level_name for level_name, is_incomplete in zip(generator_stats.levels_stats.level_names, incomplete) \
+                             if is_incomplete and level_name in current_manifest and level_name not in changed_names]
+
+                if len(changed) > 0 or len(deleted) > 0 or len(incomplete_levels) > 0:
+                    print(f"{len(changed)} new or changed levels, {len(incomplete_levels)} timed-out or failed levels and {len(deleted)} deleted levels in {generator_stats.folder_path}. Only the new, changed, timed-out and failed levels are evaluated.")
+
+                    generator_stats = GeneratorStats(generator_stats.folder_path, use_parallelization, max_workers, cache, diversity_settings, distance_store, previous_stats = generator_stats, previous_manifest = stored_manifest, \
+                                                     partial_stats_folder = output_folder_initial_stats)
+
+                    if generator_stats.ignore:
+                        continue
+
+                    generator_stats.save(output_folder_initial_stats, "_initial_stats", stats_formats)
+                    generator_stats.remove_partial_stats()
+                    generator_stats.save_profile(output_folder_profiles)
+                    stats_file = generator_stats.generator_name + "_initial_stats." + ("npz" if "npz" in stats_formats else "csv")
+
+                if len(changed) > 0 or len(deleted) > 0 or stored_manifest is None:
+                    save_manifest(generator_manifest_path, current_manifest)
+            else:
+                print(f"WARNING: Folder {generator_stats.folder_path} not found. The stats of generator {generator_stats.generator_name} are used as they are.")
+
+            # Store the stats loaded from a CSV file as a .npz file too, so they load faster the next time
+            if stats_file.endswith(".csv") and "npz" in stats_formats:
+                generator_stats.save(output_folder_initial_stats, "_initial_stats", ("npz",))
+                stats_file = os.path.splitext(stats_file)[0] + ".npz"
+
+            if args.streaming_normalization:
+                generator_stats.release_levels()
+                initial_stats_files.append(os.path.join(output_folder_initial_stats, stats_file))
+
             all_stats.append(generator_stats)
 
             print("Stats loaded successfully for generator " + generator_stats.generator_name + ".")
 
     folders_already_evaluated = [generator_stats.folder_path for generator_stats in all_stats]
 
+    folders_to_evaluate = []
     for levels_folder in levels_folders:
         if args.continue_evaluation and os.path.join(input_folder, levels_folder) in folders_already_evaluated:
             continue
 
-        generator_stats = GeneratorStats(os.path.join(input_folder, levels_folder), use_parallelization, max_workers)
+        folders_to_evaluate.append(os.path.join(input_folder, levels_folder))
 
-        if generator_stats.ignore:
-            continue
+    # With the parallelization, every set of levels is evaluated with the pools of a run-wide scheduler, so the end of
+    # one set overlaps with the start of the next. The results are still processed in the order of the folders
+    autoscaler = None
+    if use_parallelization and args.autoscale:
+        memory_ceiling_mb = args.autoscale_memory_ceiling_mb if args.autoscale_memory_ceiling_mb is not None else psutil.virtual_memory().total * 0.85 / 1024 ** 2
+        # The simulators kept alive (e.g. the JVM workers) follow the limit, so shrinking it releases their memory
+        def limit_simulators(limit):
+            for evaluator in EVALUATOR_REGISTRY.values():
+                evaluator.limit_simulators(limit)
+
+        autoscaler = Autoscaler(max_workers, args.autoscale_max_workers or os.cpu_count() or 1, memory_ceiling_mb, args.autoscale_target_cpu, args.autoscale_log, \
+                                on_limit_change = limit_simulators)
+
+    with EvaluationScheduler(max_workers, args.concurrent_generators, autoscaler) if use_parallelization else nullcontext() as scheduler:
+        def evaluate_folder(folder_path):
+            return GeneratorStats(folder_path, use_parallelization, max_workers, cache, diversity_settings, distance_store, scheduler, partial_stats_folder = output_folder_initial_stats)
+
+        for generator_stats in (scheduler.map_generators(evaluate_folder, folders_to_evaluate) if scheduler is not None else map(evaluate_folder, folders_to_evaluate)):
+            if generator_stats.ignore:
+                continue
+
+            # Add the generator stats to the list
+            all_stats.append(generator_stats)
+
+            generator_stats.save(output_folder_initial_stats, "_initial_stats", stats_formats)
+            generator_stats.remove_partial_stats()
+            generator_stats.save_profile(output_folder_profiles)
+            save_manifest(manifest_path(output_folder_initial_stats, generator_stats.generator_name), generator_stats.manifest)
 
-        # Add the generator stats to the list
-        all_stats.append(generator_stats)
-
-        generator_stats.save(output_folder_initial_stats, "_initial_stats")
-
-    # Take the min and max values from characteristics of all generators stats, so that they can be normalized
-    min_values = {}
-    max_values = {}
-
-    for generator_stats in all_stats:
-        for level_stats in generator_stats.levels_stats:
-            for stat, value in level_stats.characteristics.items():
-                if math.isnan(value):
-                    continue
-
-                if stat not in min_values or value < min_values[stat]:
-                    min_values[stat] = value
-                if stat not in max_values or value > max_values[stat]:
-                    max_values[stat] = value
-
-    #print(f"\nMin values: {min_values}")
-    #print(f"\nMax values: {max_values}")
-
-    # Normalize the generators stats except the diversity values and compute the coverage
-    for generator_stats in all_stats:
-        generator_stats.normalize_characteristics(min_values, max_values)
-        generator_stats.compute_coverage()
-        generator_stats.save(output_folder_intermediate_stats, "_intermediate_stats")
-
-    # Take the min and max values from all diversity values, so that they can be normalized
-    min_content_diversity = min([generator_stats.content_diversity for generator_stats in all_stats])
-    max_content_diversity = max([generator_stats.content_diversity for generator_stats in all_stats])
-    min_a_star_diversity = min([generator_stats.a_star_diversity for generator_stats in all_stats])
-    max_a_star_diversity = max([generator_stats.a_star_diversity for generator_stats in all_stats])
-    min_coverage = min([generator_stats.coverage for generator_stats in all_stats])
-    max_coverage = max([generator_stats.coverage for generator_stats in all_stats])
-
-    '''print("\nMin content diversity: " + str(min_content_diversity))
-    print("Max content diversity: " + str(max_content_diversity))
-    print("Min A* diversity: " + str(min_a_star_diversity))
-    print("Max A* diversity: " + str(max_a_star_diversity))
-    print("Min coverage: " + str(min_coverage))
-    print("Max coverage: " + str(max_coverage))'''
-
-    # Normalize the diversity values and save the normalized stats
-    for i, generator_stats in enumerate(all_stats):
-        generator_stats.normalize_diversity(min_content_diversity, max_content_diversity, min_a_star_diversity, max_a_star_diversity, min_coverage, max_coverage)
-
-        # Save the generator stats
-        generator_stats.save(output_folder_final_stats, "_final_stats")
+            if args.streaming_normalization:
+                generator_stats.release_levels()
+                initial_stats_files.append(os.path.join(output_folder_initial_stats, generator_stats.generator_name + "_initial_stats." + ("npz" if "npz" in stats_formats else "csv")))
+
+    # The stages after the evaluation of the levels are recorded in the profile of the run
+    with profiling.activate(run_profile), profiling.stage("normalization"):
+        if args.streaming_normalization:
+            # Only one generator is loaded at a time, reading its initial stats again from disk
+            all_stats = stream_normalization(initial_stats_files, output_folder_intermediate_stats, output_folder_final_stats, stats_formats, use_parallelization, max_workers, args.coverage_resolutions)
+        else:
+            normalize_generators(all_stats, output_folder_intermediate_stats, output_folder_final_stats, stats_formats, args.coverage_resolutions)
 
     print("\nEvaluation finished successfully.")
 
+    if cache is not None:
+        cache.evict()
+        cache.report()
+
     if args.create_figures:
-        create_figures(all_stats)
+        with profiling.activate(run_profile), profiling.stage("figures"):
+            create_figures(all_stats)
     else:
         print("\nWARNING: Figures not created. Use --create_figures to create them.")
 
+    if run_profile is not None:
+        run_profile.save(output_folder_profiles)
+        print(f"\nProfiles saved in the folder '{output_folder_profiles}'.")
+
     print("\nProgram finished successfully.")
\ No newline at end of file
@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import time
+import argparse
+import pandas as pd
+from tqdm import tqdm
+
+from stats.games.registry import EVALUATOR_REGISTRY
+from stats.level_corpus import LevelCorpus, CHUNK_SIZE
+from stats.games.mario.mario_synthetic_levels import SyntheticLevelSettings, generate_levels
+
+GAME_NAME = "Super Mario Bros"
+
+def timed_chunks(levels, n_levels, generation_times, expected_counts):
+    """
+    Groups the generated levels in chunks of CHUNK_SIZE, recording the time (in nanoseconds) each one took to be
+    generated and how many levels pass each check.
+    """
+    chunk = []
+    start = time.perf_counter_ns()
+
+    for level, expected in tqdm(levels, total=n_levels, desc="Generating levels", ncols=80):
+        generation_times.append(time.perf_counter_ns() - start)
+        for check, passed in expected.items():
+            expected_counts[check] += passed
+
+        chunk.append(level)
+        if len(chunk) == CHUNK_SIZE:
+            yield chunk
+            chunk = []
+        start = time.perf_counter_ns()
+
+    if chunk:
+        yield chunk
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a set of synthetic Super Mario Bros levels with controlled proportions of valid, visually correct and playable levels, to test the evaluation at scale.")
+    parser.add_argument("output_folder", type=str, help="Folder where the set of levels is written (e.g. levels/synthetic).")
+    parser.add_argument("--n_levels", type=int, default=1000, help="Number of levels.")
+    parser.add_argument("--valid_rate", type=float, default=0.9, help="Fraction of levels with valid characters and size.")
+    parser.add_argument("--visual_integrity_rate", type=float, default=0.9, help="Fraction of the levels with valid characters and size that have visual integrity.")
+    parser.add_argument("--playable_rate", type=float, default=0.5, help="Fraction of the levels with visual integrity that are playable for the synthetic simulator.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generator.")
+    parser.add_argument("--generator_name", type=str, default=None, help="Generator name written in properties.json (by default, the name of the output folder).")
+    parser.add_argument("--packed", action='store_true', help="Write the levels as a packed corpus instead of one .txt file per level (recommended for large sets).")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output_folder) and os.listdir(args.output_folder):
+        print(f"ERROR: Output folder '{args.output_folder}' is not empty. Exiting...")
+        sys.exit(1)
+
+    if args.n_levels < 1:
+        print("ERROR: --n_levels must be at least 1. Exiting...")
+        sys.exit(1)
+
+    evaluator = EVALUATOR_REGISTRY[GAME_NAME]
+
+    try:
+        settings = SyntheticLevelSettings(num_rows=evaluator.num_rows, num_cols=evaluator.num_cols, valid_rate=args.valid_rate, visual_integrity_rate=args.visual_integrity_rate, \
+                                          playable_rate=args.playable_rate, seed=args.seed)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    names = [f"level{i}.txt" for i in range(args.n_levels)]
+    generation_times = []
+    expected_counts = {"has_valid_characters": 0, "has_valid_size": 0, "has_visual_integrity": 0, "is_playable": 0}
+    chunks = timed_chunks(generate_levels(args.n_levels, settings), args.n_levels, generation_times, expected_counts)
+
+    os.makedirs(args.output_folder, exist_ok=True)
+
+    generator_name = args.generator_name if args.generator_name is not None else os.path.basename(os.path.normpath(args.output_folder))
+    with open(os.path.join(args.output_folder, "properties.json"), "w") as f:
+        json.dump({"Generator Name": generator_name, "Game Name": GAME_NAME}, f, indent=4)
+
+    if args.packed:
+        LevelCorpus.write(args.output_folder, names, chunks, evaluator.valid_characters, evaluator.num_rows, evaluator.num_cols, generation_times)
+    else:
+        start = 0
+        for chunk in chunks:
+            for name, level in zip(names[start:start + len(chunk)], chunk):
+                with open(os.path.join(args.output_folder, name), "w") as f:
+                    f.write(level)
+            start += len(chunk)
+
+        pd.DataFrame({"level_name": names, "generation_time": generation_times}).to_csv(os.path.join(args.output_folder, "times.csv"), index=False)
+
+    print(f"\n{args.n_levels} levels written into {args.output_folder}.")
+    for check, count in expected_counts.items():
+        print(f"  - {check}: {count} ({count / args.n_levels:.1%})")
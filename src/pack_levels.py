@@ -0,0 +1,45 @@
+import os
+import sys
+import json
+import argparse
+
+from stats.games.registry import EVALUATOR_REGISTRY
+from stats.level_corpus import LevelCorpus, is_corpus
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a set of levels between the folder layout (one .txt file per level) and the packed corpus layout.")
+    parser.add_argument("input_folder", type=str, help="Folder of the set of levels to convert.")
+    parser.add_argument("output_folder", type=str, help="Folder where the converted set of levels is written.")
+    parser.add_argument("--unpack", action='store_true', help="Convert a packed corpus back into one .txt file per level.")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output_folder) and os.listdir(args.output_folder):
+        print(f"ERROR: Output folder '{args.output_folder}' is not empty. Exiting...")
+        sys.exit(1)
+
+    if args.unpack:
+        if not is_corpus(args.input_folder):
+            print(f"ERROR: '{args.input_folder}' is not a packed corpus. Exiting...")
+            sys.exit(1)
+
+        corpus = LevelCorpus(args.input_folder)
+        corpus.unpack(args.output_folder)
+    else:
+        properties_file = os.path.join(args.input_folder, "properties.json")
+        if not os.path.exists(properties_file):
+            print(f"ERROR: properties.json not found in {args.input_folder}. Exiting...")
+            sys.exit(1)
+
+        with open(properties_file, 'r') as f:
+            properties = json.load(f)
+
+        game_name = properties.get("Game Name")
+        if game_name not in EVALUATOR_REGISTRY:
+            print(f"ERROR: Game '{game_name}' is not registered. Exiting...")
+            sys.exit(1)
+
+        # Levels are packed with the valid characters and the size registered for the game
+        evaluator = EVALUATOR_REGISTRY[game_name]
+        corpus = LevelCorpus.pack(args.input_folder, args.output_folder, evaluator.valid_characters, evaluator.num_rows, evaluator.num_cols)
+
+    print(f"\n{len(corpus)} levels converted into {args.output_folder}.")
@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import argparse
+
+import benchmarks.suite as suite
+import benchmarks.cases as cases
+
+from benchmarks.suite import BenchmarkHistory, select_cases, measure, check, find_regressions, git_revision, machine_id
+
+def format_time(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.3f} s"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the evaluation pipeline on the checked-in sets of levels, check every fast path against its reference implementation and compare the times with the previous run.")
+    parser.add_argument("--filter", type=str, nargs="+", default=None, help="Only run the benchmarks whose names contain any of these patterns (e.g. diversity storage/load).")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of measurements of every benchmark.")
+    parser.add_argument("--min_time", type=float, default=suite.min_measurement_time, help="Minimum duration (in seconds) of each measurement.")
+    parser.add_argument("--history", type=str, default=os.path.join(".benchmarks", "history.jsonl"), help="File where the results of every run are appended.")
+    parser.add_argument("--no_history", action='store_true', help="Do not append the results of this run to the history.")
+    parser.add_argument("--threshold", type=float, default=suite.regression_threshold, help="Ratio between the median time and the one of the previous run above which a benchmark is reported as slower.")
+    parser.add_argument("--fail_on_regression", action='store_true', help="Exit with an error if a benchmark is slower than in the previous run.")
+    parser.add_argument("--skip_checks", action='store_true', help="Do not compare the results of the fast paths with their reference implementations.")
+    parser.add_argument("--scale_levels", type=int, default=cases.scale_set_size, help="Number of synthetic levels of the scale benchmarks.")
+    parser.add_argument("--real_simulator", action='store_true', help="Simulate the levels with the simulator instead of replaying the results recorded in the folder \"initial_stats\".")
+    args = parser.parse_args()
+
+    if args.repeat < 1:
+        print("ERROR: --repeat must be at least 1. Exiting...")
+        sys.exit(1)
+
+    cases.use_real_simulator = args.real_simulator
+    cases.scale_set_size = args.scale_levels
+
+    benchmark_cases = select_cases(args.filter)
+    if len(benchmark_cases) == 0:
+        print("ERROR: No benchmark matches the filter. Exiting...")
+        sys.exit(1)
+
+    history = BenchmarkHistory(args.history)
+    machine = machine_id()
+    previous_results = history.previous_results(machine)
+
+    results = {}
+    failed_checks = []
+    for case in benchmark_cases:
+        if not args.skip_checks:
+            difference = check(case)
+            if difference is not None:
+                print(f"ERROR: {case.name} does not match its reference implementation: {difference}")
+                failed_checks.append(case.name)
+
+        results[case.name] = measure(case.run, args.repeat, args.min_time)
+
+        previous = previous_results.get(case.name)
+        change = f" ({results[case.name]['median'] / previous['median']:.2f}x)" if previous is not None and previous["median"] > 0 else ""
+        print(f"{case.name:<45} median {format_time(results[case.name]['median']):>10}   min {format_time(results[case.name]['min']):>10}{change}")
+
+    commit, dirty = git_revision()
+    if not args.no_history:
+        history.append({"commit": commit, "dirty": dirty, "timestamp": time.time(), "machine": machine, "results": results, "failed_checks": failed_checks})
+        print(f"\nResults appended to {args.history}.")
+
+    regressions = find_regressions(results, previous_results, args.threshold)
+    for name, ratio, previous_commit in regressions:
+        print(f"WARNING: {name} is {ratio:.2f} times slower than in the previous run (commit {previous_commit}).")
+
+    if failed_checks:
+        print(f"ERROR: {len(failed_checks)} benchmarks do not match their reference implementations.")
+        sys.exit(1)
+
+    if regressions and args.fail_on_regression:
+        print(f"ERROR: {len(regressions)} benchmarks are slower than in the previous run.")
+        sys.exit(1)
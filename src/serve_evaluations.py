@@ -0,0 +1,82 @@
+import os
+import sys
+import argparse
+
+import stats.simulation_orchestrator as simulation_orchestrator
+import stats.evaluation_server as evaluation_server
+import stats.games.mario.mario_simulation_data as mario_simulation_data
+
+from stats.evaluation_server import EvaluationServer, create_http_server
+from stats.evaluation_cache import EvaluationCache
+from stats.games.mario.mario_synthetic_simulation import SyntheticSimulator
+from evaluate_levels import compute_max_workers_dynamic
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local server that evaluates the levels submitted by other programs, keeping the evaluators and the simulation workers ready between requests.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address where the server listens.")
+    parser.add_argument("--port", type=int, default=8765, help="Port where the server listens.")
+    parser.add_argument("--unix_socket", type=str, default=None, help="Listen on this Unix socket instead of a TCP port.")
+    parser.add_argument("--max_workers", type=int, default=None, help="Number of levels evaluated at the same time.")
+    parser.add_argument("--batch_size", type=int, default=evaluation_server.batch_size, help="Maximum number of levels evaluated together by a worker.")
+    parser.add_argument("--interactive_request_levels", type=int, default=evaluation_server.interactive_request_levels, help="Requests with at most this number of levels are evaluated before the larger ones.")
+    parser.add_argument("--do_not_warm_up", action='store_true', help="Do not start the simulation workers until the first request.")
+    parser.add_argument("--do_not_use_cache", action='store_true', help="Deactivate the cache of per-level evaluation results.")
+    parser.add_argument("--cache_path", type=str, default=os.path.join(".cache", "evaluation_cache.sqlite"), help="Path of the cache of per-level evaluation results.")
+    parser.add_argument("--cache_max_size_mb", type=float, default=1024, help="Maximum size (in MB) of the cache of per-level evaluation results.")
+    parser.add_argument("--simulation_timeout", type=float, default=simulation_orchestrator.timeout, help="Maximum time (in seconds) of the simulation of a level. Levels whose simulation takes longer are marked as timed out. 0 means no limit.")
+    parser.add_argument("--simulation_retries", type=int, default=simulation_orchestrator.max_retries, help="Number of times a simulation process that fails is launched again.")
+    parser.add_argument("--simulation_memory_budget_mb", type=float, default=None, help="Memory (in MB) that all the simulation processes can use at the same time, each one counted at its maximum heap size. By default, 75%% of the available RAM.")
+    parser.add_argument("--synthetic_simulator", action='store_true', help="Simulate the levels with a deterministic synthetic simulator instead of the Java one, to test the evaluation at scale without Java.")
+    parser.add_argument("--synthetic_simulation_latency", type=float, default=0.0, help="Seconds that every simulation of the synthetic simulator takes.")
+    parser.add_argument("--synthetic_action_length", type=int, nargs=2, default=[200, 240], metavar=("MIN", "MAX"), help="Minimum and maximum number of actions of the playable levels with the synthetic simulator.")
+    args = parser.parse_args()
+
+    max_workers = compute_max_workers_dynamic(max_workers = args.max_workers)
+    print(f"Number of levels evaluated at the same time: {max_workers}")
+
+    # Settings of the simulation processes
+    simulation_orchestrator.timeout = args.simulation_timeout if args.simulation_timeout > 0 else None
+    simulation_orchestrator.max_retries = args.simulation_retries
+    simulation_orchestrator.memory_budget_mb = args.simulation_memory_budget_mb
+
+    if args.synthetic_simulator:
+        try:
+            mario_simulation_data.stand_in_simulator = SyntheticSimulator(latency = args.synthetic_simulation_latency, min_actions = args.synthetic_action_length[0], max_actions = args.synthetic_action_length[1])
+        except ValueError as e:
+            print(f"ERROR: Invalid settings of the synthetic simulator: {e}")
+            sys.exit(1)
+        print("Levels are simulated with the synthetic simulator.")
+
+    evaluation_server.interactive_request_levels = args.interactive_request_levels
+
+    if args.unix_socket is not None and os.path.exists(args.unix_socket):
+        print(f"ERROR: '{args.unix_socket}' already exists. Exiting...")
+        sys.exit(1)
+
+    cache = None if args.do_not_use_cache else EvaluationCache(args.cache_path, args.cache_max_size_mb)
+
+    with EvaluationServer(max_workers, cache, args.batch_size) as server:
+        if not args.do_not_warm_up:
+            server.warm_up()
+
+        try:
+            http_server = create_http_server(server, args.host, args.port, args.unix_socket)
+        except OSError as e:
+            print(f"ERROR: Unable to start the server: {e}. Exiting...")
+            sys.exit(1)
+
+        address = args.unix_socket if args.unix_socket is not None else f"{args.host}:{args.port}"
+        print(f"\nEvaluation server listening on {address} (Ctrl+C to stop).")
+
+        try:
+            http_server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nStopping the evaluation server...")
+        finally:
+            http_server.server_close()
+            if args.unix_socket is not None and os.path.exists(args.unix_socket):
+                os.remove(args.unix_socket)
+
+    if cache is not None:
+        cache.evict()
+        cache.report()
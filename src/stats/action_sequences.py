@@ -0,0 +1,97 @@
+import ast
+import numpy as np
+
+def encode_actions(actions):
+    """
+    Converts a sequence of actions into a compact array of small integers.
+
+    Actions are the integers written by the simulators (e.g. the pressed buttons of Mario as a bit mask), either as
+    ints or as strings. The smallest unsigned type that holds every action is used (uint8 for Mario).
+
+    Args:
+        actions (list | np.ndarray): The actions.
+
+    Returns:
+        np.ndarray: The actions as an array of unsigned integers.
+    """
+    codes = np.asarray(actions)
+
+    if codes.dtype.kind in "US":
+        codes = codes.astype(np.int64)
+    elif len(codes) == 0:
+        codes = codes.astype(np.uint8)
+
+    if codes.dtype.kind not in "iu" or (len(codes) > 0 and codes.min() < 0):
+        raise ValueError("Actions must be non-negative integers.")
+
+    max_action = int(codes.max()) if len(codes) > 0 else 0
+    return codes.astype(np.min_scalar_type(max_action) if max_action > 0 else np.uint8)
+
+def parse_action_line(line):
+    """
+    Encodes a comma-separated line of actions, as written by the simulators.
+    """
+    line = line.strip()
+
+    if not line:
+        return encode_actions([])
+
+    return encode_actions(np.array(line.split(","), dtype=np.int64))
+
+def run_length_encode(codes):
+    """
+    Writes the actions as comma-separated runs, "action*length" (or just "action" if the run has one action).
+
+    Agents repeat the same action for long stretches, so this is much shorter than the list of actions.
+    """
+    if len(codes) == 0:
+        return ""
+
+    codes = np.asarray(codes)
+    starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    lengths = np.diff(np.append(starts, len(codes)))
+
+    return ",".join(f"{codes[start]}*{length}" if length > 1 else f"{codes[start]}" for start, length in zip(starts, lengths))
+
+def run_length_decode(text):
+    """
+    Reads the actions written by run_length_encode.
+    """
+    if not text:
+        return encode_actions([])
+
+    values = []
+    lengths = []
+    for run in text.split(","):
+        value, _, length = run.partition("*")
+        values.append(int(value))
+        lengths.append(int(length) if length else 1)
+
+    return encode_actions(np.repeat(np.array(values, dtype=np.int64), lengths))
+
+def parse_actions(value):
+    """
+    Encodes the actions of a level from any of their representations: a list or array of actions, a run-length
+    encoded string, or the Python list literal written by older versions in the stats files.
+    """
+    if isinstance(value, str):
+        value = value.strip()
+
+        if value.startswith("["):
+            return encode_actions(ast.literal_eval(value))
+
+        return run_length_decode(value)
+
+    return encode_actions(value)
+
+def actions_to_string(codes):
+    """
+    Converts the actions into a string with one character per action, so the fast string implementation of the
+    Levenshtein distance can be used. The distances between the strings are the same as between the actions.
+    """
+    codes = np.asarray(codes, dtype=np.uint32)
+
+    # Skip the surrogates, which cannot be encoded
+    codes = np.where(codes < 0xD800, codes, codes + 0x800)
+
+    return codes.astype("<u4").tobytes().decode("utf-32-le")
@@ -0,0 +1,169 @@
+import os
+import csv
+import time
+import threading
+import psutil
+
+# Seconds between two samples of the memory and the CPU utilisation
+sample_interval = 2.0
+
+# Margin around the target CPU utilisation in which the number of evaluations is not changed
+cpu_tolerance = 0.05
+
+class ResizableLimit:
+    """
+    Semaphore whose number of slots can be changed while it is in use. When the limit is reduced, the slots in use
+    are not interrupted, but no new slot is given until there are fewer slots in use than the limit.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def set_limit(self, limit):
+        with self.condition:
+            self.limit = limit
+            self.condition.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+class Autoscaler:
+    """
+    Changes the number of levels evaluated at the same time according to the memory and the CPU used during the run.
+
+    A background thread samples the RSS of this process and of all its children (e.g. the JVMs of the simulations)
+    together with the CPU utilisation of the machine. The number of concurrent evaluations is reduced when the memory
+    is above the ceiling or the CPU is above the target utilisation, and increased (up to max_workers) when the
+    evaluations use every slot, the CPU is below the target and there is memory left for one more evaluation.
+    Every decision is printed and, if log_path is given, appended to a CSV file.
+
+    The evaluation threads run each level inside `with autoscaler.limit:`. Reducing the limit only stops new
+    evaluations, so on_limit_change is called with every new limit to release the memory kept by idle simulators
+    (e.g. persistent JVMs), and the limit is not reduced again because of the memory until the evaluations above it
+    have finished and the memory has been measured without them.
+
+    Args:
+        initial_workers (int): Number of concurrent evaluations at the start.
+        max_workers (int): Maximum number of concurrent evaluations (the size of the pool of threads).
+        memory_ceiling_mb (float): Maximum RSS (in MB) of this process and its children.
+        target_utilization (float): Target CPU utilisation of the machine (between 0 and 1).
+        log_path (str): CSV file where the decisions are logged (not logged if None).
+        min_workers (int): Minimum number of concurrent evaluations.
+        on_limit_change (callable): Function called with the limit at the start and every time it changes.
+    """
+    def __init__(self, initial_workers, max_workers, memory_ceiling_mb, target_utilization=0.9, log_path=None, min_workers=1, on_limit_change=None):
+        self.min_workers = min_workers
+        self.max_workers = max(max_workers, min_workers)
+        self.memory_ceiling_mb = memory_ceiling_mb
+        self.target_utilization = target_utilization
+        self.log_path = log_path
+        self.on_limit_change = on_limit_change
+        self.limit = ResizableLimit(min(max(initial_workers, min_workers), self.max_workers))
+        self.process = psutil.Process(os.getpid())
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        if log_path is not None and not os.path.exists(log_path):
+            with open(log_path, "w", newline="") as f:
+                csv.writer(f).writerow(["time", "rss_mb", "cpu_utilization", "active", "old_limit", "new_limit", "reason"])
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        psutil.cpu_percent(interval=None) # The first call only starts the measurement
+        if self.on_limit_change is not None:
+            self.on_limit_change(self.limit.limit)
+        self.thread = threading.Thread(target=self.run, name="autoscaler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def memory_mb(self):
+        """
+        RSS (in MB) of this process and all its children.
+        """
+        rss = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass # The child finished while it was being measured
+        return rss / 1024 ** 2
+
+    def decide(self, rss_mb, cpu_utilization, active, limit):
+        """
+        Returns the new limit of concurrent evaluations and the reason of the change (None if it does not change).
+        """
+        if rss_mb > self.memory_ceiling_mb and limit > self.min_workers:
+            # The memory of the evaluations above the limit is only released when they finish, so it is measured
+            # again without them before shrinking further
+            if active > limit:
+                return limit, None
+
+            # Shrink faster than it grows, as swapping slows everything down
+            return max(self.min_workers, limit - max(1, limit // 4)), "memory above the ceiling"
+
+        if cpu_utilization > self.target_utilization + cpu_tolerance and limit > self.min_workers:
+            return limit - 1, "CPU above the target"
+
+        if cpu_utilization < self.target_utilization - cpu_tolerance and active >= limit and limit < self.max_workers:
+            # Memory used by each evaluation, estimated from the current ones
+            memory_per_evaluation = rss_mb / max(active, 1)
+            if rss_mb + memory_per_evaluation <= self.memory_ceiling_mb:
+                return limit + 1, "CPU below the target"
+
+        return limit, None
+
+    def step(self):
+        rss_mb = self.memory_mb()
+        cpu_utilization = psutil.cpu_percent(interval=None) / 100
+        active, limit = self.limit.active, self.limit.limit
+
+        new_limit, reason = self.decide(rss_mb, cpu_utilization, active, limit)
+
+        if reason is not None:
+            self.limit.set_limit(new_limit)
+            if self.on_limit_change is not None:
+                self.on_limit_change(new_limit)
+            self.log(rss_mb, cpu_utilization, active, limit, new_limit, reason)
+
+        return new_limit
+
+    def log(self, rss_mb, cpu_utilization, active, old_limit, new_limit, reason):
+        print(f"\nAUTOSCALER: {old_limit} -> {new_limit} concurrent evaluations ({reason}: RSS {rss_mb:.0f} MB of {self.memory_ceiling_mb:.0f} MB, CPU {cpu_utilization:.0%}, {active} active).")
+
+        if self.log_path is not None:
+            with open(self.log_path, "a", newline="") as f:
+                csv.writer(f).writerow([time.time(), round(rss_mb, 1), round(cpu_utilization, 3), active, old_limit, new_limit, reason])
+
+    def run(self):
+        while not self.stop_event.wait(sample_interval):
+            try:
+                self.step()
+            except psutil.Error as e:
+                print(f"\nWARNING: The autoscaler could not sample the resources: {e}")
@@ -0,0 +1,307 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+import Levenshtein
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pydantic import BaseModel, Field
+
+from stats.games.registry import EVALUATOR_REGISTRY
+from stats.generator_stats import evaluate_level, in_flight_levels_per_worker
+from stats.level_stats_table import LevelStatsTable
+from stats.level_corpus import decode_corpus
+from stats.diversity_archive import DiversityArchive
+from stats.action_sequences import actions_to_string
+
+def normalize_matrix(values, min_values, max_values):
+    """
+    Min-max normalization of the columns of a matrix of characteristics, with the same rules as
+    LevelStatsTable.normalize_characteristics (characteristics whose minimum and maximum are equal are set to 0).
+    """
+    min_values = np.asarray(min_values, dtype=np.float64)
+    max_values = np.asarray(max_values, dtype=np.float64)
+    constant = max_values == min_values
+
+    return np.where(constant, 0, (values - min_values) / np.where(constant, 1, max_values - min_values))
+
+class SessionMetrics(BaseModel):
+    """
+    Aggregates of the levels evaluated so far in a BenchmarkSession.
+
+    The diversity values are the mean distance between every pair of valid levels (not normalized), and the coverage
+    is the number of cells of the diversity archive with at least one valid level.
+    """
+    n_levels: int = Field(..., description="Number of levels evaluated.")
+    n_valid_levels: int = Field(..., description="Number of valid levels.")
+    no_visual_bugs_percentage: float = Field(..., description="Fraction of levels without visual bugs.")
+    valid_percentage: float = Field(..., description="Fraction of valid levels.")
+    content_diversity: float = Field(..., description="Mean Levenshtein distance between the valid levels.")
+    a_star_diversity: float = Field(..., description="Mean Levenshtein distance between the actions of the valid levels.")
+    coverage: int = Field(..., description="Number of cells of the diversity archive covered by the valid levels.")
+    average_generation_time: float | None = Field(None, description="Average generation time (in nanoseconds, as in times.csv), if measured.")
+
+class RunningDiversity:
+    """
+    Mean Levenshtein distance between every pair of sequences, updated as sequences are added (the new sequences are
+    compared with the previous ones when the value is requested).
+    """
+    def __init__(self):
+        self.sequences = []
+        self.total = 0
+        self.n_pairs = 0
+        self.n_compared = 0
+
+    def add(self, sequence):
+        self.sequences.append(sequence)
+
+    def update(self, engine=None):
+        """
+        Compares the sequences added since the last update with the previous ones and returns the mean distance.
+        If a PairwiseDistanceEngine is given and no pair has been compared yet, every pair is computed at once by the
+        engine (with the same result).
+        """
+        if engine is not None and self.n_compared == 0 and len(self.sequences) > 1:
+            distances = engine.pairwise_levenshtein(self.sequences)
+            self.total = int(distances.sum())
+            self.n_pairs = len(distances)
+        else:
+            for i in range(self.n_compared, len(self.sequences)):
+                self.total += sum(Levenshtein.distance(self.sequences[i], other) for other in self.sequences[:i])
+                self.n_pairs += i
+        self.n_compared = len(self.sequences)
+
+        return self.value
+
+    @property
+    def value(self):
+        return self.total / self.n_pairs if self.n_pairs > 0 else 0
+
+class BenchmarkSession:
+    """
+    In-process evaluation of the levels of a generator, without writing them to disk.
+
+    The levels are taken from an iterable (e.g. the sampling loop of a generator), evaluated in parallel with the
+    evaluator of the game from EVALUATOR_REGISTRY (the simulator receives them in memory) and yielded as they are
+    evaluated, together with the running metrics of the session. If the iterable is consumed by the session, the
+    time taken to produce every level is measured as its generation time (in nanoseconds, as in times.csv).
+
+    The metrics compare every valid level with the previous ones, so they are only updated every metrics_interval
+    levels (and after the last one) instead of after every level, which would keep the consumer busy while the
+    workers wait for new levels. In between, the last metrics are yielded again (their n_levels tells how many
+    levels they include), and metrics() computes them on demand (e.g. after the last level).
+
+    The coverage uses the given ranges of the characteristics to normalize them (e.g. the ranges of a complete
+    benchmark, see stats.normalization.characteristic_ranges). Without them, the ranges of the levels of the session
+    are used, so the coverage can change as levels are added.
+
+    Example:
+        with BenchmarkSession("Super Mario Bros") as session:
+            for level_stats, metrics in session.evaluate(generator.sample() for _ in range(100)):
+                print(level_stats.is_valid, metrics.content_diversity)
+
+    Args:
+        game_name (str): Name of the game in EVALUATOR_REGISTRY.
+        max_workers (int): Number of levels evaluated at the same time (1 to evaluate them in this thread).
+        n_intervals_per_dimension (int): Number of intervals of each dimension of the diversity archive.
+        characteristic_ranges (tuple): Minimum and maximum value of every characteristic, as two dictionaries.
+        cache (EvaluationCache): Cache of per-level evaluation results.
+        name (str): Name of the session, used in the names of the levels.
+        metrics_interval (int): Number of levels evaluated between two updates of the yielded metrics.
+    """
+    def __init__(self, game_name, max_workers=None, n_intervals_per_dimension=10, characteristic_ranges=None, cache=None, name="session", metrics_interval=100):
+        if game_name not in EVALUATOR_REGISTRY:
+            raise KeyError(f"No evaluator registered for the game {game_name}.")
+
+        self.game_name = game_name
+        self.game_evaluator = EVALUATOR_REGISTRY[game_name]
+        self.max_workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+        self.n_intervals_per_dimension = n_intervals_per_dimension
+        self.characteristic_ranges = characteristic_ranges
+        self.cache = cache
+        self.name = name
+        self.metrics_interval = max(1, metrics_interval)
+
+        self.levels_stats = LevelStatsTable()
+        self.generation_times = {}
+        self.content_diversity = RunningDiversity()
+        self.a_star_diversity = RunningDiversity()
+        self.diversity_archive = DiversityArchive(n_intervals_per_dimension) if characteristic_ranges is not None else None
+        self.n_levels = 0
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers) if self.max_workers > 1 else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def to_level_string(self, level):
+        """
+        Converts a level into a string. Levels can be strings, (num_rows, num_cols) arrays of tile indices (in the
+        valid characters of the game) or arrays of characters.
+        """
+        if isinstance(level, str):
+            return level
+
+        level = np.asarray(level)
+        if level.ndim != 2:
+            raise ValueError(f"Levels must be strings or 2D arrays, not arrays of shape {level.shape}.")
+
+        if level.dtype.kind in "iu":
+            return decode_corpus(level[None].astype(np.intp), self.game_evaluator.valid_characters)[0]
+
+        return "\n".join("".join(row) for row in level.astype(str))
+
+    def timed_levels(self, levels):
+        """
+        Yields (level name, level, generation time) tuples, measuring the time (in nanoseconds) taken by the iterable
+        to produce every level. Items can be levels or (level name, level) pairs.
+        """
+        iterator = iter(levels)
+
+        while True:
+            start = time.perf_counter_ns()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            generation_time = time.perf_counter_ns() - start
+
+            if isinstance(item, tuple):
+                level_name, level = item
+            else:
+                level_name, level = f"{self.name}_{self.n_levels}.txt", item
+            self.n_levels += 1
+
+            yield level_name, self.to_level_string(level), generation_time
+
+    def evaluate_one(self, level_name, level):
+        level_stats, is_new = evaluate_level(level_name, level, self.game_evaluator, self.executor is not None, self.game_name, self.cache)
+
+        if is_new:
+            if level_stats.is_valid:
+                level_stats.characteristics = self.game_evaluator.evaluate_characteristics_batch([level_stats.grid if level_stats.grid is not None else level_stats.level])[0]
+
+            # Levels whose simulation timed out or failed are simulated again next time
+            if self.cache is not None and level_stats.simulation_completed:
+                self.cache.put(self.cache.compute_key(level_stats.level, self.game_name, self.game_evaluator), level_stats)
+
+        return level_stats
+
+    def record(self, level_stats, generation_time=None):
+        """
+        Adds the stats of an evaluated level to the session, without computing the metrics.
+        """
+        self.levels_stats.append(level_stats)
+        if generation_time is not None:
+            self.generation_times[level_stats.level_name] = generation_time
+
+        if level_stats.is_valid:
+            self.content_diversity.add(level_stats.flat_level)
+            self.a_star_diversity.add(actions_to_string(level_stats.actions))
+
+            if self.diversity_archive is not None:
+                min_values, max_values = self.characteristic_ranges
+                names = list(min_values.keys())
+                values = np.array([[level_stats.characteristics.get(name, np.nan) for name in names]], dtype=np.float64)
+                normalized = normalize_matrix(values, np.array([min_values[name] for name in names]), np.array([max_values[name] for name in names]))
+                self.diversity_archive.add_values(normalized, [level_stats.level_name])
+
+    def evaluate(self, levels):
+        """
+        Evaluates the levels, yielding (LevelStats, SessionMetrics) pairs as they are evaluated (not necessarily in
+        the order of the levels). The metrics are updated with the first level and then every metrics_interval
+        levels, so the ones of all the levels are given by metrics() once the levels have been evaluated.
+
+        Args:
+            levels (iterable): Levels (strings or arrays) or (level name, level) pairs.
+        """
+        metrics = None
+        n_recorded = 0
+
+        for level_stats, generation_time in self.evaluated_levels(levels):
+            self.record(level_stats, generation_time)
+            n_recorded += 1
+
+            if metrics is None or n_recorded % self.metrics_interval == 0:
+                metrics = self.metrics()
+
+            yield level_stats, metrics
+
+    def evaluated_levels(self, levels):
+        """
+        Evaluates the levels, yielding (LevelStats, generation time) pairs as they are evaluated (without adding them
+        to the session).
+        """
+        if self.executor is None:
+            for level_name, level, generation_time in self.timed_levels(levels):
+                yield self.evaluate_one(level_name, level), generation_time
+            return
+
+        # Only a bounded number of levels is waiting to be evaluated, so a generator is not sampled far ahead
+        max_in_flight = self.max_workers * in_flight_levels_per_worker
+        futures = {}
+
+        for level_name, level, generation_time in self.timed_levels(levels):
+            futures[self.executor.submit(self.evaluate_one, level_name, level)] = generation_time
+
+            while len(futures) >= max_in_flight:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result(), futures.pop(future)
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result(), futures.pop(future)
+
+    def evaluate_all(self, levels, engine=None):
+        """
+        Evaluates the levels and returns the metrics of the session, computed once at the end (with engine, a
+        PairwiseDistanceEngine, if it is given).
+        """
+        for level_stats, generation_time in self.evaluated_levels(levels):
+            self.record(level_stats, generation_time)
+        return self.metrics(engine)
+
+    def coverage(self):
+        if self.diversity_archive is not None:
+            return self.diversity_archive.get_coverage()
+
+        # Without fixed ranges, the levels are normalized with the ranges of the session
+        names, values, present = self.levels_stats.characteristics_matrix()
+        valid = self.levels_stats.is_valid
+        if not valid.any():
+            return 0
+
+        values = np.where(present[valid], values[valid], np.nan)
+        archive = DiversityArchive(self.n_intervals_per_dimension)
+        archive.add_values(normalize_matrix(values, np.nanmin(values, axis=0), np.nanmax(values, axis=0)))
+        return archive.get_coverage()
+
+    def generation_times_dataframe(self):
+        return pd.DataFrame({"level_name": list(self.generation_times.keys()), "generation_time": list(self.generation_times.values())})
+
+    def metrics(self, engine=None):
+        """
+        Returns the metrics of the levels evaluated so far. If a PairwiseDistanceEngine is given, the diversity of the
+        levels that have not been compared yet is computed with it.
+        """
+        n_levels = len(self.levels_stats)
+        n_valid_levels = int(self.levels_stats.is_valid.sum())
+
+        return SessionMetrics(
+            n_levels = n_levels,
+            n_valid_levels = n_valid_levels,
+            no_visual_bugs_percentage = float((~self.levels_stats.has_visual_bugs).sum() / n_levels) if n_levels > 0 else 0.0,
+            valid_percentage = n_valid_levels / n_levels if n_levels > 0 else 0.0,
+            content_diversity = self.content_diversity.update(engine),
+            a_star_diversity = self.a_star_diversity.update(engine),
+            coverage = self.coverage(),
+            average_generation_time = float(np.mean(list(self.generation_times.values()))) if self.generation_times else None,
+        )
@@ -0,0 +1,122 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+from stats.pairwise_distances import condensed_size, reindex_condensed
+
+class DistanceStore:
+    """
+    Persistent condensed distance matrices of the sets of levels, so that only the pairs that involve new or
+    changed levels are computed when a set is evaluated again.
+
+    Each matrix is stored together with the hash of every sequence, in the same order. When a set is evaluated,
+    the distances between sequences already stored are copied from the memory-mapped matrix, the rest are computed,
+    and the stored matrix is replaced by the one of the current set (so removed levels are dropped).
+
+    Args:
+        path (str): Directory where the matrices are stored.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def generator_key(folder_path, generator_name):
+        # The folder path is part of the key, so generators with the same name in different folders do not collide
+        digest = hashlib.sha256(os.path.normpath(folder_path).encode("utf-8")).hexdigest()
+        return f"{generator_name}_{digest[:12]}"
+
+    @staticmethod
+    def sequence_hash(sequence):
+        if isinstance(sequence, str):
+            data = sequence.encode("utf-8")
+        elif isinstance(sequence, np.ndarray) and sequence.dtype.kind in "iu":
+            data = sequence.astype(np.int64).tobytes()
+        else:
+            data = json.dumps(list(sequence)).encode("utf-8")
+        return hashlib.sha256(data).hexdigest()
+
+    def files(self, generator_key, metric):
+        directory = os.path.join(self.path, generator_key)
+        return os.path.join(directory, f"{metric}_hashes.json"), os.path.join(directory, f"{metric}_distances.npy")
+
+    def load(self, generator_key, metric):
+        """
+        Returns the stored hashes and the memory-mapped condensed matrix, or (None, None) if there is no valid matrix.
+        """
+        hashes_file, distances_file = self.files(generator_key, metric)
+
+        if not os.path.exists(hashes_file) or not os.path.exists(distances_file):
+            return None, None
+
+        try:
+            with open(hashes_file, "r") as f:
+                hashes = json.load(f)
+            distances = np.load(distances_file, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Stored distances of {generator_key} ({metric}) could not be read: {e}. They will be computed again.")
+            return None, None
+
+        # Both files are replaced separately, so check that they belong to the same matrix
+        if len(distances) != condensed_size(len(hashes)):
+            return None, None
+
+        return hashes, distances
+
+    def save(self, generator_key, metric, hashes, distances):
+        hashes_file, distances_file = self.files(generator_key, metric)
+        os.makedirs(os.path.dirname(hashes_file), exist_ok=True)
+
+        # Write to temporary files and replace the old ones, so an interrupted run never leaves a corrupted matrix
+        temp_distances_file = distances_file + ".tmp.npy"
+        np.save(temp_distances_file, distances.astype(np.uint32))
+        os.replace(temp_distances_file, distances_file)
+
+        temp_hashes_file = hashes_file + ".tmp"
+        with open(temp_hashes_file, "w") as f:
+            json.dump(hashes, f)
+        os.replace(temp_hashes_file, hashes_file)
+
+    def pairwise_levenshtein(self, engine, generator_key, metric, sequences, desc=None):
+        """
+        Computes the condensed Levenshtein distance matrix of the sequences, reusing the stored distances.
+
+        Args:
+            engine (PairwiseDistanceEngine): Engine used to compute the missing distances.
+            generator_key (str): Key of the set of levels (see generator_key).
+            metric (str): Name of the distance matrix (e.g. "content" or "a_star").
+            sequences (list): Strings, or lists of hashable items (e.g. actions).
+            desc (str): Description of the progress bar (no progress bar if None).
+
+        Returns:
+            np.ndarray: Condensed distance matrix (int64) of the sequences, in the given order.
+        """
+        hashes = [self.sequence_hash(sequence) for sequence in sequences]
+        stored_hashes, stored_distances = self.load(generator_key, metric)
+
+        stored_index = {}
+        if stored_hashes is not None:
+            for i, sequence_hash in enumerate(stored_hashes):
+                stored_index.setdefault(sequence_hash, i)
+
+        # Sequences already stored go first, so their distances are a known block of the matrix
+        known = [i for i, sequence_hash in enumerate(hashes) if sequence_hash in stored_index]
+        new = [i for i, sequence_hash in enumerate(hashes) if sequence_hash not in stored_index]
+        order = known + new
+
+        known_distances = None
+        if len(known) > 0:
+            known_distances = reindex_condensed(stored_distances, [stored_index[hashes[i]] for i in known])
+
+        del stored_distances
+
+        distances = engine.pairwise_levenshtein([sequences[i] for i in order], desc, known_distances)
+
+        # Back to the given order
+        positions = np.empty(len(order), dtype=np.int64)
+        positions[order] = np.arange(len(order))
+        distances = reindex_condensed(distances, positions)
+
+        self.save(generator_key, metric, hashes, distances)
+
+        return distances
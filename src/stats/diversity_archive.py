@@ -1,13 +1,111 @@
 import numpy as np
 
 class DiversityArchive:
+    """
+    Grid over the (normalized) characteristics space, with num_intervals_per_dimension cells per dimension.
+
+    Every valid level is mapped to the integer id of its cell (the index of the cell in the flattened grid), all the
+    levels of a generator at once. Only the occupied cells are stored, as a sorted array of ids with the number of
+    levels in each cell, so high resolutions (e.g. 7 dimensions with 50 intervals) never materialize the grid.
+
+    Args:
+        num_intervals_per_dimension (int): Number of intervals of each dimension.
+    """
     def __init__(self, num_intervals_per_dimension):
         self.num_intervals_per_dimension = num_intervals_per_dimension
         self.dimensions = None
-        self.set_of_covered_cells = set()
+        self.cell_ids = np.empty(0, dtype=np.int64) # Sorted ids of the occupied cells
+        self.occupancy = np.empty(0, dtype=np.int64) # Number of levels in each occupied cell
+        self.level_names = [] # Levels added to the archive...
+        self.level_cell_ids = np.empty(0, dtype=np.int64) # ...and the id of the cell of each one
+        '''self.set_of_covered_cells = set()'''
+
+    def set_dimensions(self, dimensions, generator_name=None):
+        if self.dimensions is None:
+            # The ids are indices of the flattened grid, so the grid must not have more cells than an int64 can index
+            if float(self.num_intervals_per_dimension) ** dimensions >= 2 ** 63:
+                raise ValueError(f"The archive cannot index {self.num_intervals_per_dimension} intervals in {dimensions} dimensions.")
+            self.dimensions = dimensions
+        elif self.dimensions != dimensions:
+            raise ValueError("Inconsistent dimensions in characteristics of generator " + str(generator_name))
+
+    def positions(self, values):
+        """
+        Positions in the grid of an (n_levels, dimensions) matrix of normalized characteristics.
+        """
+        positions = np.floor(np.asarray(values, dtype=np.float64) * self.num_intervals_per_dimension)
+        return np.clip(positions, 0, self.num_intervals_per_dimension - 1).astype(np.int64)
+
+    def cell_id(self, values):
+        """
+        Ids of the cells of an (n_levels, dimensions) matrix of normalized characteristics (or of a single level).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        single = values.ndim == 1
+        values = values.reshape(-1, values.shape[-1])
+
+        self.set_dimensions(values.shape[1])
+        ids = np.ravel_multi_index(self.positions(values).T, (self.num_intervals_per_dimension,) * self.dimensions)
+
+        return ids[0] if single else ids
+
+    def cell_position(self, cell_id):
+        return np.unravel_index(cell_id, (self.num_intervals_per_dimension,) * self.dimensions)
+
+    def add_values(self, values, level_names=None):
+        """
+        Adds the levels of an (n_levels, dimensions) matrix of normalized characteristics.
+        """
+        ids = self.cell_id(np.asarray(values, dtype=np.float64).reshape(len(values), -1))
+
+        # Merge the new levels with the occupancy of the cells already in the archive
+        cell_ids, inverse = np.unique(np.concatenate((self.cell_ids, ids)), return_inverse=True)
+        weights = np.concatenate((self.occupancy, np.ones(len(ids), dtype=np.int64)))
+        self.occupancy = np.bincount(inverse, weights=weights, minlength=len(cell_ids)).astype(np.int64)
+        self.cell_ids = cell_ids
+
+        self.level_names.extend(level_names if level_names is not None else [None] * len(ids))
+        self.level_cell_ids = np.concatenate((self.level_cell_ids, ids))
+
+    def generator_values(self, generator_stats):
+        """
+        Returns the indices of the valid levels of a generator and the (n_levels, dimensions) matrix of their
+        characteristics.
+        """
+        table = generator_stats.levels_stats
+        _, values, present = table.characteristics_matrix()
+        valid = np.flatnonzero(table.is_valid)
+
+        if len(valid) == 0:
+            return valid, np.empty((0, self.dimensions or 0))
+
+        # Every valid level must have the same number of characteristics (taken in the same order as the dictionaries)
+        n_characteristics = present[valid].sum(axis=1)
+        if (n_characteristics != n_characteristics[0]).any():
+            raise ValueError("Inconsistent dimensions in characteristics of generator " + generator_stats.generator_name)
+        self.set_dimensions(int(n_characteristics[0]), generator_stats.generator_name)
+
+        values = values[valid][present[valid]].reshape(len(valid), self.dimensions)
+
+        has_nan = np.isnan(values).any(axis=1)
+        if has_nan.any():
+            print(f"WARNING: {has_nan.sum()} valid levels of generator {generator_stats.generator_name} have NaN characteristics. They are not added to the diversity archive.")
+            valid = valid[~has_nan]
+            values = values[~has_nan]
+
+        return valid, values
 
     def add_generator_stats(self, generator_stats):
-        for level_stats in generator_stats.levels_stats:
+        """
+        Adds the valid levels of a generator. Returns the indices of the levels added and the matrix of their
+        characteristics (see generator_values).
+        """
+        valid, values = self.generator_values(generator_stats)
+
+        if len(valid) > 0:
+            self.add_values(values, [generator_stats.levels_stats.level_names[i] for i in valid])
+
+        '''for level_stats in generator_stats.levels_stats:
             if level_stats.is_valid:
                 # Compute the position in the diversity space
                 values = np.array(list(level_stats.characteristics.values()))
@@ -16,12 +114,108 @@ class DiversityArchive:
                     self.dimensions = len(values)
                 elif self.dimensions != len(values):
                     raise ValueError("Inconsistent dimensions in characteristics of generator " + generator_stats.generator_name)
-                
+
                 position = np.floor(values * self.num_intervals_per_dimension)
                 position = np.clip(position, 0, self.num_intervals_per_dimension - 1)
 
                 # Mark the associated cell as covered
-                self.set_of_covered_cells.add(tuple(position))
+                self.set_of_covered_cells.add(tuple(position))'''
+
+        return valid, values
 
     def get_coverage(self):
-        return len(self.set_of_covered_cells)
\ No newline at end of file
+        return len(self.cell_ids)
+
+    def get_coverage_ratio(self):
+        """
+        Fraction of the cells of the grid that are occupied.
+        """
+        if self.dimensions is None:
+            return 0.0
+        return len(self.cell_ids) / float(self.num_intervals_per_dimension) ** self.dimensions
+
+    def get_occupancy_entropy(self, normalized=False):
+        """
+        Shannon entropy (in nats) of the distribution of the levels among the occupied cells.
+
+        Args:
+            normalized (bool): Divide the entropy by its maximum (log of the number of occupied cells), so that 1
+            means that every occupied cell has the same number of levels.
+        """
+        if len(self.occupancy) == 0:
+            return 0.0
+
+        probabilities = self.occupancy / self.occupancy.sum()
+        entropy = float(-(probabilities * np.log(probabilities)).sum())
+
+        if normalized:
+            return entropy / np.log(len(self.occupancy)) if len(self.occupancy) > 1 else 1.0
+        return entropy
+
+    def get_occupancy(self, values):
+        """
+        Number of levels of the archive in the cells of the given normalized characteristics (0 if not occupied).
+        """
+        ids = np.atleast_1d(self.cell_id(values))
+        counts = np.zeros(len(ids), dtype=np.int64)
+
+        if len(self.cell_ids) > 0:
+            indices = np.minimum(np.searchsorted(self.cell_ids, ids), len(self.cell_ids) - 1)
+            occupied = self.cell_ids[indices] == ids
+            counts[occupied] = self.occupancy[indices[occupied]]
+
+        return counts if np.ndim(values) > 1 else int(counts[0])
+
+    def is_covered(self, values):
+        return self.get_occupancy(values) > 0
+
+    def get_members(self, cell_id):
+        """
+        Names of the levels of the archive that are in the given cell.
+        """
+        return [self.level_names[i] for i in np.flatnonzero(self.level_cell_ids == cell_id)]
+
+def unique_ids(ids):
+    # Sorting is faster than the hash table of np.unique for large arrays of cell ids
+    ids = np.sort(ids)
+    return ids[np.concatenate(([True], ids[1:] != ids[:-1]))] if len(ids) > 0 else ids
+
+def coverage_curve(values, resolutions):
+    """
+    Coverage of a set of levels for several numbers of intervals per dimension, in one pass.
+
+    The levels are only binned at the resolutions that do not divide a finer one. The occupied cells of the rest are
+    obtained from the occupied cells of a finer resolution by integer division, since
+    floor(floor(x * R) / (R / r)) == floor(x * r) when r divides R.
+
+    Args:
+        values (np.ndarray): (n_levels, dimensions) matrix of normalized characteristics.
+        resolutions (list): Numbers of intervals per dimension.
+
+    Returns:
+        dict: The number of occupied cells for each resolution.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return {resolution: 0 for resolution in resolutions}
+
+    dimensions = values.shape[1]
+
+    curve = {}
+    occupied_positions = {} # Positions of the occupied cells of every resolution
+    for resolution in sorted(set(resolutions), reverse=True):
+        finer = [other for other in occupied_positions if other % resolution == 0]
+
+        if len(finer) == 0:
+            archive = DiversityArchive(resolution)
+            cell_ids = unique_ids(archive.cell_id(values)) if len(values) > 0 else np.empty(0, dtype=np.int64)
+        else:
+            # The finest resolution with fewer occupied cells is the cheapest to reuse
+            base = min(finer, key=lambda other: len(occupied_positions[other][0]))
+            positions = tuple(axis // (base // resolution) for axis in occupied_positions[base])
+            cell_ids = unique_ids(np.ravel_multi_index(positions, (resolution,) * dimensions))
+
+        occupied_positions[resolution] = np.unravel_index(cell_ids, (resolution,) * dimensions)
+        curve[resolution] = len(cell_ids)
+
+    return {resolution: curve[resolution] for resolution in resolutions}
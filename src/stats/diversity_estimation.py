@@ -0,0 +1,78 @@
+import math
+from typing import ClassVar, Literal, Optional
+from pydantic import BaseModel, Field
+from scipy import stats
+
+class DiversitySettings(BaseModel):
+    """
+    Class to store how the diversity metrics (mean pairwise distances) of a set of levels are computed.
+
+    Attributes:
+        mode (str): "exact" to compute every pair, "sampled" to estimate the mean from random pairs.
+        sample_pairs (int): Maximum number of random pairs used by the sampled mode.
+        ci_width (float): Width of the confidence interval at which the sampled mode stops.
+        confidence (float): Confidence level of the interval.
+        seed (int): Seed of the random pairs.
+    """
+
+    mode: Literal["exact", "sampled"] = Field("exact", description="How the diversity metrics are computed.")
+    sample_pairs: Optional[int] = Field(None, description="Maximum number of random pairs used by the sampled mode.", gt=1)
+    ci_width: Optional[float] = Field(None, description="Width of the confidence interval at which the sampled mode stops.", gt=0)
+    confidence: float = Field(0.95, description="Confidence level of the interval.", gt=0, lt=1)
+    seed: Optional[int] = Field(None, description="Seed of the random pairs.")
+
+    # Fields of properties.json that override the settings for a set of levels
+    PROPERTIES: ClassVar[dict] = {
+        "Diversity Mode": "mode",
+        "Diversity Sample Pairs": "sample_pairs",
+        "Diversity CI Width": "ci_width",
+        "Diversity Confidence": "confidence",
+        "Diversity Seed": "seed",
+    }
+
+    def model_post_init(self, __context):
+        if self.mode == "sampled" and self.sample_pairs is None and self.ci_width is None:
+            self.sample_pairs = 10000
+
+    def updated(self, properties: dict) -> "DiversitySettings":
+        """
+        Returns a copy of the settings overridden by the fields of a properties.json file.
+        """
+        overrides = {field: properties[key] for key, field in self.PROPERTIES.items() if key in properties}
+
+        if not overrides:
+            return self
+
+        return DiversitySettings(**(self.model_dump() | overrides))
+
+class DiversityEstimate(BaseModel):
+    """
+    Class to store a diversity value together with how it has been computed.
+
+    Attributes:
+        value (float): The (estimated) mean pairwise distance.
+        n_pairs (int): Number of pairs used to compute it.
+        ci (tuple): Confidence interval of the estimate, or None if every pair has been computed.
+    """
+
+    value: float = Field(..., description="The (estimated) mean pairwise distance.")
+    n_pairs: int = Field(..., description="Number of pairs used to compute it.")
+    ci: Optional[tuple[float, float]] = Field(None, description="Confidence interval of the estimate, or None if every pair has been computed.")
+
+    def scaled(self, factor: float) -> "DiversityEstimate":
+        ci = None if self.ci is None else (self.ci[0] * factor, self.ci[1] * factor)
+        return DiversityEstimate(value=self.value * factor, n_pairs=self.n_pairs, ci=ci)
+
+def confidence_interval(count, total, total_squares, confidence):
+    """
+    Normal-approximation confidence interval of a mean, from the number of samples, their sum and the sum of their squares.
+    """
+    mean = total / count
+
+    if count < 2:
+        return mean, (-math.inf, math.inf)
+
+    variance = max(0.0, (total_squares - total * total / count) / (count - 1))
+    half_width = stats.norm.ppf(0.5 + confidence / 2) * math.sqrt(variance / count)
+
+    return mean, (mean - half_width, mean + half_width)
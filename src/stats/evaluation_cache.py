@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from stats.level_stats import LevelStats
+
+class EvaluationCache:
+    """
+    Persistent cache of per-level evaluation results stored in a SQLite database.
+
+    Entries are addressed by a hash of the level text together with everything that can change
+    the result of the evaluation (game name, grid size, evaluator settings and evaluator version),
+    so identical levels from different sets or runs are only evaluated once. The database is
+    opened in WAL mode, which allows several evaluation runs on the same machine to share it.
+
+    Args:
+        path (str): Path of the SQLite database.
+        max_size_mb (float): Maximum size of the stored results. Least recently used entries are evicted above it.
+    """
+    def __init__(self, path, max_size_mb=None):
+        self.path = path
+        self.max_size_bytes = None if max_size_mb is None else int(max_size_mb * 1024 ** 2)
+        self.hits = 0
+        self.misses = 0
+        self.counter_lock = threading.Lock()
+        self.local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        connection = self.connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS level_stats ("
+            "key TEXT PRIMARY KEY, "
+            "payload TEXT NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "last_access REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS level_stats_last_access ON level_stats (last_access)")
+        connection.commit()
+
+    def connection(self):
+        # SQLite connections cannot be shared between threads, so each thread opens its own
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=60)
+            self.local.connection = connection
+        return connection
+
+    @staticmethod
+    def compute_key(level, game_name, evaluator):
+        # The trailing newline is ignored, as in GameEvaluator.evaluate
+        if level.endswith("\n"):
+            level = level[:-1]
+
+        key_data = {
+            "level": level,
+            "game_name": game_name,
+            "num_rows": evaluator.num_rows,
+            "num_cols": evaluator.num_cols,
+            "evaluator_version": evaluator.evaluator_version,
+            "settings": evaluator.get_cache_settings(),
+        }
+        return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key, level_name):
+        """
+        Returns the cached LevelStats for the key (renamed to level_name), or None if it is not cached.
+        """
+        connection = self.connection()
+        row = connection.execute("SELECT payload FROM level_stats WHERE key = ?", (key,)).fetchone()
+
+        with self.counter_lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if row is None:
+            return None
+
+        try:
+            connection.execute("UPDATE level_stats SET last_access = ? WHERE key = ?", (time.time(), key))
+            connection.commit()
+        except sqlite3.OperationalError:
+            pass  # The access time is only used for eviction; another run holding the lock is not an error
+
+        payload = json.loads(row[0])
+        payload["level_name"] = level_name
+
+        return LevelStats(**payload)
+
+    def put(self, key, level_stats):
+        """
+        Stores the LevelStats of a level under the key, unless its simulation did not complete (it timed out or the
+        simulation process failed). Both can be transient (e.g. an overloaded machine or a missing JVM), so the level
+        is simulated again the next time instead of being stored as a permanent result.
+        """
+        if not level_stats.simulation_completed:
+            return
+
+        payload = json.dumps(level_stats.model_dump(exclude={"level_name"}))
+
+        connection = self.connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO level_stats (key, payload, size, last_access) VALUES (?, ?, ?, ?)",
+            (key, payload, len(payload), time.time())
+        )
+        connection.commit()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the stored results fit in the maximum size.
+        """
+        if self.max_size_bytes is None:
+            return 0
+
+        connection = self.connection()
+        total_size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM level_stats").fetchone()[0]
+
+        if total_size <= self.max_size_bytes:
+            return 0
+
+        keys_to_remove = []
+        for key, size in connection.execute("SELECT key, size FROM level_stats ORDER BY last_access"):
+            if total_size <= self.max_size_bytes:
+                break
+            keys_to_remove.append((key,))
+            total_size -= size
+
+        connection.executemany("DELETE FROM level_stats WHERE key = ?", keys_to_remove)
+        connection.commit()
+
+        return len(keys_to_remove)
+
+    def report(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total > 0 else 0
+        print(f"\nEvaluation cache: {self.hits} hits, {self.misses} misses (hit rate: {hit_rate:.2%}).")
@@ -0,0 +1,84 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from stats.pairwise_distances import PairwiseDistanceEngine
+
+# Number of sets of levels evaluated at the same time, so the end of one set overlaps with the start of the next
+concurrent_generators = 2
+
+class EvaluationScheduler:
+    """
+    Pools shared by the evaluation of every set of levels of a run.
+
+    The levels of every set are evaluated by the same thread pool and the diversity of every set is computed by the
+    same pool of processes (PairwiseDistanceEngine), which are created once per run instead of once per set. Up to
+    concurrent_generators sets are evaluated at the same time, so the cores that become idle at the end of a set
+    (e.g. while its diversity is being computed) start evaluating the levels of the next one.
+
+    If an Autoscaler is given, the pool of threads has its maximum number of workers, and the number of levels
+    evaluated at the same time is limited by the autoscaler.
+
+    Args:
+        max_workers (int): Number of workers of each pool (None to use every core).
+        concurrent_generators (int): Number of sets of levels evaluated at the same time.
+        autoscaler (Autoscaler): Autoscaler of the number of concurrent evaluations (started and stopped here).
+    """
+    def __init__(self, max_workers, concurrent_generators=concurrent_generators, autoscaler=None):
+        self.max_workers = max_workers
+        self.concurrent_generators = max(1, concurrent_generators)
+        self.autoscaler = autoscaler
+        self.level_workers = autoscaler.max_workers if autoscaler is not None else max_workers
+        self.level_executor = ThreadPoolExecutor(max_workers=self.level_workers)
+        self.engine = PairwiseDistanceEngine(max_workers)
+        self.generator_executor = ThreadPoolExecutor(max_workers=self.concurrent_generators, thread_name_prefix="generator")
+
+        if self.autoscaler is not None:
+            self.autoscaler.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.generator_executor.shutdown(cancel_futures=True)
+        self.level_executor.shutdown(cancel_futures=True)
+        self.engine.close()
+
+        if self.autoscaler is not None:
+            self.autoscaler.stop()
+
+    @property
+    def level_limit(self):
+        """
+        Limit of the number of levels evaluated at the same time (None if there is no autoscaler).
+        """
+        return self.autoscaler.limit if self.autoscaler is not None else None
+
+    def map_generators(self, function, items):
+        """
+        Calls function on every item (e.g. the folder of a set of levels), running up to concurrent_generators calls
+        at the same time, and yields the results in the order of the items.
+        """
+        # At most concurrent_generators calls are submitted ahead of the consumer, and the next one is submitted as each
+        # result is yielded, so only a bounded number of results (e.g. sets with their levels) are held at any time
+        items = iter(items)
+        futures = deque()
+
+        def submit_next():
+            for item in items:
+                futures.append(self.generator_executor.submit(function, item))
+                return
+
+        try:
+            for _ in range(self.concurrent_generators):
+                submit_next()
+
+            while futures:
+                result = futures.popleft().result()
+                submit_next()
+                yield result
+        finally:
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,416 @@
+import json
+import heapq
+import socket
+import itertools
+import threading
+import http.client
+import numpy as np
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+
+from stats.games.registry import EVALUATOR_REGISTRY
+from stats.generator_stats import evaluate_level
+from stats.evaluation_cache import EvaluationCache
+from stats.level_stats import LevelStats
+from stats.pairwise_distances import PairwiseDistanceEngine
+from stats.benchmark_session import BenchmarkSession, SessionMetrics
+
+# Maximum number of levels evaluated together by a worker (their characteristics are computed at once)
+batch_size = 16
+
+# Requests with at most this number of levels are interactive, so their levels are evaluated before those of the
+# bulk requests (lower values are evaluated first)
+interactive_request_levels = 32
+INTERACTIVE_PRIORITY = 0
+BULK_PRIORITY = 1
+
+class LevelTask:
+    """
+    Level waiting to be evaluated by the server. Identical levels submitted while one of them is waiting or being
+    evaluated share the same task (and the same Future).
+    """
+    def __init__(self, priority, game_name, key, level_name, level):
+        self.priority = priority
+        self.game_name = game_name
+        self.key = key
+        self.level_name = level_name
+        self.level = level
+        self.future = Future()
+        self.queued = True
+
+class EvaluationServer:
+    """
+    Long-running evaluation of levels submitted by several clients, with the evaluators, the simulation workers and
+    the cache loaded once.
+
+    The levels of every request are put in a priority queue, so the levels of interactive requests (few levels) are
+    evaluated before the pending levels of bulk requests. Each worker thread takes the next levels of the queue as a
+    work unit (up to batch_size levels of the same priority and game, fewer when the queue is short so every worker
+    gets some) and computes their characteristics at once. The diversity of the levels of each request is computed
+    by a pool of processes shared by every request.
+
+    Args:
+        max_workers (int): Number of levels evaluated at the same time.
+        cache (EvaluationCache): Cache of per-level evaluation results.
+        batch_size (int): Maximum number of levels of a work unit.
+    """
+    def __init__(self, max_workers, cache=None, batch_size=batch_size):
+        self.max_workers = max(1, max_workers)
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+
+        self.queue = []
+        self.in_flight = {}
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.n_requests = 0
+        self.n_levels = 0
+        self.n_evaluated_levels = 0
+        self.n_batches = 0
+
+        # The diversity of every request is computed by the same pool of processes
+        self.engine = PairwiseDistanceEngine(max_workers)
+
+        self.threads = [threading.Thread(target=self.run_worker, name=f"evaluation-worker-{i}", daemon=True) for i in range(self.max_workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            pending = [task for _, _, task in self.queue if task.queued]
+            self.queue = []
+            self.condition.notify_all()
+
+        for task in pending:
+            task.future.set_exception(RuntimeError("The evaluation server has been closed."))
+
+        for thread in self.threads:
+            thread.join()
+
+        self.engine.close()
+
+    def warm_up(self):
+        """
+        Starts the simulators of every registered game, so the first requests do not wait for them.
+        """
+        for game_name, evaluator in EVALUATOR_REGISTRY.items():
+            n_ready = evaluator.warm_up(self.max_workers)
+            print(f"{n_ready} simulation workers ready for {game_name}.")
+
+    def submit(self, game_name, levels, priority=None):
+        """
+        Queues the levels for evaluation and returns a Future for each one, whose result is its LevelStats.
+
+        Args:
+            game_name (str): Name of the game in EVALUATOR_REGISTRY.
+            levels (list): (level name, level) pairs.
+            priority (int): Priority of the levels (lower values are evaluated first). By default, it depends on the
+                number of levels (see interactive_request_levels).
+        """
+        if game_name not in EVALUATOR_REGISTRY:
+            raise ValueError(f"No evaluator registered for the game {game_name}.")
+        evaluator = EVALUATOR_REGISTRY[game_name]
+
+        if priority is None:
+            priority = INTERACTIVE_PRIORITY if len(levels) <= interactive_request_levels else BULK_PRIORITY
+
+        futures = []
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("The evaluation server has been closed.")
+
+            for level_name, level in levels:
+                key = EvaluationCache.compute_key(level, game_name, evaluator)
+                task = self.in_flight.get(key)
+
+                if task is None:
+                    task = LevelTask(priority, game_name, key, level_name, level)
+                    self.in_flight[key] = task
+                    heapq.heappush(self.queue, (priority, next(self.sequence), task))
+                elif task.queued and priority < task.priority:
+                    # The level is queued again with the new priority, and the old entry is skipped when it is reached
+                    task.priority = priority
+                    heapq.heappush(self.queue, (priority, next(self.sequence), task))
+
+                futures.append(task.future)
+
+            self.n_requests += 1
+            self.n_levels += len(levels)
+            self.condition.notify_all()
+
+        return futures
+
+    def next_batch(self):
+        """
+        Takes the next work unit from the queue, waiting until there is one. Returns an empty list when the server
+        is closed.
+        """
+        with self.condition:
+            while not self.queue and not self.closed:
+                self.condition.wait()
+
+            # Short queues are split among the workers instead of being evaluated by one of them
+            size = max(1, min(self.batch_size, len(self.queue) // self.max_workers))
+
+            batch = []
+            while self.queue and len(batch) < size:
+                priority, _, task = self.queue[0]
+                if batch and (priority != batch[0].priority or task.game_name != batch[0].game_name):
+                    break
+
+                heapq.heappop(self.queue)
+                if task.queued and task.priority == priority:
+                    task.queued = False
+                    batch.append(task)
+
+            return batch
+
+    def run_worker(self):
+        while True:
+            batch = self.next_batch()
+            if not batch:
+                with self.condition:
+                    if self.closed:
+                        return
+                continue
+
+            self.evaluate_batch(batch)
+
+    def evaluate_batch(self, batch):
+        game_name = batch[0].game_name
+        evaluator = EVALUATOR_REGISTRY[game_name]
+
+        try:
+            results = [evaluate_level(task.level_name, task.level, evaluator, True, game_name, self.cache) for task in batch]
+
+            # The characteristics of the valid levels evaluated now are computed at once
+            new_valid_levels_stats = [level_stats for level_stats, is_new in results if is_new and level_stats.is_valid]
+            levels = [level_stats.grid if level_stats.grid is not None else level_stats.level for level_stats in new_valid_levels_stats]
+            for level_stats, characteristics in zip(new_valid_levels_stats, evaluator.evaluate_characteristics_batch(levels)):
+                level_stats.characteristics = characteristics
+
+            for task, (level_stats, is_new) in zip(batch, results):
+                # Timeouts and failed simulation processes can be transient (e.g. an overloaded machine or a missing
+                # JVM), so the level is simulated again next time
+                if is_new and self.cache is not None and level_stats.simulation_completed:
+                    self.cache.put(task.key, level_stats)
+        except Exception as e:
+            results = None
+            error = e
+
+        with self.condition:
+            for task in batch:
+                del self.in_flight[task.key]
+            self.n_evaluated_levels += sum(is_new for _, is_new in results) if results is not None else 0
+            self.n_batches += 1
+
+        for i, task in enumerate(batch):
+            if results is not None:
+                task.future.set_result(results[i][0])
+            else:
+                task.future.set_exception(error)
+
+    def evaluate_request(self, request):
+        """
+        Evaluates the levels of a request and returns the stats of every level and the metrics of the set.
+
+        Args:
+            request (dict): Request with the fields:
+                game_name (str): Name of the game (Super Mario Bros by default).
+                levels (list): Levels as strings, arrays of tile indices or dictionaries with "level" and, optionally,
+                    "level_name" and "generation_time" (in nanoseconds, as in times.csv).
+                priority (int): Priority of the levels (optional, lower values are evaluated first).
+                characteristic_ranges (list): Minimum and maximum value of every characteristic, as two dictionaries
+                    (optional, see BenchmarkSession).
+                n_intervals_per_dimension (int): Number of intervals of each dimension of the diversity archive.
+
+        Returns:
+            dict: The LevelStats of the levels (in the order of the request) and the SessionMetrics of the set.
+        """
+        if not isinstance(request.get("levels"), list):
+            raise ValueError("The request must contain a list of levels.")
+
+        game_name = request.get("game_name", "Super Mario Bros")
+        if game_name not in EVALUATOR_REGISTRY:
+            raise ValueError(f"No evaluator registered for the game {game_name}.")
+
+        session = BenchmarkSession(game_name, max_workers=1, n_intervals_per_dimension=request.get("n_intervals_per_dimension", 10), \
+                                   characteristic_ranges=request.get("characteristic_ranges"), name="request")
+
+        levels = []
+        generation_times = []
+        for i, item in enumerate(request["levels"]):
+            if isinstance(item, dict):
+                if "level" not in item:
+                    raise ValueError(f"Level {i} of the request does not contain a level.")
+                level_name, level, generation_time = item.get("level_name", f"level_{i}.txt"), item["level"], item.get("generation_time")
+            else:
+                level_name, level, generation_time = f"level_{i}.txt", item, None
+
+            levels.append((level_name, session.to_level_string(level)))
+            generation_times.append(generation_time)
+
+        priority = request.get("priority")
+        if priority is not None and not isinstance(priority, int):
+            raise ValueError("The priority must be an integer.")
+
+        futures = self.submit(game_name, levels, priority)
+
+        # Identical levels share their results, so every one is renamed as in the request
+        levels_stats = [future.result().model_copy(update={"level_name": level_name}) for future, (level_name, _) in zip(futures, levels)]
+        for level_stats, generation_time in zip(levels_stats, generation_times):
+            session.record(level_stats, generation_time)
+
+        return {
+            "levels": [level_stats.model_dump(mode="json") for level_stats in levels_stats],
+            "metrics": session.metrics(self.engine).model_dump(mode="json"),
+        }
+
+    def status(self):
+        with self.condition:
+            return {
+                "queued_levels": sum(task.queued for _, _, task in self.queue),
+                "levels_in_progress": len(self.in_flight),
+                "workers": self.max_workers,
+                "batch_size": self.batch_size,
+                "requests": self.n_requests,
+                "levels": self.n_levels,
+                "evaluated_levels": self.n_evaluated_levels,
+                "batches": self.n_batches,
+            }
+
+class EvaluationRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP interface of an EvaluationServer (stored as the evaluation_server attribute of the HTTP server):
+     - POST /evaluate: evaluates the levels of the JSON request (see EvaluationServer.evaluate_request).
+     - GET /status: state of the queue and number of levels evaluated.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def send_json(self, status, content):
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/status":
+            self.send_json(404, {"error": f"Unknown path {self.path}."})
+            return
+
+        self.send_json(200, self.server.evaluation_server.status())
+
+    def do_POST(self):
+        if self.path != "/evaluate":
+            self.send_json(404, {"error": f"Unknown path {self.path}."})
+            return
+
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if not isinstance(request, dict):
+                raise ValueError("The request must be a JSON object.")
+            response = self.server.evaluation_server.evaluate_request(request)
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        self.send_json(200, response)
+
+    def address_string(self):
+        # Clients connected through a Unix socket do not have an address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix socket"
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+def create_http_server(evaluation_server, host="127.0.0.1", port=8765, unix_socket=None):
+    """
+    Returns the HTTP server of the evaluation server, listening on the Unix socket if it is given (only accessible
+    from this machine) or on host:port otherwise.
+    """
+    if unix_socket is not None:
+        http_server = UnixHTTPServer(unix_socket, EvaluationRequestHandler)
+    else:
+        http_server = ThreadingHTTPServer((host, port), EvaluationRequestHandler)
+
+    http_server.evaluation_server = evaluation_server
+    return http_server
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_socket = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_socket)
+
+class EvaluationClient:
+    """
+    Client of a running evaluation server (see src/serve_evaluations.py).
+
+    Example:
+        client = EvaluationClient("127.0.0.1:8765")
+        levels_stats, metrics = client.evaluate(levels)
+
+    Args:
+        address (str): host:port of the server, or path of its Unix socket.
+        timeout (float): Maximum time (in seconds) to wait for the response of a request (None for no limit).
+    """
+    def __init__(self, address, timeout=None):
+        self.address = address
+        self.timeout = timeout
+
+    def connection(self):
+        if ":" in self.address and "/" not in self.address:
+            host, port = self.address.rsplit(":", 1)
+            return http.client.HTTPConnection(host, int(port), timeout=self.timeout)
+        return UnixHTTPConnection(self.address, timeout=self.timeout)
+
+    def request(self, method, path, content=None):
+        connection = self.connection()
+        try:
+            body = json.dumps(content).encode("utf-8") if content is not None else None
+            connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            result = json.loads(response.read())
+        finally:
+            connection.close()
+
+        if response.status != 200:
+            raise RuntimeError(f"The evaluation server returned {response.status}: {result.get('error')}")
+        return result
+
+    def evaluate(self, levels, game_name="Super Mario Bros", priority=None, characteristic_ranges=None, n_intervals_per_dimension=10):
+        """
+        Evaluates the levels (strings, lists of tile indices or dictionaries, see EvaluationServer.evaluate_request)
+        and returns their LevelStats and the SessionMetrics of the set.
+        """
+        levels = [level.tolist() if isinstance(level, np.ndarray) else level for level in levels]
+
+        request = {"game_name": game_name, "levels": levels, "n_intervals_per_dimension": n_intervals_per_dimension}
+        if priority is not None:
+            request["priority"] = priority
+        if characteristic_ranges is not None:
+            request["characteristic_ranges"] = characteristic_ranges
+
+        response = self.request("POST", "/evaluate", request)
+        return [LevelStats(**level_stats) for level_stats in response["levels"]], SessionMetrics(**response["metrics"])
+
+    def status(self):
+        return self.request("GET", "/status")
@@ -1,6 +1,10 @@
 from abc import ABC, abstractmethod
-from pydantic import BaseModel, Field
+from typing import ClassVar
+from pydantic import BaseModel, Field, PrivateAttr
+import stats.profiling as profiling
 from stats.level_stats import LevelStats
+from stats.simulation_orchestrator import SimulationTimeoutError, SimulationProcessError
+from stats.level_grid import LevelGrid, INVALID_CHARACTER, build_character_lookup
 
 class GameEvaluator(ABC, BaseModel):
     """
@@ -12,6 +16,12 @@ class GameEvaluator(ABC, BaseModel):
     num_rows: int = Field(..., description="Number of rows in the level", gt=0)
     num_cols: int = Field(..., description="Number of columns in the level", gt=0)
 
+    # Version of the evaluation rules. Increase it whenever a change modifies the results, so cached results are not reused
+    evaluator_version: ClassVar[str] = "1"
+
+    # Maps every character to its index in the valid characters, so levels can be parsed into a LevelGrid
+    _character_lookup = PrivateAttr(default=None)
+
     def model_post_init(self, __context):
         """
         Post-initialization method to validate the model's attributes.
@@ -24,6 +34,10 @@ class GameEvaluator(ABC, BaseModel):
             raise ValueError("get_valid_characters() must return a non-empty list")
         if not all(isinstance(c, str) and len(c) == 1 for c in valid_chars):
             raise ValueError("All valid characters must be single-character strings")
+        if len(valid_chars) >= INVALID_CHARACTER:
+            raise ValueError(f"get_valid_characters() must return less than {INVALID_CHARACTER} characters")
+
+        self._character_lookup = build_character_lookup(valid_chars)
         
     @property
     def valid_characters(self) -> list:
@@ -32,28 +46,39 @@ class GameEvaluator(ABC, BaseModel):
         """
         return self.get_valid_characters()
 
+    def get_cache_settings(self) -> dict:
+        """
+        Returns the settings (apart from the level, the grid size and the evaluator version) that affect the
+        evaluation results. They are part of the key of the evaluation cache.
+
+        This method can be overridden by subclasses, e.g. to include the configuration of the simulator.
+        """
+        return {}
+
+    def parse_level(self, level: str) -> LevelGrid:
+        """
+        Parses the level into a LevelGrid, which is shared by every evaluation stage. The tiles of the grid are the
+        indices of the characters in get_valid_characters().
+        """
+        if isinstance(level, LevelGrid):
+            return level
+
+        return LevelGrid(level, self._character_lookup)
+
     def validate_characters(self, level: str) -> bool:
         """
         Validates that all characters in the level are within the valid character set.
 
         Note: This method ignores the newline characters.
         """
-        return all(c in self.valid_characters for c in "".join(level.splitlines()))
+        return self.parse_level(level).has_valid_characters
     
     def validate_size(self, level: str) -> bool:
         """
         Validates that the level size is correct.
         """
         # Check if the level has the expected number of rows and columns
-        rows = level.splitlines()
-        if len(rows) != self.num_rows:
-            return False
-
-        for row in rows:
-            if len(row) != self.num_cols:
-                return False
-
-        return True
+        return self.parse_level(level).shape == (self.num_rows, self.num_cols)
     
     def validate_visual_integrity(self, level: str) -> bool:
         """
@@ -63,15 +88,18 @@ class GameEvaluator(ABC, BaseModel):
         """
         return True
 
-    def evaluate(self, level_path: str, level: str, parallelization : bool) -> LevelStats:
+    def evaluate(self, level_path: str, level: str, parallelization : bool, compute_characteristics : bool = True) -> LevelStats:
         """
         The main evaluation method that:
          1. Removes the last character if it's a newline.
          2. Checks that the level contains only valid characters.
          3. Checks that the level has the correct size.
          4. Checks that the level has visual integrity.
-         5. Simulates a playthrough of the level and returns the results.
-         6. Evaluates the level's characteristics.
+         5. Simulates a playthrough of the level and returns the results. If the simulation raises
+            SimulationTimeoutError, the level is marked as timed out (and not playable). If the simulation process
+            fails every time it is launched (SimulationProcessError), the level is marked as failed (and not playable).
+         6. Evaluates the level's characteristics (unless compute_characteristics is False, so that they can be
+            computed later for a whole set of levels with evaluate_characteristics_batch).
         
         Returns the results as a tuple of (playability, actions, characteristics).
         """
@@ -80,6 +108,8 @@ class GameEvaluator(ABC, BaseModel):
         has_valid_size = False
         has_visual_integrity = False
         is_playable = False
+        timed_out = False
+        simulation_failed = False
         actions = []
         characteristics = {}
         level_name = level_path.split("/")[-1]
@@ -87,19 +117,35 @@ class GameEvaluator(ABC, BaseModel):
         if level[-1] == "\n":
             level = level[:-1]
 
-        has_valid_characters = self.validate_characters(level)
+        # Parse the level once for every stage
+        with profiling.stage("parse"):
+            level = self.parse_level(level)
 
-        if has_valid_characters:
-            has_valid_size = self.validate_size(level)
+        with profiling.stage("validation"):
+            has_valid_characters = self.validate_characters(level)
+
+            if has_valid_characters:
+                has_valid_size = self.validate_size(level)
 
+        if has_valid_characters:
             if has_valid_size:
-                has_visual_integrity = self.validate_visual_integrity(level)
+                with profiling.stage("visual integrity"):
+                    has_visual_integrity = self.validate_visual_integrity(level)
 
                 if has_visual_integrity:
-                    is_playable, actions = self.simulation_data(level_path, level)
-
-                    if is_playable:
-                        characteristics = self.evaluate_characteristics(level)
+                    try:
+                        with profiling.stage("simulation"):
+                            is_playable, actions = self.simulation_data(level_path, level)
+                    except SimulationTimeoutError:
+                        # Recorded apart, as the playability of the level is unknown
+                        timed_out = True
+                    except SimulationProcessError:
+                        # Recorded apart too (e.g. Java is not installed), so it is not stored as an unplayable level
+                        simulation_failed = True
+
+                    if is_playable and compute_characteristics:
+                        with profiling.stage("characteristics"):
+                            characteristics = self.evaluate_characteristics(level)
 
                         for key, value in characteristics.items():
                             if not isinstance(value, float):
@@ -122,14 +168,17 @@ class GameEvaluator(ABC, BaseModel):
         # Create a LevelStats object to store the results
         level_stats = LevelStats(
             level_name=level_name,
-            level=level,
+            level=str(level),
             has_valid_characters=has_valid_characters,
             has_valid_size=has_valid_size,
             has_visual_integrity=has_visual_integrity,
             is_playable=is_playable,
+            timed_out=timed_out,
+            simulation_failed=simulation_failed,
             actions=actions,
             characteristics=characteristics
         )
+        level_stats.grid = level
 
         '''print(f"Level {level_path} evaluation results:")
         print(f"  - Valid characters: {has_valid_characters}")
@@ -142,6 +191,32 @@ class GameEvaluator(ABC, BaseModel):
 
         return level_stats
     
+    def warm_up(self, n_workers: int) -> int:
+        """
+        Prepares the evaluator to simulate up to n_workers levels at the same time (e.g. by starting the simulators in
+        advance in a long-running server) and returns the number of simulators ready.
+
+        This method can be overridden by subclasses whose simulators are slow to start.
+        """
+        return 0
+
+    def limit_simulators(self, n_workers: int):
+        """
+        Limits the simulators kept alive to n_workers (e.g. when an autoscaler reduces the number of levels evaluated
+        at the same time), releasing the memory of the idle ones above it.
+
+        This method can be overridden by subclasses whose simulators are kept alive between levels.
+        """
+        pass
+
+    def evaluate_characteristics_batch(self, levels: list[str]) -> list[dict[str, float]]:
+        """
+        Evaluates the characteristics of a set of valid levels at once.
+
+        This method can be overridden by subclasses in order to provide a vectorized implementation.
+        """
+        return [self.evaluate_characteristics(level) for level in levels]
+
     @abstractmethod
     def get_valid_characters(self) -> list:
         """
@@ -154,7 +229,8 @@ class GameEvaluator(ABC, BaseModel):
         """
         Abstract method to simulate a playthrough of the level and return the results. It should return a tuple containing:
          1) A boolean indicating whether the level is playable.
-         2) A list of actions taken during the simulation.
+         2) The actions taken during the simulation (a list or an array of non-negative integers, or of strings
+            of integers; they are stored with stats.action_sequences.encode_actions).
         Note: It includes the level file path as a parameter in case it is necessary.
         """
         pass
@@ -0,0 +1,80 @@
+import java.io.BufferedReader;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.util.ArrayList;
+
+import engine.core.MarioGame;
+import engine.core.MarioResult;
+
+/**
+ * Long-lived version of PerformSimulation. The framework is loaded once and then
+ * levels are read from stdin one after another.
+ *
+ * Request (stdin):  "<max_simulations> <n_lines>" followed by the n_lines rows of the level.
+ * Response (stdout): the same three lines printed by PerformSimulation (playable flag,
+ *                    number of simulations performed and comma-separated actions, which
+ *                    may be empty).
+ *
+ * "READY" is printed once the worker is able to accept levels.
+ */
+public class SimulationWorker {
+    public static void main(String[] args) throws IOException {
+        BufferedReader reader = new BufferedReader(new InputStreamReader(System.in));
+
+        // Keep stdout for the protocol only; anything printed by the engine goes to stderr
+        PrintStream output = System.out;
+        System.setOut(System.err);
+
+        output.println("READY");
+        output.flush();
+
+        String header;
+        while ((header = reader.readLine()) != null) {
+            String[] fields = header.trim().split(" ");
+            if (fields.length < 2) {
+                break;
+            }
+
+            int maxSimulations = Integer.parseInt(fields[0]);
+            int nLines = Integer.parseInt(fields[1]);
+
+            StringBuilder level = new StringBuilder();
+            for (int i = 0; i < nLines; i++) {
+                String line = reader.readLine();
+                if (line == null) {
+                    return;
+                }
+                level.append(line).append("\n");
+            }
+
+            ArrayList<Integer> marioActions = new ArrayList<>();
+            boolean isPlayable = false;
+            int count;
+
+            for (count = 0; count < maxSimulations && !isPlayable; count++) {
+                MarioGame game = new MarioGame();
+                MarioResult result = game.runGame(new agents.robinBaumgarten.Agent(), level.toString(), 20, 0, false);
+
+                isPlayable = result.getCompletionPercentage() >= 1;
+
+                if (isPlayable) {
+                    marioActions = result.getMarioActions();
+                }
+            }
+
+            StringBuilder actions = new StringBuilder();
+            for (int i = 0; i < marioActions.size(); i++) {
+                if (i > 0) {
+                    actions.append(",");
+                }
+                actions.append(marioActions.get(i));
+            }
+
+            output.println(isPlayable ? "1" : "0");
+            output.println(count);
+            output.println(actions);
+            output.flush();
+        }
+    }
+}
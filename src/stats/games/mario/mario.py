@@ -1,20 +1,59 @@
+import numpy as np
+
 from stats.games.base_game_evaluator import GameEvaluator
-from stats.games.mario.mario_tiles import TILES
+from stats.games.mario.mario_tiles import TILES, encode_levels
+from stats.level_grid import LevelGrid
 import stats.games.mario.mario_simulation_data as mario_simulation_data
 import stats.games.mario.mario_characteristics as mario_characteristics
+import stats.games.mario.mario_batch_characteristics as mario_batch_characteristics
 import stats.games.mario.mario_visual_integrity as mario_visual_integrity
+import stats.games.mario.mario_batch_visual_integrity as mario_batch_visual_integrity
 
 class MarioEvaluator(GameEvaluator):
     def get_valid_characters(self):
         # Define valid characters for Super Mario Bros
         return TILES
 
+    def get_cache_settings(self):
+        if mario_simulation_data.stand_in_simulator is not None:
+            return {
+                "max_simulations": mario_simulation_data.max_simulations,
+                "simulator_checksum": mario_simulation_data.stand_in_simulator.checksum(),
+            }
+
+        return {
+            "max_simulations": mario_simulation_data.max_simulations,
+            "simulator_checksum": mario_simulation_data.simulator_checksum(),
+        }
+
     def evaluate_characteristics(self, level):
+        # Parsed levels already contain the tiles (valid characters are TILES, so the indices are the same)
+        if isinstance(level, LevelGrid) and level.tiles is not None:
+            return mario_batch_characteristics.evaluate_characteristics_batch(level.tiles[None])[0]
+
         return mario_characteristics.evaluate_characteristics(level)
 
+    def evaluate_characteristics_batch(self, levels):
+        if all(isinstance(level, LevelGrid) and level.tiles is not None for level in levels) and len(levels) > 0:
+            tiles = np.stack([level.tiles for level in levels])
+        else:
+            tiles = encode_levels(levels, self.num_rows, self.num_cols)
+
+        return mario_batch_characteristics.evaluate_characteristics_batch(tiles)
+
     def simulation_data(self, level_file, level):
-        return mario_simulation_data.simulation_data(level_file)
+        return mario_simulation_data.simulation_data(level_file, level)
+
+    def warm_up(self, n_workers):
+        return mario_simulation_data.warm_up(n_workers)
+
+    def limit_simulators(self, n_workers):
+        mario_simulation_data.limit_workers(n_workers)
 
     def validate_visual_integrity(self, level):
         # Check if the level has visual integrity
-        return mario_visual_integrity.validate_visual_integrity(level)
\ No newline at end of file
+        if isinstance(level, LevelGrid) and level.tiles is not None:
+            has_visual_integrity, _ = mario_batch_visual_integrity.validate_visual_integrity_batch(level.tiles[None])
+            return bool(has_visual_integrity[0])
+
+        return mario_visual_integrity.validate_visual_integrity(level)
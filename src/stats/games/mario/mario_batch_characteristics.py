@@ -0,0 +1,153 @@
+import numpy as np
+
+from stats.games.mario.mario_tiles import *
+from stats.games.mario.mario_characteristics import MarioCharacteristics
+
+PLATFORM_TILES = [TILE_INDEX[tile] for tile in [GROUND, BREAKABLE, FULL_QUESTION_BLOCK, EMPTY_QUESTION_BLOCK]]
+PASSABLE_TILES = [TILE_INDEX[tile] for tile in [EMPTY, COIN, ENEMY]]
+DECORATION_TILES = [TILE_INDEX[tile] for tile in TILES if tile != GROUND and tile != EMPTY]
+
+def sequential_sum(values):
+    """
+    Sums the last axis from left to right, the same order used by the built-in sum() of the reference implementation.
+    """
+    if values.shape[-1] == 0:
+        return np.zeros(values.shape[:-1])
+    return np.cumsum(values, axis=-1)[..., -1]
+
+def evaluate_characteristics_batch(tiles):
+    """
+    Computes the characteristics of a whole set of levels with array operations.
+
+    The results match MarioCharacteristics. The exact values are the same except for linearity, whose regression
+    line may differ in the last bits of precision. Levels without a regression line (where MarioCharacteristics
+    fails) are delegated to the reference implementation.
+
+    Args:
+        tiles (np.ndarray): (n_levels, height, width) tensor created with encode_levels.
+
+    Returns:
+        list: A dictionary of characteristics for each level.
+    """
+    n_levels, height, width = tiles.shape
+
+    if n_levels == 0:
+        return []
+
+    ys, xs = np.indices((height, width))
+
+    counts = np.stack([(tiles == index).sum(axis=(1, 2)) for index in range(len(TILES))], axis=1)
+
+    # Platforms: solid blocks that are at the top of the level or under a passable tile
+    under_passable = np.ones(tiles.shape, dtype=bool)
+    under_passable[:, 1:, :] = np.isin(tiles[:, :-1, :], PASSABLE_TILES)
+    platforms = np.isin(tiles, PLATFORM_TILES) & under_passable
+    n_platforms = platforms.sum(axis=(1, 2))
+
+    # Gaps: groups of consecutive columns without ground blocks
+    gap_columns = ~(tiles == TILE_INDEX[GROUND]).any(axis=1)
+    gap_starts = gap_columns.copy()
+    gap_starts[:, 1:] &= ~gap_columns[:, :-1]
+    n_gaps = gap_starts.sum(axis=1)
+    total_gap_width = gap_columns.sum(axis=1)
+    average_gap_width = np.divide(total_gap_width, n_gaps, out=np.zeros(n_levels), where=n_gaps > 0)
+
+    # Linearity: mean absolute residual of the regression line of the platforms
+    min_x = np.where(platforms, xs, width).min(axis=(1, 2))
+    max_x = np.where(platforms, xs, -1).max(axis=(1, 2))
+    has_regression = (n_platforms > 0) & (min_x != max_x)
+    safe_n_platforms = np.where(has_regression, n_platforms, 1)
+
+    mean_x = (platforms * xs).sum(axis=(1, 2)) / safe_n_platforms
+    mean_y = (platforms * ys).sum(axis=(1, 2)) / safe_n_platforms
+    centered_x = np.where(platforms, xs - mean_x[:, None, None], 0.0)
+    centered_y = np.where(platforms, ys - mean_y[:, None, None], 0.0)
+    ssxm = (centered_x * centered_x).sum(axis=(1, 2)) * (1 / safe_n_platforms)
+    ssxym = (centered_x * centered_y).sum(axis=(1, 2)) * (1 / safe_n_platforms)
+    slope = np.divide(ssxym, ssxm, out=np.zeros(n_levels), where=has_regression)
+    intercept = mean_y - slope * mean_x
+
+    residuals = np.abs(ys - (slope[:, None, None] * xs + intercept[:, None, None]))
+    residuals = np.where(platforms, residuals, 0.0).reshape(n_levels, -1)
+    linearity = -(sequential_sum(residuals) / safe_n_platforms)
+
+    # Leniency
+    total_sum = counts[:, TILE_INDEX[FULL_QUESTION_BLOCK]] * (1) + \
+        counts[:, TILE_INDEX[TOP_CANNON]] * (-0.5) + \
+        counts[:, TILE_INDEX[TOP_LEFT_PIPE]] * (-0.5) + \
+        n_gaps * (-0.5) + \
+        counts[:, TILE_INDEX[ENEMY]] * (-1) + \
+        average_gap_width * (-1)
+    leniency = total_sum / width
+
+    # Density
+    density = n_platforms / width
+
+    # Simmetry: differences between the four quadrants of the level
+    non_empty = tiles != TILE_INDEX[EMPTY]
+    limit_down = height // 2 + height % 2
+    limit_right = width // 2 + width % 2
+    distance_x = np.abs(np.arange(width) - (width - 1) / 2)
+    distance_y = np.abs(np.arange(height) - (height - 1) / 2)
+
+    def quadrant_data(row_slice, col_slice):
+        quadrant = non_empty[:, row_slice, col_slice]
+        return (
+            (quadrant.sum(axis=1) * distance_x[col_slice]).sum(axis=1),
+            (quadrant.sum(axis=2) * distance_y[row_slice]).sum(axis=1),
+            quadrant.sum(axis=(1, 2)).astype(float),
+        )
+
+    up_left = quadrant_data(slice(0, height // 2), slice(0, width // 2))
+    up_right = quadrant_data(slice(0, height // 2), slice(limit_right, width))
+    down_left = quadrant_data(slice(limit_down, height), slice(0, width // 2))
+    down_right = quadrant_data(slice(limit_down, height), slice(limit_right, width))
+
+    simmetry = np.zeros(n_levels)
+    for k in range(3):
+        simmetry += np.abs(up_left[k] - up_right[k]) + \
+            np.abs(down_left[k] - down_right[k]) + \
+            np.abs(up_left[k] - down_left[k]) + \
+            np.abs(up_right[k] - down_right[k]) + \
+            np.abs(up_left[k] - down_right[k]) + \
+            np.abs(up_right[k] - down_left[k])
+    simmetry = -simmetry
+
+    # Balance: weight of the upper half of the level against the (flipped) lower half
+    mid_height = height // 2
+    lower_start = mid_height if height % 2 == 0 else mid_height + 1
+    weights = np.abs(np.arange(mid_height) - mid_height)
+    top_weight = (non_empty[:, :mid_height, :].sum(axis=2) * weights).sum(axis=1)
+    bottom_weight = (non_empty[:, lower_start:, :][:, ::-1, :].sum(axis=2) * weights).sum(axis=1)
+    balance = np.abs(top_weight - bottom_weight)
+
+    # Decoration frequency
+    decoration_frequency = counts[:, DECORATION_TILES].sum(axis=1) / (width * height)
+
+    # Enemy sparsity: mean horizontal distance of the enemies to their mean position
+    enemies = tiles == TILE_INDEX[ENEMY]
+    n_enemies = counts[:, TILE_INDEX[ENEMY]]
+    safe_n_enemies = np.where(n_enemies > 0, n_enemies, 1)
+    mean_enemy_x = (enemies * xs).sum(axis=(1, 2)) / safe_n_enemies
+    enemy_distances = np.where(enemies, np.abs(xs - mean_enemy_x[:, None, None]), 0.0).reshape(n_levels, -1)
+    enemy_sparsity = sequential_sum(enemy_distances) / safe_n_enemies
+
+    characteristics = []
+    for i in range(n_levels):
+        if not has_regression[i]:
+            # Use the reference implementation, which reports the problem with this level
+            level = "\n".join("".join(TILES[index] for index in row) for row in tiles[i])
+            characteristics.append(MarioCharacteristics(level).characteristics)
+            continue
+
+        characteristics.append({
+            "linearity": float(linearity[i]),
+            "leniency": float(leniency[i]),
+            "density": float(density[i]),
+            "simmetry": float(simmetry[i]),
+            "balance": int(balance[i]),
+            "decoration_frequency": float(decoration_frequency[i]),
+            "enemy_sparsity": float(enemy_sparsity[i]) if n_enemies[i] > 0 else 0,
+        })
+
+    return characteristics
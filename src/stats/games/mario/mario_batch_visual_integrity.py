@@ -0,0 +1,126 @@
+import numpy as np
+
+from stats.games.mario.mario_tiles import *
+
+# Rules checked by validate_visual_integrity, in the same order
+VISUAL_INTEGRITY_RULES = [
+    "top_pipe_pairs",           # Every top-left part of a pipe has a top-right part and viceversa
+    "body_pipe_pairs",          # Every left part of a pipe body has a right part and viceversa
+    "pipe_body_connection",     # Every body part of a pipe is connected to another body part or a top part
+    "cannon_body_connection",   # Every body part of a cannon is connected to another body part or a top part
+    "pipe_columns",             # No pipe bodies without a top part and no consecutive top parts in a column
+    "cannon_columns",           # Same with cannons
+]
+
+def unpaired(tiles, left_tile, right_tile):
+    # A left part must have the right part in the next column, and a right part the left part in the previous one
+    left = tiles == TILE_INDEX[left_tile]
+    right = tiles == TILE_INDEX[right_tile]
+
+    predicted_right = np.zeros_like(left)
+    predicted_right[:, :, 1:] = left[:, :, :-1]
+
+    return left[:, :, -1].any(axis=1) | (predicted_right != right).any(axis=(1, 2))
+
+def disconnected(tiles, top_tile, body_tile):
+    # A body part must have a top or body part right above or below it
+    body = tiles == TILE_INDEX[body_tile]
+    part = body | (tiles == TILE_INDEX[top_tile])
+
+    connected = np.zeros_like(part)
+    connected[:, 1:, :] |= part[:, :-1, :]
+    connected[:, :-1, :] |= part[:, 1:, :]
+
+    return (body & ~connected).any(axis=(1, 2))
+
+def wrong_columns(tiles, top_tile, body_tile):
+    # Same state machine as the reference implementation, run on every column of every level at once
+    n_levels, height, width = tiles.shape
+
+    top_found = np.zeros((n_levels, width), dtype=bool)
+    body_found = np.zeros((n_levels, width), dtype=bool)
+    violation = np.zeros((n_levels, width), dtype=bool)
+
+    for i in range(height):
+        is_top = tiles[:, i, :] == TILE_INDEX[top_tile]
+        is_body = tiles[:, i, :] == TILE_INDEX[body_tile]
+        is_other = ~is_top & ~is_body
+
+        # Two consecutive top parts, or a body without top part followed by another tile
+        violation |= is_top & top_found & ~body_found
+        violation |= is_other & body_found & ~top_found
+
+        top_found = np.where(is_top, top_found | ~body_found, top_found & is_body)
+        body_found = is_body | (body_found & ~is_top & ~is_other)
+
+    violation |= body_found & ~top_found
+
+    return violation.any(axis=1)
+
+def validate_visual_integrity_batch(tiles):
+    """
+    Validate the visual integrity of a batch of Mario levels at once.
+
+    Args:
+        tiles (np.ndarray): (n_levels, height, width) tensor created with encode_levels.
+
+    Returns:
+        tuple: A boolean array indicating which levels have visual integrity, and a list with the first rule
+        of VISUAL_INTEGRITY_RULES violated by each level (None for the levels with visual integrity).
+    """
+    violations = np.stack([
+        unpaired(tiles, TOP_LEFT_PIPE, TOP_RIGHT_PIPE),
+        unpaired(tiles, LEFT_PIPE, RIGHT_PIPE),
+        disconnected(tiles, TOP_LEFT_PIPE, LEFT_PIPE),
+        disconnected(tiles, TOP_CANNON, BODY_CANNON),
+        wrong_columns(tiles, TOP_LEFT_PIPE, LEFT_PIPE),
+        wrong_columns(tiles, TOP_CANNON, BODY_CANNON),
+    ], axis=1)
+
+    has_visual_integrity = ~violations.any(axis=1)
+    first_violations = violations.argmax(axis=1)
+
+    first_violated_rules = [None if valid else VISUAL_INTEGRITY_RULES[rule] for valid, rule in zip(has_visual_integrity, first_violations)]
+
+    return has_visual_integrity, first_violated_rules
+
+def prescreen_levels(levels, num_rows, num_cols):
+    """
+    Checks the characters, the size and the visual integrity of a batch of level strings, without simulating them.
+
+    Args:
+        levels (list): The level strings.
+        num_rows (int): Expected number of rows.
+        num_cols (int): Expected number of columns.
+
+    Returns:
+        tuple: A boolean array indicating which levels pass every check, and a list with the first failed check
+        of each level ("valid_characters", "valid_size" or one of VISUAL_INTEGRITY_RULES; None if it passes).
+    """
+    tiles = np.full((len(levels), num_rows, num_cols), TILE_INDEX[EMPTY], dtype=np.uint8)
+    failed_checks = [None] * len(levels)
+
+    for i, level in enumerate(levels):
+        # The trailing newline is ignored, as in GameEvaluator.evaluate
+        if level.endswith("\n"):
+            level = level[:-1]
+
+        rows = level.splitlines()
+        codes = TILE_LOOKUP[np.frombuffer("".join(rows).encode("utf-8"), dtype=np.uint8)]
+
+        if (codes == INVALID_TILE).any():
+            failed_checks[i] = "valid_characters"
+        elif len(rows) != num_rows or any(len(row) != num_cols for row in rows):
+            failed_checks[i] = "valid_size"
+        else:
+            tiles[i] = codes.reshape(num_rows, num_cols)
+
+    has_visual_integrity, first_violated_rules = validate_visual_integrity_batch(tiles)
+
+    for i in range(len(levels)):
+        if failed_checks[i] is None:
+            failed_checks[i] = first_violated_rules[i]
+
+    passed = np.array([check is None for check in failed_checks], dtype=bool)
+
+    return passed, failed_checks
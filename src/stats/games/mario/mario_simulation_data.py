@@ -1,8 +1,17 @@
-import subprocess
+import os
+import hashlib
+import tempfile
+import functools
+
+import stats.simulation_orchestrator as simulation_orchestrator
+from stats.action_sequences import encode_actions, parse_action_line
+from stats.simulation_orchestrator import get_orchestrator, jvm_memory_mb
+from stats.games.mario.mario_simulation_workers import SimulationWorkerError, get_worker_pool
 
 # Playability computation for Super Mario Bros
 java_path = "java"
 jar_path = "src/stats/games/mario/Mario-AI-Framework/PerformSimulation.jar"
+worker_source_path = "src/stats/games/mario/Mario-AI-Framework/src/SimulationWorker.java"
 #temp_level_path = "temp_level.txt"
 #temp_output_path = "temp_output.txt"
 #temp_error_path = "temp_stderr.txt"
@@ -10,28 +19,32 @@ ram_limit = "-Xmx512m"
 visuals = "False"
 max_simulations = "10"
 
-def simulation_data(level_file):
-    #print("Performing simulation with level " + level_file)
+# When True, levels are simulated by persistent JVM workers instead of launching one JVM per level
+use_worker_pool = True
 
-    arguments = [ram_limit, "-jar", jar_path, level_file, max_simulations]
+# Simulator used instead of the Java one when it is not None (e.g. a SyntheticSimulator, to test the evaluation
+# at scale without Java)
+stand_in_simulator = None
 
-    try:
-        result = subprocess.run([java_path] + arguments, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        output = result.stdout
-    except subprocess.CalledProcessError as e:
-        print(f"ERROR: Unable to compute playability: {e.stderr}")
-        return False, []#, []
-    
-    lines = output.splitlines()
+@functools.cache
+def simulator_checksum():
+    """
+    SHA-256 of the simulation jar and the worker source, so that cached results are invalidated when the simulator changes.
+    """
+    checksum = hashlib.sha256()
+    for path in [jar_path, worker_source_path]:
+        with open(path, "rb") as f:
+            checksum.update(f.read())
+    return checksum.hexdigest()
 
-    #print("Number of simulations performed: ", lines[1])
-    
+def parse_simulation_output(lines):
     if float(lines[0]) == 0.0:
-        return False, []#, []
-    
-    actions = []
+        return False, encode_actions([])#, []
+
+    '''actions = []
     for action in lines[2].split(","):
-        actions.append(action)
+        actions.append(action)'''
+    actions = parse_action_line(lines[2])
 
     '''locations = []
     numbers = lines[2].split(",")
@@ -39,3 +52,85 @@ def simulation_data(level_file):
         locations.append((numbers[i], numbers[i+1]))'''
 
     return True, actions#, locations
+
+def worker_pool():
+    # Each worker is a JVM, so the number of workers is limited by the memory budget of the simulations
+    max_workers = max(1, int(get_orchestrator().memory_budget_mb // jvm_memory_mb(ram_limit)))
+    return get_worker_pool([java_path, ram_limit, "-cp", jar_path, worker_source_path], max_workers)
+
+def warm_up(n_workers):
+    """
+    Starts up to n_workers simulation workers in advance (e.g. in a long-running server).
+    """
+    global use_worker_pool
+
+    if not use_worker_pool or stand_in_simulator is not None:
+        return 0
+
+    try:
+        return worker_pool().warm_up(n_workers)
+    except SimulationWorkerError as e:
+        pool = worker_pool()
+        if pool.n_workers == 0:
+            use_worker_pool = False
+        print(f"\nWARNING: {e} Levels will be simulated with one simulation process per level.")
+        return pool.n_workers
+
+def limit_workers(n_workers):
+    """
+    Limits the number of simulation workers alive to n_workers (e.g. when an autoscaler reduces the number of levels
+    evaluated at the same time), closing the idle ones above it so their memory is released.
+    """
+    if use_worker_pool and stand_in_simulator is None:
+        worker_pool().set_worker_limit(n_workers)
+
+def simulation_data(level_file, level=None):
+    global use_worker_pool
+
+    #print("Performing simulation with level " + level_file)
+
+    if stand_in_simulator is not None:
+        return stand_in_simulator.simulation_data(level_file, level)
+
+    if level is not None and use_worker_pool:
+        pool = worker_pool()
+
+        try:
+            return parse_simulation_output(pool.simulate(level, max_simulations, simulation_orchestrator.timeout))
+        except SimulationWorkerError as e:
+            # Workers need a JDK able to launch SimulationWorker.java. If none of them could be started, stop trying
+            if pool.n_workers == 0:
+                use_worker_pool = False
+            print(f"\nWARNING: {e} Falling back to one simulation process per level.")
+
+    if level is not None:
+        # The given level is always the one simulated, through a temporary file: levels from a packed corpus do not
+        # have a file, and the names of the levels of a session or a server are chosen by the caller, so they must
+        # not be used to read a file
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_level_file = os.path.join(temp_dir, "level.txt")
+            with open(temp_level_file, "w") as f:
+                f.write(level)
+            return single_simulation_data(temp_level_file)
+
+    return single_simulation_data(level_file)
+
+def single_simulation_data(level_file):
+    arguments = [ram_limit, "-jar", jar_path, level_file, max_simulations]
+
+    # The JVM is launched by the orchestrator, which applies the timeout, the retries and the memory budget
+    # (a SimulationTimeoutError is raised if the simulation is killed, and a SimulationProcessError if it fails
+    # every time it is launched, so the level is not reported as an ordinary unplayable level)
+    '''try:
+        result = subprocess.run([java_path] + arguments, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        output = result.stdout
+    except subprocess.CalledProcessError as e:
+        print(f"ERROR: Unable to compute playability: {e.stderr}")
+        return False, encode_actions([])#, []'''
+    output = get_orchestrator().run([java_path] + arguments, jvm_memory_mb(ram_limit))
+
+    lines = output.splitlines()
+
+    #print("Number of simulations performed: ", lines[1])
+
+    return parse_simulation_output(lines)
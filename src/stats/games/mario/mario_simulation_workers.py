@@ -0,0 +1,286 @@
+import os
+import atexit
+import subprocess
+import threading
+import psutil
+
+import stats.profiling as profiling
+
+from stats.simulation_orchestrator import SimulationTimeoutError
+
+class SimulationWorkerError(RuntimeError):
+    """
+    Raised when a simulation worker cannot be started or stops answering.
+    """
+    pass
+
+class SimulationWorker:
+    """
+    A single long-lived JVM running SimulationWorker.java. The Mario-AI-Framework is loaded
+    once and the worker then simulates level after level received through its stdin.
+    """
+    def __init__(self, command):
+        try:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        except OSError as e:
+            raise SimulationWorkerError(f"Unable to start simulation worker: {e}")
+
+        ready = self.process.stdout.readline()
+        if ready.strip() != "READY":
+            self.close()
+            raise SimulationWorkerError("Simulation worker did not start correctly.")
+
+        self.psutil_process = None
+
+    def simulate(self, level, max_simulations, timeout=None):
+        """
+        Sends a level to the worker and returns the three output lines of the simulation
+        (playable flag, number of simulations and comma-separated actions).
+        If the simulation takes longer than timeout seconds, the worker is killed and SimulationTimeoutError is raised.
+        """
+        rows = level.splitlines()
+        request = f"{max_simulations} {len(rows)}\n" + "".join(row + "\n" for row in rows)
+
+        # Killing the worker unblocks the reads of its output
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            self.process.kill()
+
+        watchdog = threading.Timer(timeout, kill) if timeout is not None else None
+        if watchdog is not None:
+            watchdog.start()
+
+        # The worker only simulates this level meanwhile, so the difference of its CPU time is the cost of the level
+        start_cpu_time = self.cpu_time() if profiling.is_profiling_level() else None
+
+        # Its RSS is sampled during the request, since the peak since the JVM started would include the previous levels
+        usage = {}
+        stop_monitor = threading.Event()
+        monitor = threading.Thread(target=self.monitor_rss, args=(stop_monitor, usage), daemon=True) if start_cpu_time is not None else None
+        if monitor is not None:
+            monitor.start()
+
+        try:
+            self.process.stdin.write(request)
+            self.process.stdin.flush()
+            lines = [self.process.stdout.readline() for _ in range(3)]
+        except (OSError, ValueError) as e:
+            lines = None
+            error = e
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+            if monitor is not None:
+                stop_monitor.set()
+                monitor.join()
+
+        if timed_out.is_set():
+            raise SimulationTimeoutError(f"Simulation killed after {timeout} seconds.")
+
+        if lines is None:
+            raise SimulationWorkerError(f"Simulation worker stopped answering: {error}")
+
+        # An empty string (without newline) means the worker closed its stdout
+        if any(not line.endswith("\n") for line in lines):
+            raise SimulationWorkerError("Simulation worker stopped answering.")
+
+        if start_cpu_time is not None:
+            self.record_usage(start_cpu_time, usage)
+
+        return [line.rstrip("\n") for line in lines]
+
+    def cpu_time(self):
+        try:
+            if self.psutil_process is None:
+                self.psutil_process = psutil.Process(self.process.pid)
+            cpu_times = self.psutil_process.cpu_times()
+            return cpu_times.user + cpu_times.system
+        except psutil.Error:
+            return None
+
+    def monitor_rss(self, stop, usage):
+        """
+        Samples the RSS of the worker until stop is set (and once more afterwards), storing the peak (in MB) in usage,
+        as SimulationOrchestrator.monitor_process does for the processes launched per level.
+        """
+        while True:
+            try:
+                usage["peak_rss_mb"] = max(usage.get("peak_rss_mb", 0.0), self.psutil_process.memory_info().rss / 1024 ** 2)
+            except psutil.Error:
+                return # The worker has finished
+
+            if stop.is_set():
+                return
+            stop.wait(profiling.sample_interval)
+
+    def record_usage(self, start_cpu_time, usage):
+        end_cpu_time = self.cpu_time()
+        if end_cpu_time is None:
+            return
+
+        profiling.record_simulation_usage(end_cpu_time - start_cpu_time, usage.get("peak_rss_mb", 0.0))
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+class SimulationWorkerPool:
+    """
+    Pool of simulation workers shared by every evaluation thread. Workers are started lazily,
+    so the pool never holds more JVMs than the number of levels being simulated at the same time.
+    The number of workers can be lowered during the run (see set_worker_limit), e.g. by an autoscaler.
+
+    Args:
+        command (list): Command used to launch each worker.
+        max_workers (int): Maximum number of workers alive at the same time.
+    """
+    def __init__(self, command, max_workers=None):
+        self.command = command
+        self.max_workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+        self.worker_limit = None
+        self.idle_workers = []
+        self.n_workers = 0
+        self.condition = threading.Condition()
+
+    @property
+    def max_alive_workers(self):
+        return self.max_workers if self.worker_limit is None else max(1, min(self.max_workers, self.worker_limit))
+
+    def set_worker_limit(self, worker_limit):
+        """
+        Limits the number of workers alive (None for max_workers). The idle workers above the limit are closed at
+        once, so their memory is released, and the busy ones when they finish their level.
+        """
+        with self.condition:
+            self.worker_limit = worker_limit
+            n_extra = max(0, min(len(self.idle_workers), self.n_workers - self.max_alive_workers))
+            workers = [self.idle_workers.pop() for _ in range(n_extra)]
+            self.n_workers -= n_extra
+            self.condition.notify_all()
+
+        for worker in workers:
+            worker.close()
+
+    def acquire(self):
+        with self.condition:
+            while not self.idle_workers and self.n_workers >= self.max_alive_workers:
+                self.condition.wait()
+
+            if self.idle_workers:
+                return self.idle_workers.pop()
+
+            self.n_workers += 1
+
+        # Start the new worker outside the lock, as the JVM startup is slow
+        try:
+            return SimulationWorker(self.command)
+        except SimulationWorkerError:
+            self.discard(None)
+            raise
+
+    def release(self, worker):
+        with self.condition:
+            if self.n_workers <= self.max_alive_workers:
+                self.idle_workers.append(worker)
+                self.condition.notify()
+                return
+
+        # The limit has been lowered since the worker was acquired
+        self.discard(worker)
+
+    def discard(self, worker):
+        if worker is not None:
+            worker.close()
+
+        with self.condition:
+            self.n_workers -= 1
+            self.condition.notify()
+
+    def simulate(self, level, max_simulations, timeout=None):
+        worker = self.acquire()
+
+        try:
+            lines = worker.simulate(level, max_simulations, timeout)
+        except (SimulationWorkerError, SimulationTimeoutError):
+            self.discard(worker)
+            raise
+
+        self.release(worker)
+
+        return lines
+
+    def warm_up(self, n_workers):
+        """
+        Starts workers (at the same time) until n_workers are alive, without exceeding max_workers, so the first levels
+        do not wait for the startup of the JVMs.
+        """
+        with self.condition:
+            n_new = max(0, min(n_workers, self.max_alive_workers) - self.n_workers)
+            self.n_workers += n_new
+
+        workers = []
+        errors = []
+
+        def start():
+            try:
+                workers.append(SimulationWorker(self.command))
+            except SimulationWorkerError as e:
+                errors.append(e)
+                self.discard(None)
+
+        threads = [threading.Thread(target=start) for _ in range(n_new)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for worker in workers:
+            self.release(worker)
+
+        if errors:
+            raise errors[0]
+
+        return len(workers)
+
+    def shutdown(self):
+        with self.condition:
+            workers = self.idle_workers
+            self.idle_workers = []
+            self.n_workers -= len(workers)
+
+        for worker in workers:
+            worker.close()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_worker_pool(command, max_workers=None):
+    """
+    Returns the pool associated to the given worker command, creating it the first time.
+    """
+    key = tuple(command)
+
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = SimulationWorkerPool(command, max_workers)
+
+        return _pools[key]
+
+@atexit.register
+def shutdown_worker_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+
+    for pool in pools:
+        pool.shutdown()
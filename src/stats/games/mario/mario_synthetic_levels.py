@@ -0,0 +1,185 @@
+import numpy as np
+from pydantic import BaseModel, Field
+
+from stats.games.mario.mario_tiles import *
+
+# Widest gap in the ground (in columns) that Mario can jump. Wider gaps make a synthetic level not playable for the
+# stand-in simulator (see mario_synthetic_simulation)
+max_jump_width = 4
+
+# Characters that are not tiles of Super Mario Bros, used to create levels with invalid characters
+INVALID_CHARACTERS = ["#", "@", "%", "Z"]
+
+class SyntheticLevelSettings(BaseModel):
+    """
+    Class to store the proportions of the synthetic levels that pass every check of the evaluation.
+
+    The rates are nested as the checks of GameEvaluator.evaluate: the visual integrity rate is the fraction of the
+    levels with valid characters and size that have visual integrity, and the playable rate is the fraction of the
+    levels with visual integrity that are playable for the stand-in simulator.
+
+    Attributes:
+        num_rows (int): Number of rows of the levels.
+        num_cols (int): Number of columns of the levels.
+        valid_rate (float): Fraction of levels with valid characters and size.
+        visual_integrity_rate (float): Fraction of the levels with valid characters and size that have visual integrity.
+        playable_rate (float): Fraction of the levels with visual integrity that are playable.
+        seed (int): Seed of the generator.
+    """
+
+    num_rows: int = Field(14, description="Number of rows of the levels.", ge=8)
+    num_cols: int = Field(140, description="Number of columns of the levels.", ge=40)
+    valid_rate: float = Field(0.9, description="Fraction of levels with valid characters and size.", ge=0, le=1)
+    visual_integrity_rate: float = Field(0.9, description="Fraction of the levels with valid characters and size that have visual integrity.", ge=0, le=1)
+    playable_rate: float = Field(0.5, description="Fraction of the levels with visual integrity that are playable.", ge=0, le=1)
+    seed: int = Field(0, description="Seed of the generator.")
+
+def free_columns(surface, used, start, stop):
+    # Columns with ground that are not occupied by a pipe or a cannon
+    return [column for column in range(start, stop) if surface[column] >= 0 and not used[column]]
+
+def generate_tiles(rng, num_rows, num_cols, has_visual_integrity=True, is_playable=True):
+    """
+    Generates the tiles (indices in TILES) of a level with ground, gaps, pipes, cannons, platforms, enemies and coins.
+
+    Args:
+        rng (np.random.Generator): Random generator.
+        num_rows (int): Number of rows of the level.
+        num_cols (int): Number of columns of the level.
+        has_visual_integrity (bool): False to break a visual integrity rule (an unpaired top of a pipe).
+        is_playable (bool): False to add a gap in the ground wider than max_jump_width.
+
+    Returns:
+        np.ndarray: (num_rows, num_cols) array of tiles.
+    """
+    tiles = np.full((num_rows, num_cols), TILE_INDEX[EMPTY], dtype=np.uint8)
+
+    ground_height = int(rng.integers(1, 3))
+    tiles[num_rows - ground_height:, :] = TILE_INDEX[GROUND]
+
+    # Gaps that can be jumped, away from the start and the end of the level
+    column = 6
+    while True:
+        column += int(rng.integers(8, 25))
+        width = int(rng.integers(1, max_jump_width + 1))
+        if column + width > num_cols - 8:
+            break
+        tiles[num_rows - ground_height:, column:column + width] = TILE_INDEX[EMPTY]
+        column += width
+
+    if not is_playable:
+        width = int(rng.integers(max_jump_width + 2, max_jump_width + 7))
+        column = int(rng.integers(8, num_cols - 8 - width))
+        tiles[num_rows - ground_height:, column:column + width] = TILE_INDEX[EMPTY]
+
+    # Row of the surface of the ground in every column (-1 in the gaps)
+    surface = np.where(tiles[-1] == TILE_INDEX[GROUND], num_rows - ground_height, -1)
+    used = np.zeros(num_cols, dtype=bool)
+    used[:3] = True
+
+    # Pipes, two columns wide, standing on the ground
+    for _ in range(int(rng.integers(0, 4))):
+        columns = [column for column in free_columns(surface, used, 0, num_cols - 1) if surface[column + 1] >= 0 and not used[column + 1]]
+        if not columns:
+            break
+        column = int(rng.choice(columns))
+        top = surface[column] - int(rng.integers(2, 5))
+        tiles[top, column], tiles[top, column + 1] = TILE_INDEX[TOP_LEFT_PIPE], TILE_INDEX[TOP_RIGHT_PIPE]
+        tiles[top + 1:surface[column], column] = TILE_INDEX[LEFT_PIPE]
+        tiles[top + 1:surface[column], column + 1] = TILE_INDEX[RIGHT_PIPE]
+        used[max(0, column - 1):column + 3] = True
+
+    # Cannons
+    for _ in range(int(rng.integers(0, 3))):
+        columns = free_columns(surface, used, 0, num_cols)
+        if not columns:
+            break
+        column = int(rng.choice(columns))
+        top = surface[column] - int(rng.integers(1, 4))
+        tiles[top, column] = TILE_INDEX[TOP_CANNON]
+        tiles[top + 1:surface[column], column] = TILE_INDEX[BODY_CANNON]
+        used[max(0, column - 1):column + 2] = True
+
+    # Platforms of blocks, with coins above some of them
+    blocks = [TILE_INDEX[BREAKABLE], TILE_INDEX[FULL_QUESTION_BLOCK], TILE_INDEX[EMPTY_QUESTION_BLOCK]]
+    for _ in range(int(rng.integers(2, 8))):
+        row = num_rows - ground_height - int(rng.integers(4, 7))
+        start = int(rng.integers(0, num_cols - 8))
+        stop = start + int(rng.integers(1, 8))
+        empty = tiles[row, start:stop] == TILE_INDEX[EMPTY]
+        tiles[row, start:stop] = np.where(empty, rng.choice(blocks, stop - start, p=[0.6, 0.3, 0.1]), tiles[row, start:stop])
+
+        if rng.random() < 0.4:
+            empty = tiles[row - 1, start:stop] == TILE_INDEX[EMPTY]
+            tiles[row - 1, start:stop] = np.where(empty, TILE_INDEX[COIN], tiles[row - 1, start:stop])
+
+    # Enemies on the ground
+    columns = free_columns(surface, used, 10, num_cols)
+    for column in rng.choice(columns, min(len(columns), int(rng.integers(0, 10))), replace=False) if columns else []:
+        if tiles[surface[column] - 1, column] == TILE_INDEX[EMPTY]:
+            tiles[surface[column] - 1, column] = TILE_INDEX[ENEMY]
+
+    if not has_visual_integrity:
+        # The top-left part of a pipe without its top-right part
+        rows, columns = np.nonzero(tiles[1:num_rows - ground_height - 1, :num_cols - 1] == TILE_INDEX[EMPTY])
+        position = int(rng.integers(len(rows)))
+        tiles[rows[position] + 1, columns[position]] = TILE_INDEX[TOP_LEFT_PIPE]
+        tiles[rows[position] + 1, columns[position] + 1] = TILE_INDEX[EMPTY]
+
+    return tiles
+
+def tiles_to_level(tiles):
+    return "\n".join("".join(TILES[tile] for tile in row) for row in tiles)
+
+def generate_level(rng, settings):
+    """
+    Generates a synthetic level, deciding which checks it passes with the rates of the settings.
+
+    Returns:
+        tuple: The level string and the expected results of the checks, as a dictionary with the fields of LevelStats
+        (has_valid_characters, has_valid_size, has_visual_integrity and is_playable).
+    """
+    has_valid_characters = has_valid_size = has_visual_integrity = is_playable = True
+
+    if rng.random() >= settings.valid_rate:
+        # Half of the invalid levels have an invalid character and the other half a wrong size
+        has_valid_characters = rng.random() < 0.5
+        has_valid_size = not has_valid_characters
+    elif rng.random() >= settings.visual_integrity_rate:
+        has_visual_integrity = False
+    elif rng.random() >= settings.playable_rate:
+        is_playable = False
+
+    valid = has_valid_characters and has_valid_size
+    tiles = generate_tiles(rng, settings.num_rows, settings.num_cols, has_visual_integrity, is_playable)
+    rows = tiles_to_level(tiles).split("\n")
+
+    if not has_valid_characters:
+        row = int(rng.integers(len(rows)))
+        column = int(rng.integers(len(rows[row])))
+        rows[row] = rows[row][:column] + str(rng.choice(INVALID_CHARACTERS)) + rows[row][column + 1:]
+    elif not has_valid_size:
+        if rng.random() < 0.5:
+            rows = [row[:-1] for row in rows]
+        else:
+            rows = rows[1:]
+
+    expected = {
+        "has_valid_characters": has_valid_characters,
+        "has_valid_size": has_valid_size if has_valid_characters else False,
+        "has_visual_integrity": has_visual_integrity and valid,
+        "is_playable": is_playable and has_visual_integrity and valid,
+    }
+
+    return "\n".join(rows), expected
+
+def generate_levels(n_levels, settings=None):
+    """
+    Generates n_levels synthetic levels lazily, yielding (level, expected results) pairs. The same settings (with the
+    same seed) always generate the same levels.
+    """
+    settings = settings if settings is not None else SyntheticLevelSettings()
+    rng = np.random.default_rng(settings.seed)
+
+    for _ in range(n_levels):
+        yield generate_level(rng, settings)
@@ -0,0 +1,91 @@
+import time
+import hashlib
+import numpy as np
+from pydantic import BaseModel, Field
+
+import stats.games.mario.mario_synthetic_levels as mario_synthetic_levels
+from stats.action_sequences import encode_actions
+from stats.games.mario.mario_tiles import TILE_LOOKUP, TILE_INDEX, INVALID_TILE, GROUND
+
+# Actions of the stand-in simulator (the pressed buttons as a bit mask, as written by the Mario-AI-Framework) and how
+# often the agent chooses each one, similar to the recorded simulations (mostly running to the right and jumping)
+ACTIONS = [10, 11, 8, 9, 16, 18, 0, 1]
+ACTION_WEIGHTS = [0.75, 0.15, 0.035, 0.015, 0.015, 0.015, 0.01, 0.01]
+
+# Mean number of consecutive frames in which the agent repeats the same action
+mean_run_length = 7
+
+class SyntheticSimulator(BaseModel):
+    """
+    Deterministic stand-in for the Java simulator of Super Mario Bros, to test the evaluation at scale without Java.
+
+    A level is playable if the widest gap in the ground is not wider than mario_synthetic_levels.max_jump_width. The
+    actions of a playable level are drawn from a generator seeded with the level, so the same level always gets the
+    same actions. Every simulation waits for the latency, like a simulation process does (without using the CPU).
+
+    Attributes:
+        latency (float): Seconds that every simulation takes.
+        min_actions (int): Minimum number of actions of a playable level.
+        max_actions (int): Maximum number of actions of a playable level.
+    """
+
+    latency: float = Field(0.0, description="Seconds that every simulation takes.", ge=0)
+    min_actions: int = Field(200, description="Minimum number of actions of a playable level.", ge=0)
+    max_actions: int = Field(240, description="Maximum number of actions of a playable level.", ge=0)
+
+    def model_post_init(self, __context):
+        if self.max_actions < self.min_actions:
+            raise ValueError("max_actions must be greater than or equal to min_actions.")
+
+    def checksum(self):
+        """
+        Identifies the settings of the simulator, so the evaluation cache does not mix its results with the ones of the
+        Java simulator or of other settings.
+        """
+        settings = f"synthetic|{mario_synthetic_levels.max_jump_width}|{self.min_actions}|{self.max_actions}|{mean_run_length}|{ACTIONS}|{ACTION_WEIGHTS}"
+        return hashlib.sha256(settings.encode("utf-8")).hexdigest()
+
+    def is_playable(self, level):
+        rows = level.rstrip("\n").split("\n")
+        if len(rows) == 0 or len(rows[-1]) == 0:
+            return False
+
+        codes = TILE_LOOKUP[np.frombuffer(rows[-1].encode("utf-8"), dtype=np.uint8)]
+        if (codes == INVALID_TILE).any():
+            return False
+
+        # Length of the longest run of columns without ground in the bottom row
+        ground = np.concatenate(([True], codes == TILE_INDEX[GROUND], [True]))
+        edges = np.flatnonzero(ground[1:] != ground[:-1])
+        widest_gap = int((edges[1::2] - edges[::2]).max()) if len(edges) > 0 else 0
+
+        return widest_gap <= mario_synthetic_levels.max_jump_width
+
+    def actions(self, level):
+        seed = int.from_bytes(hashlib.sha256(level.rstrip("\n").encode("utf-8")).digest()[:8], "little")
+        rng = np.random.default_rng(seed)
+
+        n_actions = int(rng.integers(self.min_actions, self.max_actions + 1))
+        n_runs = max(1, n_actions // mean_run_length)
+        values = rng.choice(ACTIONS, n_runs, p=ACTION_WEIGHTS)
+        lengths = rng.multinomial(n_actions - n_runs, np.full(n_runs, 1 / n_runs)) + 1 if n_actions >= n_runs else np.ones(n_runs, dtype=np.int64)
+
+        return encode_actions(np.repeat(values, lengths)[:n_actions])
+
+    def simulation_data(self, level_file, level=None):
+        """
+        Same results as mario_simulation_data.simulation_data: the playability of the level and its actions (empty if
+        it is not playable).
+        """
+        if level is None:
+            with open(level_file, "r") as f:
+                level = f.read()
+        level = str(level)
+
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        if not self.is_playable(level):
+            return False, encode_actions([])
+
+        return True, self.actions(level)
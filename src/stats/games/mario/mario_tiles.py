@@ -1,4 +1,5 @@
 import sys
+import numpy as np
 
 GROUND = "X"
 BREAKABLE = "S"
@@ -16,6 +17,14 @@ BODY_CANNON = "b"
 
 TILES = [GROUND, BREAKABLE, EMPTY, FULL_QUESTION_BLOCK, EMPTY_QUESTION_BLOCK, ENEMY, TOP_LEFT_PIPE, TOP_RIGHT_PIPE, LEFT_PIPE, RIGHT_PIPE, COIN, TOP_CANNON, BODY_CANNON]
 
+# Index of every tile in TILES, used to encode the levels as arrays
+TILE_INDEX = {tile: index for index, tile in enumerate(TILES)}
+INVALID_TILE = 255
+
+TILE_LOOKUP = np.full(256, INVALID_TILE, dtype=np.uint8)
+for tile, index in TILE_INDEX.items():
+    TILE_LOOKUP[ord(tile)] = index
+
 def from_int_to_vglc(num):
     try:
         char = TILES[num]
@@ -32,6 +41,37 @@ def from_vglc_to_int(char):
         print("ERROR: Invalid character. Exiting...")
         sys.exit(1)
 
+def encode_levels(levels, num_rows, num_cols):
+    """
+    Encodes a list of levels as a (n_levels, num_rows, num_cols) uint8 tensor with the index of each tile in TILES.
+
+    Args:
+        levels (list): The level strings.
+        num_rows (int): Number of rows of every level.
+        num_cols (int): Number of columns of every level.
+
+    Returns:
+        np.ndarray: The tensor of tiles.
+
+    Raises:
+        ValueError: If a level does not have the expected size or contains invalid tiles.
+    """
+    tiles = np.empty((len(levels), num_rows, num_cols), dtype=np.uint8)
+
+    for i, level in enumerate(levels):
+        rows = level.splitlines()
+        data = "".join(rows).encode("utf-8")
+
+        if len(rows) != num_rows or len(data) != num_rows * num_cols or any(len(row) != num_cols for row in rows):
+            raise ValueError(f"Level {i} does not have size {num_rows}x{num_cols}.")
+
+        tiles[i] = TILE_LOOKUP[np.frombuffer(data, dtype=np.uint8)].reshape(num_rows, num_cols)
+
+    if (tiles == INVALID_TILE).any():
+        raise ValueError("Levels contain invalid tiles.")
+
+    return tiles
+
 ''' "X" : ["solid","ground"],
     "S" : ["solid","breakable"],
     "-" : ["passable","empty"],
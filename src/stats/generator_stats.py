@@ -5,13 +5,23 @@ import sys
 import json
 import ast
 import Levenshtein
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
-from itertools import combinations
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from tqdm import tqdm
 
 from stats.games.registry import EVALUATOR_REGISTRY
 from stats.level_stats import LevelStats
-from stats.diversity_archive import DiversityArchive
+from stats.diversity_archive import DiversityArchive, coverage_curve
+from stats.pairwise_distances import PairwiseDistanceEngine, mean_distance
+from stats.diversity_estimation import DiversitySettings, DiversityEstimate
+from stats.distance_store import DistanceStore
+from stats.level_corpus import LevelCorpus, is_corpus
+from stats.stats_storage import save_stats_npz, load_stats_npz
+from stats.level_stats_table import LevelStatsTable
+from stats.level_manifest import level_hash, manifest_from_table
+from stats.partial_stats import PartialStatsFile, partial_stats_path
+from stats.profiling import Profile, COST_COLUMNS
+import stats.profiling as profiling
 
 def levenshtein_distance(pair):
     '''rows = len(sequence1) + 1
@@ -38,11 +48,62 @@ def levenshtein_distance(pair):
     a, b = pair
     return Levenshtein.distance(a, b)
 
-def evaluate_level(level_path, level, evaluator, parallelization):
-    return evaluator.evaluate(level_path, level, parallelization)
+# Number of levels read and submitted per worker that can be waiting for evaluation at the same time
+in_flight_levels_per_worker = 4
+
+# Number of levels evaluated now whose characteristics are computed (and cached) together
+characteristics_batch_size = 512
+
+def iter_level_files(folder_path):
+    """
+    Lists and reads the level files of a folder lazily, yielding (level path, level) pairs.
+    If the folder is a packed corpus, the levels are decoded from it by chunks instead.
+    """
+    if is_corpus(folder_path):
+        for level_name, level in LevelCorpus(folder_path):
+            yield os.path.join(folder_path, level_name), level
+        return
+
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if entry.name.endswith(".txt"):
+                level_path = os.path.join(folder_path, entry.name)
+
+                with open(level_path, "r") as f:
+                    yield level_path, f.read()
+
+def count_level_files(folder_path):
+    if is_corpus(folder_path):
+        return len(LevelCorpus(folder_path))
+
+    with os.scandir(folder_path) as entries:
+        return sum(1 for entry in entries if entry.name.endswith(".txt"))
+
+def evaluate_level(level_path, level, evaluator, parallelization, game_name = None, cache = None, limit = None, profile = None):
+    """
+    Returns the LevelStats of the level and whether it has been evaluated now (instead of being reused from the cache).
+    The characteristics of the levels evaluated now are not computed here, but later for the whole set at once.
+    If a limit (e.g. the one of an Autoscaler) is given, the level waits for a free slot before being evaluated.
+    If a Profile is given, the stages and the cost of the evaluation are recorded in it.
+    """
+    if limit is not None:
+        with limit:
+            return evaluate_level(level_path, level, evaluator, parallelization, game_name, cache, profile = profile)
+
+    with profiling.level(profile, level_path.split("/")[-1]):
+        if cache is not None:
+            # Reuse the results of an identical level evaluated before (in this or in a previous run)
+            with profiling.stage("cache"):
+                level_stats = cache.get(cache.compute_key(level, game_name, evaluator), level_path.split("/")[-1])
+
+            if level_stats is not None:
+                return level_stats, False
+
+        return evaluator.evaluate(level_path, level, parallelization, compute_characteristics = False), True
 
 class GeneratorStats:
-    def __init__(self, path, parallelization, max_workers):
+    def __init__(self, path, parallelization, max_workers, cache = None, diversity_settings = None, distance_store = None, scheduler = None, previous_stats = None, previous_manifest = None, \
+                 partial_stats_folder = None):
         self.folder_path = None
         self.generator_name = None
         self.game_name = None
@@ -50,20 +111,44 @@ class GeneratorStats:
         self.n_intervals_per_dimension = None
         self.content_diversity = None
         self.a_star_diversity = None
+        self.content_distances = None
+        self.a_star_distances = None
+        self.content_diversity_estimate = None
+        self.a_star_diversity_estimate = None
+        self.diversity_settings = diversity_settings if diversity_settings is not None else DiversitySettings()
         self.coverage = None
-        self.levels_stats = []
+        self.coverage_curve = None # Coverage for other numbers of intervals per dimension (see compute_coverage)
+        self.levels_stats = LevelStatsTable()
+        self.released_percentages = None
         self.diversity_archive = None
         self.generation_times = None
+        self.level_costs = None # Cost of the evaluation of every level, with --profile (see stats.profiling)
+        self.profile = None
         self.parallelization = parallelization
         self.max_workers = max_workers
+        self.cache = cache
+        self.distance_store = distance_store
+        self.scheduler = scheduler # EvaluationScheduler whose pools are used instead of creating new ones
+        self.manifest = None # Hash of every level evaluated from a folder (see stats.level_manifest)
+
+        # Stats of a previous evaluation of the same folder (and their manifest, derived from them if None).
+        # Only the levels that are new or have changed since then are evaluated
+        self.previous_stats = previous_stats
+        self.previous_manifest = previous_manifest
+
+        # Folder where the stats of the levels are written as they are evaluated (see stats.partial_stats), or None
+        self.partial_stats_folder = partial_stats_folder
+        self.partial_stats = None
 
         # Check if the path is a directory or a .csv file
         if os.path.isdir(path):
             self.load_from_folder(path)
         elif path.endswith('.csv'):
             self.load_from_csv(path)
+        elif path.endswith('.npz'):
+            self.load_from_npz(path)
         else:
-            raise ValueError("Path must be a directory or a .csv file.")
+            raise ValueError("Path must be a directory, a .csv file or a .npz file.")
 
     def load_from_folder(self, folder_path):
         print("\nEvaluating generator from " + folder_path + "...")
@@ -97,12 +182,18 @@ class GeneratorStats:
         except KeyError as e:
             raise KeyError(f"Missing item in properties.json: {e}")
 
+        # Extract the parameters indicating how the diversity is computed for this set (if present, they override the general ones)
+        self.diversity_settings = self.diversity_settings.updated(properties)
+
         # Extract the parameter indicating the number of intervals per dimension for the coverage archive
         self.n_intervals_per_dimension = properties.get("Number of intervals per dimension", 10)
 
-        # Search for times.csv in the folder
+        # Search for times.csv in the folder (packed corpora store the generation times in their index)
         times_file = os.path.join(folder_path, "times.csv")
-        if os.path.exists(times_file):
+        corpus_times = LevelCorpus(folder_path).generation_times_dataframe() if is_corpus(folder_path) else None
+        if corpus_times is not None:
+            self.generation_times = corpus_times
+        elif os.path.exists(times_file):
             # Read the content of times.csv
             self.generation_times = pd.read_csv(times_file)
 
@@ -116,42 +207,118 @@ class GeneratorStats:
         # Create the diversity archive. It must represent a multidimensional grid with each feature as a dimension, and 10 points per dimension
         self.diversity_archive = DiversityArchive(self.n_intervals_per_dimension)
 
-        self.evaluate_levels()
+        self.profile = Profile(self.generator_name) if profiling.enabled else None
+        with profiling.activate(self.profile):
+            self.evaluate_levels()
 
     def evaluate_levels(self):
-        # Load the levels
-        levels_paths = [os.path.join(self.folder_path, f) for f in os.listdir(self.folder_path) if f.endswith(".txt")]
         game_evaluator = EVALUATOR_REGISTRY[self.game_name]
+        n_levels = count_level_files(self.folder_path)
+        desc = "Evaluating levels"
 
-        levels = []
-        for level_path in levels_paths:
-            # Read the level
-            with open(level_path, "r") as f:
-                level = f.read()
-            
-            levels.append(level)
+        # Results (LevelStats, is_new) waiting for the characteristics of the levels evaluated now to be computed in a
+        # batch. The reused ones wait too, so the levels are added in the order of the files
+        pending_levels_stats = []
+
+        self.manifest = {}
+
+        # The levels are written as they are evaluated, and the ones written by a run that stopped in the middle of
+        # the set are reused
+        partial_levels_stats = None
+        if self.partial_stats_folder is not None:
+            self.partial_stats = PartialStatsFile(partial_stats_path(self.partial_stats_folder, self.generator_name))
+            partial_levels_stats = self.partial_stats.load()
+            if partial_levels_stats is not None:
+                print(f"{len(partial_levels_stats)} levels of generator {self.generator_name} were evaluated by a run that stopped. Their results are reused.")
+
+        reusable_levels = self.reusable_levels(partial_levels_stats)
+
+        def reused_result(level_path, level):
+            """
+            Returns the (LevelStats, False) result stored by the previous evaluation if the level has not changed since
+            then, or None. Every level is added to the manifest.
+            """
+            level_name = level_path.split("/")[-1]
+            self.manifest[level_name] = level_hash(level)
+
+            if level_name in reusable_levels and reusable_levels[level_name][0] == self.manifest[level_name]:
+                return reusable_levels[level_name][1].to_level_stats(), False
+            return None
 
-        if len(levels_paths) != len(levels):
-            print(f"ERROR: Different number of levels and files from generator {self.generator_name}. Exiting...")
-            sys.exit(1)
+        def process_result(stats, is_new):
+            pending_levels_stats.append((stats, is_new))
 
-        n_levels = len(levels_paths)
-        desc = "Evaluating levels"
+            if len(pending_levels_stats) >= characteristics_batch_size:
+                self.finish_levels(game_evaluator, pending_levels_stats)
+                pending_levels_stats.clear()
 
         if self.parallelization:
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                futures = {executor.submit(evaluate_level, levels_paths[i], levels[i], game_evaluator, parallelization = True): levels_paths[i] for i in range(n_levels)}
+            # The pool of the scheduler is shared with other sets of levels, so it is not shut down here
+            shared_executor = self.scheduler.level_executor if self.scheduler is not None else None
+            level_limit = self.scheduler.level_limit if self.scheduler is not None else None
+            workers = self.scheduler.level_workers if self.scheduler is not None else self.max_workers
+
+            max_in_flight = max(1, (workers or os.cpu_count() or 1) * in_flight_levels_per_worker)
+
+            with nullcontext(shared_executor) if shared_executor is not None else ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                # Levels being evaluated, as {future: index of the file}, and results waiting for the ones of the
+                # previous files, as {index of the file: (LevelStats, is_new)}
+                futures = {}
+                finished = {}
+                next_index = 0
+
+                def collect(done):
+                    """
+                    Stores the results of the finished futures and processes the ones that are next in the order of
+                    the files.
+                    """
+                    nonlocal next_index
+
+                    for future in done:
+                        finished[futures.pop(future)] = future.result()
+                        progress_bar.update(1)
+
+                    while next_index in finished:
+                        process_result(*finished.pop(next_index))
+                        next_index += 1
 
                 try:
-                    for future in tqdm(as_completed(futures), total=len(futures), desc=desc, ncols=80):
-                        stats = future.result()
-                        self.add_level_stats(stats)
+                    # Only a bounded number of levels is read and waiting to be evaluated at any time. The results are
+                    # taken as they finish, so a slow level does not stop new submissions, and processed in the order
+                    # of the files, so the stats do not depend on the order in which they finish
+                    level_files = iter_level_files(self.folder_path)
+                    progress_bar = tqdm(total=n_levels, desc=desc, ncols=80)
+
+                    for index, (level_path, level) in enumerate(level_files):
+                        result = reused_result(level_path, level)
+
+                        if result is not None:
+                            finished[index] = result
+                            progress_bar.update(1)
+                            collect(())
+                        else:
+                            futures[executor.submit(evaluate_level, level_path, level, game_evaluator, True, self.game_name, self.cache, level_limit, self.profile)] = index
+
+                        while len(futures) >= max_in_flight:
+                            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                            collect(done)
+
+                    while futures:
+                        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                        collect(done)
+
+                    progress_bar.close()
                 except Exception as e:
                     print(f"Error detected: {e}. Exiting...")
-                    executor.shutdown(wait=False, cancel_futures=True)
+                    for future in futures:
+                        future.cancel()
+                    if shared_executor is None:
+                        executor.shutdown(wait=False, cancel_futures=True)
                     sys.exit(1)
         else:
-            self.levels_stats = [game_evaluator.evaluate(levels_paths[i], levels[i], parallelization = False) for i in tqdm(range(n_levels), total=n_levels, desc=desc, ncols=80)]
+            for level_path, level in tqdm(iter_level_files(self.folder_path), total=n_levels, desc=desc, ncols=80):
+                result = reused_result(level_path, level)
+                process_result(*(result if result is not None else evaluate_level(level_path, level, game_evaluator, False, self.game_name, self.cache, profile = self.profile)))
             '''for i in range(n_levels):            
                 print(f"\nEvaluating level {i+1} (\'{level_files[i]}\') from generator {self.generator_name}...")
                 
@@ -160,35 +327,181 @@ class GeneratorStats:
 
                 # Update the generator stats
                 self.add_level_stats(level_stats)'''
+
+        self.finish_levels(game_evaluator, pending_levels_stats)
+
+        self.level_costs = self.merge_level_costs()
+
+        # The stats of the previous evaluation are not needed anymore
+        self.previous_stats = None
+
+        n_timed_out = int(self.levels_stats.flag("timed_out").sum())
+        if n_timed_out > 0:
+            print(f"WARNING: The simulation of {n_timed_out} levels of generator {self.generator_name} timed out. They are reported as not playable.")
+
+        # Levels whose simulation process could not be run (e.g. Java is not installed) are not unplayable, so the
+        # stats are not saved if none of the simulations could be run
+        n_failed = int(self.levels_stats.flag("simulation_failed").sum())
+        if n_failed > 0 and n_failed == int(self.levels_stats.flag("has_visual_integrity").sum()):
+            print(f"ERROR: The simulation of every level of generator {self.generator_name} failed. Check that Java can run the simulator. Exiting...")
+            sys.exit(1)
+        elif n_failed > 0:
+            print(f"WARNING: The simulation of {n_failed} levels of generator {self.generator_name} failed. They are reported as not playable.")
         
-        # Compute diversity values
-        self.compute_content_diversity()
-        self.compute_a_star_diversity()
+        # Compute diversity values (sharing the same pool of workers, which is the one of the scheduler if there is one)
+        if self.scheduler is not None and self.parallelization:
+            self.compute_content_diversity(self.scheduler.engine)
+            self.compute_a_star_diversity(self.scheduler.engine)
+            return
+
+        with PairwiseDistanceEngine(self.max_workers if self.parallelization else 1) as engine:
+            self.compute_content_diversity(engine)
+            self.compute_a_star_diversity(engine)
+
+    def merge_level_costs(self):
+        """
+        Costs of the levels evaluated now (if they have been profiled) and of the levels reused from the previous
+        evaluation (if they were profiled then), or None if there are no costs.
+        """
+        costs = [self.profile.level_costs_dataframe()] if self.profile is not None else []
+
+        if self.previous_stats is not None and self.previous_stats.level_costs is not None:
+            evaluated = set(costs[0]["level_name"]) if costs and costs[0] is not None else set()
+            previous_costs = self.previous_stats.level_costs
+            costs.append(previous_costs[previous_costs["level_name"].isin(self.manifest.keys()) & ~previous_costs["level_name"].isin(evaluated)])
+
+        costs = [df for df in costs if df is not None and len(df) > 0]
+        return pd.concat(costs, ignore_index=True) if costs else None
+
+    def save_profile(self, output_folder):
+        """
+        Saves the profile of the evaluation of the levels (see stats.profiling.Profile.save). Afterwards, the stages
+        run by this generator are recorded in the profile that is active at that moment (e.g. the one of the run).
+        """
+        if self.profile is not None:
+            self.profile.save(output_folder)
+            self.profile = None
+
+    def reusable_levels(self, partial_levels_stats = None):
+        """
+        Returns the levels whose results can be reused, as {level name: (hash, LevelStatsRow)}: the ones of the
+        previous evaluation and the ones written by a run that stopped in the middle of the set (partial_levels_stats,
+        which are more recent). The levels whose simulation timed out or failed are left out, so they are simulated
+        again.
+        """
+        sources = []
+        if self.previous_stats is not None:
+            sources.append((self.previous_stats.levels_stats, self.previous_manifest))
+        if partial_levels_stats is not None:
+            sources.append((partial_levels_stats, None))
+
+        reusable_levels = {}
+        for levels_stats, manifest in sources:
+            if manifest is None:
+                manifest = manifest_from_table(levels_stats)
+
+            incomplete = levels_stats.flag("timed_out") | levels_stats.flag("simulation_failed")
+
+            reusable_levels |= {level_name: (manifest.get(level_name), levels_stats[index]) for index, level_name in enumerate(levels_stats.level_names) if not incomplete[index]}
+
+        return reusable_levels
+
+    def remove_partial_stats(self):
+        """
+        Removes the stats written as the levels were evaluated, once the stats of the set have been saved.
+        """
+        if self.partial_stats is not None:
+            self.partial_stats.remove()
+            self.partial_stats = None
+
+    def finish_levels(self, game_evaluator, results):
+        """
+        Computes the characteristics of the levels evaluated now in a batch of results (LevelStats, is_new), stores
+        them in the cache and adds every level of the batch to the table of levels stats in order (so their parsed
+        grids are released) and to the partial stats file, if any. The reused levels already have their characteristics.
+        """
+        new_levels_stats = [level_stats for level_stats, is_new in results if is_new]
+        self.compute_characteristics(game_evaluator, new_levels_stats)
+
+        for level_stats in new_levels_stats:
+            # Timeouts and failed simulation processes can be transient (e.g. an overloaded machine or a missing JVM),
+            # so the level is simulated again in the next run
+            if self.cache is not None and level_stats.simulation_completed:
+                self.cache.put(self.cache.compute_key(level_stats.level, self.game_name, game_evaluator), level_stats)
+
+        for level_stats, _ in results:
+            self.add_level_stats(level_stats)
+
+        # Written once they are in the table, so a run that stops keeps them
+        if self.partial_stats is not None:
+            self.partial_stats.append(level_stats for level_stats, _ in results)
+
+    def compute_characteristics(self, game_evaluator, levels_stats):
+        valid_levels_stats = [level_stats for level_stats in levels_stats if level_stats.is_valid]
+
+        levels = [level_stats.grid if level_stats.grid is not None else level_stats.level for level_stats in valid_levels_stats]
+        with profiling.stage("characteristics") as timing:
+            characteristics = game_evaluator.evaluate_characteristics_batch(levels)
+
+        # The cost of the batch is shared by its levels
+        if self.profile is not None:
+            for level_stats in valid_levels_stats:
+                self.profile.add_level_cost(level_stats.level_name, timing.wall_time / len(valid_levels_stats), timing.cpu_time / len(valid_levels_stats))
+
+        for level_stats, level_characteristics in zip(valid_levels_stats, characteristics):
+            level_stats.characteristics = level_characteristics
 
     def add_level_stats(self, level_stats):
         self.levels_stats.append(level_stats)
 
-    # Save the data as a csv file
-    def save(self, output_folder, suffix = None):
+    def metadata(self):
+        metadata = {'Folder Path': self.folder_path, 'Generator Name': self.generator_name, 'Game Name': self.game_name, 'Ignore': self.ignore, 'Content Diversity': self.content_diversity, 'A* Diversity': self.a_star_diversity, 'Coverage': self.coverage, 'Number of intervals per dimension': self.diversity_archive.num_intervals_per_dimension}
+
+        if self.coverage_curve is not None:
+            metadata['Coverage Curve'] = self.coverage_curve
+
+        # Information about how the diversity values have been computed (exact or estimated from random pairs)
+        if self.content_diversity_estimate is not None and self.a_star_diversity_estimate is not None:
+            metadata |= {'Diversity Mode': self.diversity_settings.mode, 'Content Diversity Pairs': self.content_diversity_estimate.n_pairs, 'Content Diversity CI': self.content_diversity_estimate.ci, \
+                         'A* Diversity Pairs': self.a_star_diversity_estimate.n_pairs, 'A* Diversity CI': self.a_star_diversity_estimate.ci}
+
+        return metadata
+
+    # Save the data as a csv file and/or as a columnar .npz file
+    def save(self, output_folder, suffix = None, formats = ("csv",)):
         if suffix is None:
             suffix = "_stats"
 
-        output_file = os.path.join(output_folder, self.generator_name + suffix + ".csv")
+        # The stage is recorded in the profile of the generator, or in the active one once it has been saved
+        with profiling.activate(self.profile) if self.profile is not None else nullcontext(), profiling.stage("save" + suffix.replace("_", " ")):
+            self.write(output_folder, suffix, formats)
 
-        metadata = {'Folder Path': self.folder_path, 'Generator Name': self.generator_name, 'Game Name': self.game_name, 'Ignore': self.ignore, 'Content Diversity': self.content_diversity, 'A* Diversity': self.a_star_diversity, 'Coverage': self.coverage, 'Number of intervals per dimension': self.diversity_archive.num_intervals_per_dimension}
+    def write(self, output_folder, suffix, formats):
+        metadata = self.metadata()
+
+        if "npz" in formats:
+            save_stats_npz(os.path.join(output_folder, self.generator_name + suffix + ".npz"), metadata, self.levels_stats, self.generation_times, self.level_costs)
+
+        if "csv" not in formats:
+            return
+
+        output_file = os.path.join(output_folder, self.generator_name + suffix + ".csv")
         
-        data = [vars(level_stats) for level_stats in self.levels_stats]
+        # The actions are written run-length encoded
+        df = self.levels_stats.to_dataframe()
         '''for level_stats in self.levels_stats:
             level_data = deepcopy(vars(level_stats))
             characteristics = level_data.pop('characteristics')
             level_data = level_data | characteristics
             data.append(level_data)'''
-        
-        df = pd.DataFrame(data)
 
         # Add the generation times to the dataframe
         if self.generation_times is not None:
             df = pd.merge(df, self.generation_times, left_on='level_name', right_on='level_name', how='left')
+
+        # Add the cost of the evaluation of every level (only with --profile)
+        if self.level_costs is not None:
+            df = pd.merge(df, self.level_costs, left_on='level_name', right_on='level_name', how='left')
         
         with open(output_file, 'w') as f:
             # Write metadata as comments
@@ -203,11 +516,13 @@ class GeneratorStats:
         if not filepath.endswith('.csv'):
             raise ValueError("Path must be a .csv file.")
         
+        diversity_metadata = {}
+
         # Read the metadata from the CSV file
         with open(filepath, 'r') as f:
             for line in f:
                 if line.startswith("#"):
-                    key, value = line[1:].strip().split(":")
+                    key, value = line[1:].strip().split(":", 1)
                     key = key.strip()
                     value = value.strip()
 
@@ -227,34 +542,30 @@ class GeneratorStats:
                         self.coverage = ast.literal_eval(value)
                     elif key == "Number of intervals per dimension":
                         self.n_intervals_per_dimension = ast.literal_eval(value)
+                    elif key == "Coverage Curve":
+                        self.coverage_curve = ast.literal_eval(value)
+                    elif key == "Diversity Mode":
+                        diversity_metadata["mode"] = value
+                    elif key == "Content Diversity Pairs":
+                        diversity_metadata["content_pairs"] = ast.literal_eval(value)
+                    elif key == "Content Diversity CI":
+                        diversity_metadata["content_ci"] = ast.literal_eval(value)
+                    elif key == "A* Diversity Pairs":
+                        diversity_metadata["a_star_pairs"] = ast.literal_eval(value)
+                    elif key == "A* Diversity CI":
+                        diversity_metadata["a_star_ci"] = ast.literal_eval(value)
                 else:
                     break
 
-        # Check that every metadata has been read
-        if self.folder_path is None:
-            raise RuntimeError(f"ERROR: \'Folder Path\' not specified in {filepath}.")
-        if self.generator_name is None:
-            raise RuntimeError(f"ERROR: \'Generator Name\' not specified in {filepath}")
-        if self.game_name is None:
-            raise RuntimeError(f"ERROR: \'Game Name\' not specified in {filepath}")
-        if self.ignore is None:
-            raise RuntimeError(f"ERROR: \'Ignore\' not specified in {filepath}")
-        if self.content_diversity is None:
-            raise RuntimeError(f"ERROR: \'Content Diversity\' not specified in {filepath}")
-        if self.a_star_diversity is None:
-            raise RuntimeError(f"ERROR: \'A* Diversity\' not specified in {filepath}")
-        if self.n_intervals_per_dimension is None:
-            raise RuntimeError(f"ERROR: \'Number of intervals per dimension\' not specified in {filepath}")
-        
-        if self.ignore:
-            print(f"WARNING: Ignoring generator from file {filepath}...")
+        if not self.check_metadata(filepath, diversity_metadata):
             return
         
-        self.diversity_archive = DiversityArchive(self.n_intervals_per_dimension)
-        
         # Read the data from the CSV file
         df = pd.read_csv(filepath, comment="#")
 
+        if all(column in df.columns for column in COST_COLUMNS):
+            self.level_costs = df[["level_name"] + COST_COLUMNS].dropna(subset=COST_COLUMNS, how="all").reset_index(drop=True)
+
         if "generation_time" in df.columns:
             self.generation_times = df[["level_name", "generation_time"]]
         else:
@@ -281,12 +592,85 @@ class GeneratorStats:
                 has_valid_size = row['has_valid_size'],
                 has_visual_integrity = row['has_visual_integrity'],
                 is_playable = row['is_playable'],
-                actions = ast.literal_eval(row['actions']),
+                timed_out = row['timed_out'] if 'timed_out' in df.columns else False,
+                simulation_failed = row['simulation_failed'] if 'simulation_failed' in df.columns else False,
+                actions = row['actions'] if isinstance(row['actions'], str) else "",  # Levels without actions are read as NaN
                 characteristics = ast.literal_eval(row['characteristics'])
             )
             self.add_level_stats(level_stats)
                 
-    def compute_a_star_diversity(self):
+    def check_metadata(self, filepath, diversity_metadata):
+        """
+        Checks the metadata loaded from a stats file and restores the diversity estimates.
+        Returns False if the generator must be ignored.
+        """
+        # Check that every metadata has been read
+        if self.folder_path is None:
+            raise RuntimeError(f"ERROR: \'Folder Path\' not specified in {filepath}.")
+        if self.generator_name is None:
+            raise RuntimeError(f"ERROR: \'Generator Name\' not specified in {filepath}")
+        if self.game_name is None:
+            raise RuntimeError(f"ERROR: \'Game Name\' not specified in {filepath}")
+        if self.ignore is None:
+            raise RuntimeError(f"ERROR: \'Ignore\' not specified in {filepath}")
+        if self.content_diversity is None:
+            raise RuntimeError(f"ERROR: \'Content Diversity\' not specified in {filepath}")
+        if self.a_star_diversity is None:
+            raise RuntimeError(f"ERROR: \'A* Diversity\' not specified in {filepath}")
+        if self.n_intervals_per_dimension is None:
+            raise RuntimeError(f"ERROR: \'Number of intervals per dimension\' not specified in {filepath}")
+        
+        if self.ignore:
+            print(f"WARNING: Ignoring generator from file {filepath}...")
+            return False
+
+        # Restore how the diversity values were computed (not present in files saved by older versions)
+        if "content_pairs" in diversity_metadata and "a_star_pairs" in diversity_metadata:
+            self.diversity_settings = self.diversity_settings.updated({"Diversity Mode": diversity_metadata.get("mode", "exact")})
+            self.content_diversity_estimate = DiversityEstimate(value = self.content_diversity, n_pairs = diversity_metadata["content_pairs"], ci = diversity_metadata.get("content_ci"))
+            self.a_star_diversity_estimate = DiversityEstimate(value = self.a_star_diversity, n_pairs = diversity_metadata["a_star_pairs"], ci = diversity_metadata.get("a_star_ci"))
+        
+        self.diversity_archive = DiversityArchive(self.n_intervals_per_dimension)
+
+        return True
+
+    def load_from_npz(self, filepath):
+        metadata, levels_stats, generation_times, level_costs = load_stats_npz(filepath)
+
+        self.folder_path = metadata.get("Folder Path")
+        self.generator_name = metadata.get("Generator Name")
+        self.game_name = metadata.get("Game Name")
+        self.ignore = metadata.get("Ignore")
+        self.content_diversity = metadata.get("Content Diversity")
+        self.a_star_diversity = metadata.get("A* Diversity")
+        self.coverage = metadata.get("Coverage")
+        self.n_intervals_per_dimension = metadata.get("Number of intervals per dimension")
+
+        # JSON keys are strings
+        if metadata.get("Coverage Curve") is not None:
+            self.coverage_curve = {int(resolution): coverage for resolution, coverage in metadata["Coverage Curve"].items()}
+
+        diversity_metadata = {}
+        if "Content Diversity Pairs" in metadata and "A* Diversity Pairs" in metadata:
+            diversity_metadata = {
+                "mode": metadata.get("Diversity Mode", "exact"),
+                "content_pairs": metadata["Content Diversity Pairs"],
+                "content_ci": metadata.get("Content Diversity CI"),
+                "a_star_pairs": metadata["A* Diversity Pairs"],
+                "a_star_ci": metadata.get("A* Diversity CI"),
+            }
+
+        if not self.check_metadata(filepath, diversity_metadata):
+            return
+
+        self.level_costs = level_costs
+        self.generation_times = generation_times
+        if self.generation_times is None:
+            print(f"WARNING: Generation times not found in the file from generator {self.generator_name}. Generation times will not be available.")
+
+        self.levels_stats = levels_stats
+
+    def compute_a_star_diversity(self, engine = None):
         '''actions = [level_stats.actions for level_stats in self.levels_stats if level_stats.is_valid]
 
         pairs = list(combinations(actions, 2))
@@ -299,34 +683,21 @@ class GeneratorStats:
         self.a_star_diversity = sum(diversities) / len(diversities) if len(diversities) > 0 else 0
         print("A* diversity: ", self.a_star_diversity)'''
 
-        actions = [level_stats.actions for level_stats in self.levels_stats if level_stats.is_valid]
+        actions = self.levels_stats.actions_list(self.levels_stats.is_valid)
 
-        pairs = list(combinations(actions, 2))
+        if engine is None:
+            with PairwiseDistanceEngine(self.max_workers if self.parallelization else 1) as engine:
+                return self.compute_a_star_diversity(engine)
 
-        if not pairs:
-            self.content_diversity = 0
-            print("A* diversity: 0")
-            return
-
-        desc = f"Computing A* Diversity"
-
-        if self.parallelization:
-            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
-                diversities = list(
-                    tqdm(
-                        executor.map(levenshtein_distance, pairs),
-                        total=len(pairs),
-                        desc=desc,
-                        ncols=80
-                    )
-                )
-        else:
-            diversities = [levenshtein_distance(par) for par in tqdm(pairs, total=len(pairs), desc=desc, ncols=80)]
+        with profiling.stage("a* diversity"):
+            self.a_star_diversity_estimate, self.a_star_distances = self.estimate_diversity(engine, actions, "a_star", "Computing A* Diversity")
+        self.a_star_diversity = self.a_star_diversity_estimate.value
 
-        self.a_star_diversity = sum(diversities) / len(diversities)
+        if self.a_star_diversity_estimate.n_pairs == 0:
+            print("A* diversity: 0")
         #print("A* diversity: ", self.a_star_diversity)
 
-    def compute_content_diversity(self):
+    def compute_content_diversity(self, engine = None):
         '''valid_levels = []
         for level_stats in self.levels_stats:
             if level_stats.is_valid:
@@ -342,37 +713,55 @@ class GeneratorStats:
         self.content_diversity = sum(diversities) / len(diversities) if len(diversities) > 0 else 0
         print("Content diversity: ", self.content_diversity)'''
 
-        valid_levels = ["".join(level_stats.level.splitlines()) for level_stats in self.levels_stats if level_stats.is_valid]
+        valid_levels = self.levels_stats.flat_levels(self.levels_stats.is_valid)
 
-        pairs = list(combinations(valid_levels, 2))
+        if engine is None:
+            with PairwiseDistanceEngine(self.max_workers if self.parallelization else 1) as engine:
+                return self.compute_content_diversity(engine)
 
-        if not pairs:
-            self.content_diversity = 0
-            print("Content diversity: 0")
-            return
+        with profiling.stage("content diversity"):
+            self.content_diversity_estimate, self.content_distances = self.estimate_diversity(engine, valid_levels, "content", "Computing Content Diversity")
+        self.content_diversity = self.content_diversity_estimate.value
 
-        desc = f"Computing Content Diversity"
+        if self.content_diversity_estimate.n_pairs == 0:
+            print("Content diversity: 0")
+        #print("Content diversity: ", self.content_diversity)
 
-        if self.parallelization:
-            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
-                diversities = list(
-                    tqdm(
-                        executor.map(levenshtein_distance, pairs),
-                        total=len(pairs),
-                        desc=desc,
-                        ncols=80
-                    )
-                )
+    def estimate_diversity(self, engine, sequences, metric, desc):
+        """
+        Computes the mean pairwise distance of the sequences according to the diversity settings.
+        Returns the DiversityEstimate and the condensed distance matrix (None in the sampled mode).
+        In the exact mode, the distances stored by previous evaluations of the same set are reused.
+        """
+        settings = self.diversity_settings
+
+        if settings.mode == "sampled":
+            estimate = engine.estimate_mean_levenshtein(sequences, settings.sample_pairs, settings.ci_width, settings.confidence, settings.seed, desc = desc)
+            return estimate, None
+
+        # Keep the condensed distance matrix so other statistics can be computed from it
+        if self.distance_store is not None:
+            generator_key = DistanceStore.generator_key(self.folder_path, self.generator_name)
+            distances = self.distance_store.pairwise_levenshtein(engine, generator_key, metric, sequences, desc = desc)
         else:
-            diversities = [levenshtein_distance(par) for par in tqdm(pairs, total=len(pairs), desc=desc, ncols=80)]
+            distances = engine.pairwise_levenshtein(sequences, desc = desc)
 
-        self.content_diversity = sum(diversities) / len(diversities)
-        #print("Content diversity: ", self.content_diversity)
+        return DiversityEstimate(value = mean_distance(distances), n_pairs = len(distances)), distances
     
-    def compute_coverage(self):
-        self.diversity_archive.add_generator_stats(self)
+    def compute_coverage(self, resolutions = None):
+        """
+        Computes the coverage of the valid levels in the diversity archive.
+
+        Args:
+            resolutions (list): Other numbers of intervals per dimension for which the coverage is also computed, from
+            the same characteristics (stored in coverage_curve). None to compute only the coverage.
+        """
+        _, values = self.diversity_archive.add_generator_stats(self)
         self.coverage = self.diversity_archive.get_coverage()
 
+        if resolutions:
+            self.coverage_curve = coverage_curve(values, resolutions)
+
     def normalize_diversity(self, min_content_diversity, max_content_diversity, min_a_star_diversity, max_a_star_diversity, min_coverage, max_coverage):
         '''self.coverage = (self.coverage - min_coverage) / (max_coverage - min_coverage)
         self.a_star_diversity = (self.a_star_diversity - min_a_star_diversity) / (max_a_star_diversity - min_a_star_diversity)
@@ -382,8 +771,16 @@ class GeneratorStats:
         self.a_star_diversity = self.a_star_diversity / max_a_star_diversity
         self.content_diversity = self.content_diversity / max_content_diversity
 
+        # Keep the confidence intervals in the same scale as the values
+        if self.a_star_diversity_estimate is not None:
+            self.a_star_diversity_estimate = self.a_star_diversity_estimate.scaled(1 / max_a_star_diversity)
+        if self.content_diversity_estimate is not None:
+            self.content_diversity_estimate = self.content_diversity_estimate.scaled(1 / max_content_diversity)
+
     def normalize_characteristics(self, min_values : dict, max_values : dict):
-        keys = min_values.keys()
+        self.levels_stats.normalize_characteristics(min_values, max_values)
+
+        '''keys = min_values.keys()
         for key in keys:
             min_value = min_values[key]
             max_value = max_values[key]
@@ -393,7 +790,7 @@ class GeneratorStats:
             else:
                 for level_stats in self.levels_stats:
                     if len(level_stats.characteristics) > 0:
-                        level_stats.characteristics[key] = (level_stats.characteristics[key] - min_value) / (max_value - min_value)
+                        level_stats.characteristics[key] = (level_stats.characteristics[key] - min_value) / (max_value - min_value)'''
                 
         '''min_content_diversity = min_values["content_diversity"]
         max_content_diversity = max_values["content_diversity"]
@@ -418,12 +815,25 @@ class GeneratorStats:
 
         return sum(times) / len(times) / 1e9  # Convert to seconds
     
+    def release_levels(self):
+        """
+        Frees the stats of the levels, keeping the percentages used by the figures.
+        """
+        self.released_percentages = (self.no_visual_bugs_percentage(), self.valid_percentage())
+        self.levels_stats = LevelStatsTable()
+
     def no_visual_bugs_percentage(self):
-        correct_levels = [1 if level_stats.has_valid_characters and level_stats.has_valid_size and level_stats.has_visual_integrity else 0 for level_stats in self.levels_stats]
+        if self.released_percentages is not None:
+            return self.released_percentages[0]
+
+        correct_levels = ~self.levels_stats.has_visual_bugs
 
-        return sum(correct_levels) / len(correct_levels)
+        return int(correct_levels.sum()) / len(correct_levels)
 
     def valid_percentage(self):
-        valid_levels = [1 if level_stats.is_valid else 0 for level_stats in self.levels_stats]
+        if self.released_percentages is not None:
+            return self.released_percentages[1]
+
+        valid_levels = self.levels_stats.is_valid
 
-        return sum(valid_levels) / len(valid_levels)
\ No newline at end of file
+        return int(valid_levels.sum()) / len(valid_levels)
\ No newline at end of file
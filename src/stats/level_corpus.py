@@ -0,0 +1,235 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+from stats.level_grid import INVALID_CHARACTER, build_character_lookup
+
+# File that identifies a folder of levels as a packed corpus
+CORPUS_FILE = "corpus.json"
+
+# Number of levels decoded (or encoded) at once
+CHUNK_SIZE = 4096
+
+def is_corpus(folder_path):
+    return os.path.exists(os.path.join(folder_path, CORPUS_FILE))
+
+def encode_corpus(levels, valid_characters, num_rows, num_cols):
+    """
+    Encodes a list of levels as a (n_levels, num_rows, num_cols) uint8 tensor with the index of each tile in
+    valid_characters, converting all the levels at once.
+
+    Only levels that can be rebuilt exactly from their tiles are encoded: num_rows rows of num_cols valid characters
+    separated by "\\n", with an optional trailing "\\n".
+
+    Args:
+        levels (list): The level strings.
+        valid_characters (list): Valid characters of the game.
+        num_rows (int): Number of rows of every level.
+        num_cols (int): Number of columns of every level.
+
+    Returns:
+        tuple: The tensor of tiles of the encoded levels, a boolean mask of the levels that have been encoded and a
+        boolean array indicating which levels end with "\\n".
+    """
+    trailing_newline = np.array([level.endswith("\n") for level in levels], dtype=bool)
+    level_length = num_rows * (num_cols + 1) - 1
+    candidates = [i for i, level in enumerate(levels) if len(level) - trailing_newline[i] == level_length]
+
+    # Every candidate with a newline at the end, so they can be reshaped as rows of num_cols + 1 characters
+    data = "".join(levels[i][:level_length] + "\n" for i in candidates)
+    code_points = np.frombuffer(data.encode("utf-32-le"), dtype=np.uint32).reshape(len(candidates), num_rows, num_cols + 1)
+
+    lookup = build_character_lookup(valid_characters)
+    tiles = np.where(code_points[:, :, :num_cols] < len(lookup), lookup[np.minimum(code_points[:, :, :num_cols], len(lookup) - 1)], INVALID_CHARACTER).astype(np.uint8)
+
+    valid = (code_points[:, :, num_cols] == ord("\n")).all(axis=1) & (tiles != INVALID_CHARACTER).all(axis=(1, 2))
+
+    encoded = np.zeros(len(levels), dtype=bool)
+    encoded[np.array(candidates, dtype=np.int64)[valid]] = True
+
+    return tiles[valid], encoded, trailing_newline
+
+def decode_corpus(tiles, valid_characters, trailing_newline=None):
+    """
+    Decodes a (n_levels, num_rows, num_cols) tensor of tiles into level strings, all the levels at once.
+
+    Args:
+        tiles (np.ndarray): The tensor of tiles.
+        valid_characters (list): Valid characters of the game.
+        trailing_newline (np.ndarray): Boolean array indicating which levels end with "\\n" (none if None).
+
+    Returns:
+        list: The level strings.
+    """
+    n_levels, num_rows, num_cols = tiles.shape
+
+    characters = np.array([ord(character) for character in valid_characters], dtype=np.uint32)
+    code_points = np.full((n_levels, num_rows, num_cols + 1), ord("\n"), dtype=np.uint32)
+    code_points[:, :, :num_cols] = characters[tiles]
+
+    data = code_points.astype("<u4").tobytes().decode("utf-32-le")
+    level_length = num_rows * (num_cols + 1)
+
+    levels = []
+    for i in range(n_levels):
+        has_newline = trailing_newline is not None and trailing_newline[i]
+        levels.append(data[i * level_length:(i + 1) * level_length - (0 if has_newline else 1)])
+
+    return levels
+
+class LevelCorpus:
+    """
+    A set of levels packed in a folder, instead of one file per level.
+
+    The levels with the registered shape of the game are stored as a memory-mapped (n_levels, num_rows, num_cols)
+    uint8 tensor of tiles (tiles.npy), so every thread or process reading the corpus shares a single copy of the
+    levels. The rest (e.g. levels with invalid characters or sizes) are stored as text, so the corpus can be
+    converted back into the original files. The folder also contains the properties.json of the set and the
+    index (corpus.json) with the name and the generation time of every level.
+
+    Args:
+        folder_path (str): Folder of the corpus.
+    """
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+
+        with open(os.path.join(folder_path, CORPUS_FILE), "r") as f:
+            index = json.load(f)
+
+        self.valid_characters = index["valid_characters"]
+        self.num_rows = index["num_rows"]
+        self.num_cols = index["num_cols"]
+        self.names = index["names"]
+        self.generation_times = index.get("generation_times")
+        self.raw_levels = index["raw_levels"]
+
+        self.tiles = np.load(os.path.join(folder_path, "tiles.npy"), mmap_mode="r")
+        self.slots = np.load(os.path.join(folder_path, "slots.npy"))
+        self.trailing_newline = np.load(os.path.join(folder_path, "trailing_newline.npy"))
+
+    def __len__(self):
+        return len(self.names)
+
+    def levels(self, start=0, stop=None):
+        """
+        Decodes the levels [start, stop) of the corpus.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        slots = self.slots[start:stop]
+        packed = slots >= 0
+
+        decoded = iter(decode_corpus(np.asarray(self.tiles[slots[packed]]), self.valid_characters, self.trailing_newline[start:stop][packed]))
+
+        return [next(decoded) if slot >= 0 else self.raw_levels[-slot - 1] for slot in slots]
+
+    def __iter__(self):
+        """
+        Yields (level name, level) pairs, decoding the levels by chunks.
+        """
+        for start in range(0, len(self), CHUNK_SIZE):
+            yield from zip(self.names[start:start + CHUNK_SIZE], self.levels(start, start + CHUNK_SIZE))
+
+    def generation_times_dataframe(self):
+        if self.generation_times is None:
+            return None
+
+        return pd.DataFrame({"level_name": self.names, "generation_time": self.generation_times})
+
+    @staticmethod
+    def pack(levels_folder, output_folder, valid_characters, num_rows, num_cols):
+        """
+        Packs a folder of levels (one .txt file per level, properties.json and, optionally, times.csv) into a corpus.
+
+        Returns:
+            LevelCorpus: The new corpus.
+        """
+        names = sorted(f for f in os.listdir(levels_folder) if f.endswith(".txt"))
+
+        def read_chunks():
+            for start in range(0, len(names), CHUNK_SIZE):
+                levels = []
+                for name in names[start:start + CHUNK_SIZE]:
+                    with open(os.path.join(levels_folder, name), "r") as f:
+                        levels.append(f.read())
+                yield levels
+
+        generation_times = None
+        times_file = os.path.join(levels_folder, "times.csv")
+        if os.path.exists(times_file):
+            times = pd.read_csv(times_file).set_index("level_name")["generation_time"]
+            generation_times = [times[name].item() if name in times.index else None for name in names]
+
+        os.makedirs(output_folder, exist_ok=True)
+        shutil.copy(os.path.join(levels_folder, "properties.json"), os.path.join(output_folder, "properties.json"))
+
+        return LevelCorpus.write(output_folder, names, read_chunks(), valid_characters, num_rows, num_cols, generation_times)
+
+    @staticmethod
+    def write(output_folder, names, level_chunks, valid_characters, num_rows, num_cols, generation_times=None):
+        """
+        Writes a corpus with the levels of level_chunks (lists of level strings, in the order of names), so large sets
+        of levels never have to be in memory at once. properties.json must be written in the folder apart.
+
+        Returns:
+            LevelCorpus: The new corpus.
+        """
+        tiles = []
+        slots = np.empty(len(names), dtype=np.int64)
+        trailing_newline = np.empty(len(names), dtype=bool)
+        raw_levels = []
+        n_packed = 0
+        start = 0
+
+        for levels in level_chunks:
+            chunk_tiles, encoded, chunk_trailing_newline = encode_corpus(levels, valid_characters, num_rows, num_cols)
+            tiles.append(chunk_tiles)
+            trailing_newline[start:start + len(levels)] = chunk_trailing_newline
+
+            for i, level in enumerate(levels):
+                if encoded[i]:
+                    slots[start + i] = n_packed
+                    n_packed += 1
+                else:
+                    raw_levels.append(level)
+                    slots[start + i] = -len(raw_levels)
+
+            start += len(levels)
+
+        if start != len(names):
+            raise ValueError(f"{start} levels written for {len(names)} names.")
+
+        os.makedirs(output_folder, exist_ok=True)
+
+        np.save(os.path.join(output_folder, "tiles.npy"), np.concatenate(tiles) if tiles else np.zeros((0, num_rows, num_cols), dtype=np.uint8))
+        np.save(os.path.join(output_folder, "slots.npy"), slots)
+        np.save(os.path.join(output_folder, "trailing_newline.npy"), trailing_newline)
+
+        # The index is written last, so an interrupted conversion is not mistaken for a corpus
+        index = {
+            "valid_characters": list(valid_characters),
+            "num_rows": num_rows,
+            "num_cols": num_cols,
+            "names": list(names),
+            "generation_times": generation_times,
+            "raw_levels": raw_levels,
+        }
+        with open(os.path.join(output_folder, CORPUS_FILE), "w") as f:
+            json.dump(index, f)
+
+        return LevelCorpus(output_folder)
+
+    def unpack(self, output_folder):
+        """
+        Writes the corpus as a folder of levels (one .txt file per level, properties.json and times.csv).
+        """
+        os.makedirs(output_folder, exist_ok=True)
+        shutil.copy(os.path.join(self.folder_path, "properties.json"), os.path.join(output_folder, "properties.json"))
+
+        for name, level in self:
+            with open(os.path.join(output_folder, name), "w") as f:
+                f.write(level)
+
+        if self.generation_times is not None:
+            self.generation_times_dataframe().to_csv(os.path.join(output_folder, "times.csv"), index=False)
@@ -0,0 +1,49 @@
+import numpy as np
+
+INVALID_CHARACTER = 255
+
+def build_character_lookup(valid_characters):
+    """
+    Builds a table that maps the code point of every character to its index in valid_characters (or INVALID_CHARACTER).
+    """
+    lookup = np.full(max(256, max(ord(c) for c in valid_characters) + 1), INVALID_CHARACTER, dtype=np.uint8)
+
+    for index, character in enumerate(valid_characters):
+        lookup[ord(character)] = index
+
+    return lookup
+
+class LevelGrid(str):
+    """
+    A level parsed once and shared by every evaluation stage.
+
+    It behaves as the level string, so stages written for strings keep working, and it also provides:
+        rows (list): The rows of the level.
+        flat (str): The level without newlines.
+        shape (tuple): (number of rows, number of columns), or None if the rows have different lengths.
+        codes (np.ndarray): uint8 array with the index of each character of flat in the valid characters
+            of the game (INVALID_CHARACTER for the rest).
+        tiles (np.ndarray): codes reshaped to shape, or None if the rows have different lengths.
+        has_valid_characters (bool): Whether every character is valid.
+    """
+    def __new__(cls, level, character_lookup):
+        grid = super().__new__(cls, level)
+        grid.character_lookup = character_lookup
+
+        grid.rows = level.splitlines()
+        grid.flat = "".join(grid.rows)
+
+        n_rows = len(grid.rows)
+        n_cols = len(grid.rows[0]) if n_rows > 0 else 0
+        grid.shape = (n_rows, n_cols) if all(len(row) == n_cols for row in grid.rows) else None
+
+        code_points = np.frombuffer(grid.flat.encode("utf-32-le"), dtype=np.uint32)
+        lookup_size = len(character_lookup)
+        grid.codes = np.where(code_points < lookup_size, character_lookup[np.minimum(code_points, lookup_size - 1)], INVALID_CHARACTER).astype(np.uint8)
+        grid.has_valid_characters = not (grid.codes == INVALID_CHARACTER).any()
+        grid.tiles = grid.codes.reshape(grid.shape) if grid.shape is not None else None
+
+        return grid
+
+    def __getnewargs__(self):
+        return (str(self), self.character_lookup)
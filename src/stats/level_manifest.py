@@ -0,0 +1,58 @@
+import os
+import json
+import hashlib
+
+def level_hash(level):
+    """
+    SHA-256 of the content of a level. A trailing newline is ignored, as in GameEvaluator.evaluate, so the hash of
+    a level file is the same as the hash of the level stored in its stats.
+    """
+    if level.endswith("\n"):
+        level = level[:-1]
+    return hashlib.sha256(level.encode("utf-8")).hexdigest()
+
+def manifest_path(output_folder, generator_name, suffix="_initial_stats"):
+    return os.path.join(output_folder, generator_name + suffix + "_manifest.json")
+
+def build_manifest(levels):
+    """
+    Manifest of a set of levels: the hash of every level, by level name.
+
+    Args:
+        levels (iterable): (level name, level) pairs.
+    """
+    return {level_name: level_hash(level) for level_name, level in levels}
+
+def manifest_from_table(levels_stats):
+    """
+    Manifest of the levels stored in a LevelStatsTable (used for stats saved without a manifest).
+    """
+    return build_manifest(zip(levels_stats.level_names, levels_stats.levels()))
+
+def save_manifest(path, manifest):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump({"levels": manifest}, f)
+    os.replace(temp_path, path)
+
+def load_manifest(path):
+    """
+    Returns the manifest saved in the file, or None if there is no valid manifest.
+    """
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, "r") as f:
+            return json.load(f)["levels"]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"WARNING: Manifest {path} could not be read: {e}.")
+        return None
+
+def compare_manifests(old_manifest, new_manifest):
+    """
+    Returns the names of the levels that are new or have changed, and the names of the levels that have been deleted.
+    """
+    changed = [level_name for level_name, level_hash in new_manifest.items() if old_manifest.get(level_name) != level_hash]
+    deleted = [level_name for level_name in old_manifest if level_name not in new_manifest]
+    return changed, deleted
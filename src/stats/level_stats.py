@@ -1,4 +1,7 @@
-from pydantic import BaseModel, Field
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, field_serializer, field_validator
+
+from stats.action_sequences import parse_actions, run_length_encode
 
 class LevelStats(BaseModel):
     """
@@ -12,7 +15,12 @@ class LevelStats(BaseModel):
         has_valid_size (bool): Whether the level size is valid.
         has_visual_integrity (bool): Whether the level has visual integrity.
         is_playable (bool): Whether the level is playable.
-        actions (list): List of actions taken by the agent during the simulation.
+        timed_out (bool): Whether the simulation of the level was killed by the timeout (the level is then reported
+            as not playable).
+        simulation_failed (bool): Whether the simulation process of the level failed every time it was launched (the
+            level is then reported as not playable).
+        actions (np.ndarray): Actions taken by the agent during the simulation, encoded as small integers.
+            They are serialized as a run-length encoded string (see stats.action_sequences).
         characteristics (BaseCharacteristics): The characteristics to measure in the level.
     """
     
@@ -22,9 +30,49 @@ class LevelStats(BaseModel):
     has_valid_size: bool = Field(..., description="Whether the level size is valid.")
     has_visual_integrity: bool = Field(..., description="Whether the level has visual integrity.")
     is_playable: bool = Field(..., description="Whether the level is playable.")
-    actions: list = Field(..., description="List of actions taken by the agent during the simulation.")
+    timed_out: bool = Field(False, description="Whether the simulation of the level was killed by the timeout.")
+    simulation_failed: bool = Field(False, description="Whether the simulation process of the level failed every time it was launched.")
+    actions: np.ndarray = Field(..., description="Actions taken by the agent during the simulation, encoded as small integers.")
     characteristics: dict = Field(..., description="The characteristics to measure in the level.")
 
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @field_validator("actions", mode="before")
+    @classmethod
+    def encode_actions(cls, value):
+        return parse_actions(value)
+
+    @field_serializer("actions")
+    def serialize_actions(self, actions):
+        return run_length_encode(actions)
+
+    # Parsed level, kept in memory (but not saved) when the level has been evaluated in this run
+    _grid = PrivateAttr(default=None)
+
+    @property
+    def grid(self):
+        return self._grid
+
+    @grid.setter
+    def grid(self, grid):
+        self._grid = grid
+
+    @property
+    def flat_level(self) -> str:
+        """
+        The level without newlines.
+        """
+        if self._grid is not None:
+            return self._grid.flat
+        return "".join(self.level.splitlines())
+
+    @property
+    def simulation_completed(self) -> bool:
+        """
+        Whether the simulation of the level (if it was simulated) neither timed out nor failed.
+        """
+        return not self.timed_out and not self.simulation_failed
+
     @property
     def is_valid(self) -> bool:
         return (
@@ -0,0 +1,317 @@
+import numpy as np
+import pandas as pd
+
+from stats.level_stats import LevelStats
+from stats.action_sequences import encode_actions, run_length_encode
+
+FLAG_COLUMNS = ["has_valid_characters", "has_valid_size", "has_visual_integrity", "is_playable", "timed_out", "simulation_failed"]
+
+class Column:
+    """
+    Growable NumPy array (amortized appends), whose rows can have a fixed shape.
+    """
+    def __init__(self, dtype, row_shape=(), fill_value=0):
+        self.fill_value = fill_value
+        self.data = np.full((16,) + tuple(row_shape), fill_value, dtype=dtype)
+        self.size = 0
+
+    @classmethod
+    def from_values(cls, values, fill_value=0):
+        column = cls(values.dtype, values.shape[1:], fill_value)
+        column.data = np.array(values)
+        column.size = len(values)
+        return column
+
+    @property
+    def values(self):
+        return self.data[:self.size]
+
+    def reserve(self, size):
+        if size > len(self.data):
+            data = np.full((max(size, 2 * len(self.data)),) + self.data.shape[1:], self.fill_value, dtype=self.data.dtype)
+            data[:self.size] = self.values
+            self.data = data
+
+    def extend(self, values):
+        values = np.asarray(values)
+
+        # Promote the type if the new values do not fit in it (e.g. actions above 255)
+        if values.dtype != self.data.dtype and np.result_type(self.data.dtype, values.dtype) != self.data.dtype:
+            self.data = self.data.astype(np.result_type(self.data.dtype, values.dtype))
+
+        self.reserve(self.size + len(values))
+        self.data[self.size:self.size + len(values)] = values
+        self.size += len(values)
+
+    def append(self, value):
+        self.reserve(self.size + 1)
+        self.data[self.size] = value
+        self.size += 1
+
+    def add_columns(self, n_columns):
+        data = np.full(self.data.shape[:1] + (self.data.shape[1] + n_columns,), self.fill_value, dtype=self.data.dtype)
+        data[:, :self.data.shape[1]] = self.data
+        self.data = data
+
+class LevelStatsRow:
+    """
+    Lightweight view of a row of a LevelStatsTable, with the same attributes as LevelStats.
+    """
+    __slots__ = ("table", "index")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def level_name(self):
+        return self.table.level_names[self.index]
+
+    @property
+    def level(self):
+        return self.table.level(self.index)
+
+    @property
+    def has_valid_characters(self):
+        return bool(self.table.flags["has_valid_characters"].values[self.index])
+
+    @property
+    def has_valid_size(self):
+        return bool(self.table.flags["has_valid_size"].values[self.index])
+
+    @property
+    def has_visual_integrity(self):
+        return bool(self.table.flags["has_visual_integrity"].values[self.index])
+
+    @property
+    def is_playable(self):
+        return bool(self.table.flags["is_playable"].values[self.index])
+
+    @property
+    def timed_out(self):
+        return bool(self.table.flags["timed_out"].values[self.index])
+
+    @property
+    def simulation_failed(self):
+        return bool(self.table.flags["simulation_failed"].values[self.index])
+
+    @property
+    def simulation_completed(self):
+        return not self.timed_out and not self.simulation_failed
+
+    @property
+    def is_valid(self):
+        return bool(self.table.is_valid[self.index])
+
+    @property
+    def actions(self):
+        return self.table.actions(self.index)
+
+    @property
+    def characteristics(self):
+        return self.table.row_characteristics(self.index)
+
+    @characteristics.setter
+    def characteristics(self, characteristics):
+        self.table.set_characteristics(self.index, characteristics)
+
+    @property
+    def flat_level(self):
+        return "".join(self.level.splitlines())
+
+    @property
+    def grid(self):
+        return None
+
+    def to_level_stats(self):
+        return LevelStats.model_construct(
+            level_name = self.level_name,
+            level = self.level,
+            has_valid_characters = self.has_valid_characters,
+            has_valid_size = self.has_valid_size,
+            has_visual_integrity = self.has_visual_integrity,
+            is_playable = self.is_playable,
+            timed_out = self.timed_out,
+            simulation_failed = self.simulation_failed,
+            actions = self.actions,
+            characteristics = self.characteristics,
+        )
+
+    def model_dump(self):
+        return self.to_level_stats().model_dump()
+
+class LevelStatsTable:
+    """
+    Columnar storage of the stats of a set of levels.
+
+    The validity flags are boolean columns, the characteristics a float matrix (one column per characteristic, with
+    a mask of the values that are present), and the level strings and the actions are packed into buffers with the
+    offsets of every level. Aggregate metrics are computed with array operations, and iterating over the table
+    yields LevelStatsRow views that behave as LevelStats.
+    """
+    def __init__(self):
+        self.level_names = []
+        self.levels_data = Column(np.uint8)
+        self.levels_offsets = Column(np.int64)
+        self.levels_offsets.append(0)
+        self.actions_data = Column(np.uint8)
+        self.actions_offsets = Column(np.int64)
+        self.actions_offsets.append(0)
+        self.flags = {column: Column(bool) for column in FLAG_COLUMNS}
+        self.characteristic_names = []
+        self.characteristics_values = Column(np.float64, (0,), np.nan)
+        self.characteristics_present = Column(bool, (0,), False)
+
+    @classmethod
+    def from_columns(cls, level_names, levels_data, levels_offsets, actions_data, actions_offsets, flags, characteristic_names, characteristics_values, characteristics_present):
+        """
+        Builds a table from its columns (e.g. loaded from a file) without processing each level.
+        """
+        table = cls()
+        table.level_names = list(level_names)
+        table.levels_data = Column.from_values(levels_data)
+        table.levels_offsets = Column.from_values(levels_offsets)
+        table.actions_data = Column.from_values(actions_data)
+        table.actions_offsets = Column.from_values(actions_offsets)
+        table.flags = {column: Column.from_values(np.asarray(flags[column], dtype=bool)) for column in FLAG_COLUMNS}
+        table.characteristic_names = list(characteristic_names)
+        # The number of names is needed to reshape the matrices of tables without levels
+        shape = (len(table.level_names), len(table.characteristic_names))
+        table.characteristics_values = Column.from_values(np.asarray(characteristics_values, dtype=np.float64).reshape(shape), np.nan)
+        table.characteristics_present = Column.from_values(np.asarray(characteristics_present, dtype=bool).reshape(shape), False)
+        return table
+
+    def __len__(self):
+        return len(self.level_names)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("LevelStatsTable index out of range")
+        return LevelStatsRow(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield LevelStatsRow(self, index)
+
+    def append(self, level_stats):
+        """
+        Adds a level (a LevelStats or a row of another table).
+        """
+        self.level_names.append(level_stats.level_name)
+
+        self.levels_data.extend(np.frombuffer(level_stats.level.encode("utf-8"), dtype=np.uint8))
+        self.levels_offsets.append(self.levels_data.size)
+
+        self.actions_data.extend(encode_actions(level_stats.actions))
+        self.actions_offsets.append(self.actions_data.size)
+
+        for column in FLAG_COLUMNS:
+            self.flags[column].append(getattr(level_stats, column))
+
+        self.characteristics_values.append(np.nan)
+        self.characteristics_present.append(False)
+        self.set_characteristics(len(self) - 1, level_stats.characteristics)
+
+    def extend(self, levels_stats):
+        for level_stats in levels_stats:
+            self.append(level_stats)
+
+    def level(self, index):
+        offsets = self.levels_offsets.values
+        return self.levels_data.values[offsets[index]:offsets[index + 1]].tobytes().decode("utf-8")
+
+    def levels(self, mask=None):
+        """
+        Decodes the level strings (only those selected by the boolean mask, if given).
+        """
+        indices = range(len(self)) if mask is None else np.flatnonzero(mask)
+        buffer = self.levels_data.values.tobytes()
+        offsets = self.levels_offsets.values
+        return [buffer[offsets[i]:offsets[i + 1]].decode("utf-8") for i in indices]
+
+    def flat_levels(self, mask=None):
+        return ["".join(level.splitlines()) for level in self.levels(mask)]
+
+    def actions(self, index):
+        offsets = self.actions_offsets.values
+        return self.actions_data.values[offsets[index]:offsets[index + 1]].copy()
+
+    def actions_list(self, mask=None):
+        """
+        The actions of every level (only those selected by the boolean mask, if given).
+        """
+        indices = range(len(self)) if mask is None else np.flatnonzero(mask)
+        data = self.actions_data.values
+        offsets = self.actions_offsets.values
+        return [data[offsets[i]:offsets[i + 1]] for i in indices]
+
+    def flag(self, column):
+        return self.flags[column].values
+
+    @property
+    def has_visual_bugs(self):
+        return ~(self.flag("has_valid_characters") & self.flag("has_valid_size") & self.flag("has_visual_integrity"))
+
+    @property
+    def is_valid(self):
+        return ~self.has_visual_bugs & self.flag("is_playable")
+
+    def characteristics_matrix(self):
+        """
+        Returns the names of the characteristics, the (n_levels, n_characteristics) matrix of values and the mask of
+        the values that are present.
+        """
+        return self.characteristic_names, self.characteristics_values.values, self.characteristics_present.values
+
+    def add_characteristic(self, name):
+        self.characteristic_names.append(name)
+        self.characteristics_values.add_columns(1)
+        self.characteristics_present.add_columns(1)
+        return len(self.characteristic_names) - 1
+
+    def set_characteristics(self, index, characteristics):
+        self.characteristics_values.values[index] = np.nan
+        self.characteristics_present.values[index] = False
+
+        for name, value in characteristics.items():
+            column = self.characteristic_names.index(name) if name in self.characteristic_names else self.add_characteristic(name)
+            self.characteristics_values.values[index, column] = value
+            self.characteristics_present.values[index, column] = True
+
+    def row_characteristics(self, index):
+        values = self.characteristics_values.values[index].tolist()
+        present = self.characteristics_present.values[index]
+        return {name: values[column] for column, name in enumerate(self.characteristic_names) if present[column]}
+
+    def normalize_characteristics(self, min_values, max_values):
+        """
+        Min-max normalization of the characteristics, with the same behaviour as normalizing the dictionaries of
+        the levels one by one: characteristics whose minimum and maximum are equal are set to 0 in every level.
+        """
+        names, values, present = self.characteristics_matrix()
+
+        for name in min_values.keys():
+            min_value = min_values[name]
+            max_value = max_values[name]
+            column = names.index(name) if name in names else self.add_characteristic(name)
+            names, values, present = self.characteristics_matrix()
+
+            if min_value == max_value:
+                values[:, column] = 0
+                present[:, column] = True
+            else:
+                levels_with_characteristics = present.any(axis=1)
+                values[levels_with_characteristics, column] = (values[levels_with_characteristics, column] - min_value) / (max_value - min_value)
+
+    def to_dataframe(self):
+        """
+        The table with one row per level and the same columns as the CSV stats files.
+        """
+        data = {"level_name": self.level_names, "level": self.levels()}
+        for column in FLAG_COLUMNS:
+            data[column] = self.flag(column)
+        data["actions"] = [run_length_encode(actions) for actions in self.actions_list()]
+        data["characteristics"] = [self.row_characteristics(i) for i in range(len(self))]
+        return pd.DataFrame(data)
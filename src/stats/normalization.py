@@ -0,0 +1,166 @@
+import os
+import numpy as np
+
+from stats.generator_stats import GeneratorStats
+from stats.stats_storage import load_stats_npz_characteristics
+
+def stack_characteristics(matrices):
+    """
+    Stacks the characteristics of several sets of levels into one matrix, aligning them by name.
+
+    Args:
+        matrices (list): (names, values, present) tuples, as returned by LevelStatsTable.characteristics_matrix.
+
+    Returns:
+        tuple: The names of the characteristics and the (n_levels, n_characteristics) matrix, with NaN for the
+        values that are not present.
+    """
+    names = []
+    for matrix_names, _, _ in matrices:
+        for name in matrix_names:
+            if name not in names:
+                names.append(name)
+
+    n_levels = sum(len(values) for _, values, _ in matrices)
+    stacked = np.full((n_levels, len(names)), np.nan)
+
+    start = 0
+    for matrix_names, values, present in matrices:
+        columns = [names.index(name) for name in matrix_names]
+        stacked[start:start + len(values), columns] = np.where(present, values, np.nan)
+        start += len(values)
+
+    return names, stacked
+
+def characteristic_ranges(matrices):
+    """
+    Minimum and maximum of every characteristic over several sets of levels (ignoring NaN values).
+
+    Args:
+        matrices (list): (names, values, present) tuples, as returned by LevelStatsTable.characteristics_matrix.
+
+    Returns:
+        tuple: Two dictionaries with the minimum and the maximum of every characteristic.
+    """
+    names, stacked = stack_characteristics(matrices)
+    has_values = ~np.isnan(stacked).all(axis=0)
+
+    min_values = {}
+    max_values = {}
+    if has_values.any():
+        column_min = np.nanmin(stacked[:, has_values], axis=0)
+        column_max = np.nanmax(stacked[:, has_values], axis=0)
+
+        for name, min_value, max_value in zip(np.array(names, dtype=object)[has_values], column_min, column_max):
+            min_values[name] = min_value.item()
+            max_values[name] = max_value.item()
+
+    return min_values, max_values
+
+def merge_ranges(ranges):
+    """
+    Combines the (min_values, max_values) dictionaries of several sets of levels.
+    """
+    min_values = {}
+    max_values = {}
+    for set_min_values, set_max_values in ranges:
+        for name, value in set_min_values.items():
+            if name not in min_values or value < min_values[name]:
+                min_values[name] = value
+        for name, value in set_max_values.items():
+            if name not in max_values or value > max_values[name]:
+                max_values[name] = value
+    return min_values, max_values
+
+def diversity_ranges(all_stats):
+    """
+    Minimum and maximum of the content diversity, the A* diversity and the coverage of the generators.
+    """
+    values = np.array([[generator_stats.content_diversity, generator_stats.a_star_diversity, generator_stats.coverage] for generator_stats in all_stats], dtype=float)
+    min_values = values.min(axis=0)
+    max_values = values.max(axis=0)
+    return min_values[0], max_values[0], min_values[1], max_values[1], min_values[2], max_values[2]
+
+def normalize_generators(all_stats, output_folder_intermediate_stats, output_folder_final_stats, formats, coverage_resolutions=None):
+    """
+    Normalizes the characteristics of the levels of every generator (computing the ranges of all of them at once),
+    computes the coverage, normalizes the diversity values and saves the intermediate and final stats.
+
+    Args:
+        coverage_resolutions (list): Other numbers of intervals per dimension for which the coverage is computed
+        (see GeneratorStats.compute_coverage).
+    """
+    min_values, max_values = characteristic_ranges([generator_stats.levels_stats.characteristics_matrix() for generator_stats in all_stats])
+
+    # Normalize the generators stats except the diversity values and compute the coverage
+    for generator_stats in all_stats:
+        generator_stats.normalize_characteristics(min_values, max_values)
+        generator_stats.compute_coverage(coverage_resolutions)
+        generator_stats.save(output_folder_intermediate_stats, "_intermediate_stats", formats)
+
+    # Normalize the diversity values and save the normalized stats
+    ranges = diversity_ranges(all_stats)
+    for generator_stats in all_stats:
+        generator_stats.normalize_diversity(*ranges)
+        generator_stats.save(output_folder_final_stats, "_final_stats", formats)
+
+def read_characteristics(stats_file, parallelization, max_workers):
+    """
+    Reads the characteristics matrix of a stats file, or None if the generator is ignored. Only the characteristics
+    are read from .npz files.
+    """
+    if stats_file.endswith(".npz"):
+        return load_stats_npz_characteristics(stats_file)
+
+    generator_stats = GeneratorStats(stats_file, parallelization, max_workers)
+    return None if generator_stats.ignore else generator_stats.levels_stats.characteristics_matrix()
+
+def stream_normalization(stats_files, output_folder_intermediate_stats, output_folder_final_stats, formats, parallelization, max_workers, coverage_resolutions=None):
+    """
+    Same as normalize_generators, for stats files that do not fit in memory at once. Only one generator is loaded
+    at a time:
+     1. The ranges of the characteristics are computed from the characteristics of every file.
+     2. Every generator is normalized, its coverage is computed and its intermediate stats are saved.
+     3. The diversity values are normalized with the metrics of the generators and the final stats are saved,
+        reloading the intermediate stats of each generator.
+
+    Returns:
+        list: The GeneratorStats of every generator, without the stats of their levels (see release_levels).
+    """
+    # Pass 1: ranges of the characteristics
+    ranges = []
+    for stats_file in stats_files:
+        matrix = read_characteristics(stats_file, parallelization, max_workers)
+        if matrix is not None:
+            ranges.append(characteristic_ranges([matrix]))
+
+    min_values, max_values = merge_ranges(ranges)
+
+    # Pass 2: normalized characteristics and coverage
+    all_stats = []
+    intermediate_files = []
+    intermediate_format = "npz" if "npz" in formats else "csv"
+    for stats_file in stats_files:
+        generator_stats = GeneratorStats(stats_file, parallelization, max_workers)
+
+        if generator_stats.ignore:
+            continue
+
+        generator_stats.normalize_characteristics(min_values, max_values)
+        generator_stats.compute_coverage(coverage_resolutions)
+        generator_stats.save(output_folder_intermediate_stats, "_intermediate_stats", formats)
+        generator_stats.release_levels()
+
+        all_stats.append(generator_stats)
+        intermediate_files.append(os.path.join(output_folder_intermediate_stats, generator_stats.generator_name + "_intermediate_stats." + intermediate_format))
+
+    # Pass 3: normalized diversity values
+    ranges = diversity_ranges(all_stats)
+    for generator_stats, intermediate_file in zip(all_stats, intermediate_files):
+        generator_stats.normalize_diversity(*ranges)
+
+        final_stats = GeneratorStats(intermediate_file, parallelization, max_workers)
+        final_stats.normalize_diversity(*ranges)
+        final_stats.save(output_folder_final_stats, "_final_stats", formats)
+
+    return all_stats
@@ -0,0 +1,389 @@
+import os
+import math
+import shutil
+import tempfile
+import threading
+import numpy as np
+import Levenshtein
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+from stats.diversity_estimation import DiversityEstimate, confidence_interval
+from stats.action_sequences import actions_to_string
+
+def condensed_size(n):
+    """
+    Number of pairs (i, j) with i < j among n sequences.
+    """
+    return n * (n - 1) // 2
+
+def condensed_offset(i, n):
+    """
+    Position of the pair (i, i + 1) in a condensed distance matrix of n sequences (same layout as scipy.spatial.distance.pdist).
+    """
+    return i * n - i * (i + 1) // 2
+
+def condensed_count(size):
+    """
+    Number of sequences of a condensed distance matrix with the given number of pairs.
+    """
+    n = int(round((1 + math.sqrt(1 + 8 * size)) / 2))
+    if condensed_size(n) != size:
+        raise ValueError(f"{size} is not the size of a condensed distance matrix.")
+    return n
+
+def row_pair_counts(n, first_column=0):
+    """
+    Number of pairs computed in each row of the upper triangle when only the columns from first_column are computed.
+    """
+    return n - np.maximum(np.arange(n) + 1, first_column)
+
+def reindex_condensed(condensed, indices):
+    """
+    Builds the condensed distance matrix of the sequences indices[0], indices[1], ... from the condensed distance
+    matrix of a set that contains them. Repeated indices are the same sequence, so their distance is 0.
+
+    Args:
+        condensed (np.ndarray): Condensed distance matrix of the original set.
+        indices (np.ndarray): Position in the original set of each sequence of the new set.
+
+    Returns:
+        np.ndarray: Condensed distance matrix (int64) of the new set.
+    """
+    n_original = condensed_count(len(condensed))
+    indices = np.asarray(indices, dtype=np.int64)
+    n = len(indices)
+    reindexed = np.empty(condensed_size(n), dtype=np.int64)
+
+    # One row at a time, so no array of every pair is created
+    for a in range(n - 1):
+        low = np.minimum(indices[a], indices[a + 1:])
+        high = np.maximum(indices[a], indices[a + 1:])
+        same = low == high
+        positions = low * n_original - low * (low + 1) // 2 + high - low - 1
+
+        # Only the pairs of different sequences are looked up (with a single original sequence there is nothing to
+        # look up, as the original matrix is empty)
+        row = np.zeros(len(positions), dtype=np.int64)
+        row[~same] = condensed[positions[~same]]
+
+        offset = condensed_offset(a, n)
+        reindexed[offset:offset + len(row)] = row
+
+    return reindexed
+
+def encode_sequences(sequences):
+    """
+    Converts the sequences into strings, so the distances are computed with the fast string implementation.
+    Strings are kept as they are and integer arrays (e.g. encoded actions) use one character per integer. Other
+    sequences are dictionary-encoded, one character per distinct item. Both keep the Levenshtein distances unchanged.
+    """
+    codes = {}
+
+    def to_character(item):
+        if item not in codes:
+            code = len(codes)
+            codes[item] = chr(code if code < 0xD800 else code + 0x800)  # Skip the surrogates, which cannot be encoded
+        return codes[item]
+
+    def to_string(sequence):
+        if isinstance(sequence, str):
+            return sequence
+        if isinstance(sequence, np.ndarray) and sequence.dtype.kind in "iu":
+            return actions_to_string(sequence)
+        return "".join(to_character(item) for item in sequence)
+
+    return [to_string(sequence) for sequence in sequences]
+
+def compute_rows(sequences, start, stop, first_column=0):
+    """
+    Distances of the rows [start, stop) of the upper triangle, in condensed order.
+    Only the columns from first_column are computed.
+    """
+    n = len(sequences)
+    distances = np.empty(int(row_pair_counts(n, first_column)[start:stop].sum()), dtype=np.int64)
+
+    position = 0
+    for i in range(start, stop):
+        a = sequences[i]
+        row = [Levenshtein.distance(a, b) for b in sequences[max(i + 1, first_column):]]
+        distances[position:position + len(row)] = row
+        position += len(row)
+
+    return distances
+
+# Sequences loaded by each worker process, so they are only read once per computation
+_worker_sequences = {}
+
+def load_sequences(path):
+    if path not in _worker_sequences:
+        _worker_sequences.clear()
+
+        codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+        offsets = np.load(os.path.join(path, "offsets.npy"))
+
+        _worker_sequences[path] = [codes[offsets[i]:offsets[i + 1]].tobytes().decode("utf-32-le") for i in range(len(offsets) - 1)]
+
+    return _worker_sequences[path]
+
+def compute_shared_rows(path, start, stop, first_column=0):
+    return start, compute_rows(load_sequences(path), start, stop, first_column)
+
+def compute_pairs(sequences, first, second):
+    return np.array([Levenshtein.distance(sequences[i], sequences[j]) for i, j in zip(first, second)], dtype=np.int64)
+
+def compute_shared_pairs(path, first, second):
+    return compute_pairs(load_sequences(path), first, second)
+
+class PairwiseDistanceEngine:
+    """
+    Computes condensed Levenshtein distance matrices with a persistent pool of worker processes.
+
+    The sequences of each computation are written once to a memory-mapped file shared by every worker (instead of
+    pickling two sequences per pair), and each task computes a block of rows of the upper triangle, so the list of
+    pairs is never created. The same pool is reused for every computation until the engine is closed, and several
+    threads can run computations at the same time (e.g. the diversity of different sets of levels).
+
+    Args:
+        workers (int): Number of worker processes (None to use every core, 1 to compute in this process).
+    """
+    def __init__(self, workers=None):
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.executor = None
+        self.temp_dir = None
+        self.n_computations = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+        if self.temp_dir is not None:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            self.temp_dir = None
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self.executor
+
+    def share_sequences(self, sequences):
+        with self.lock:
+            if self.temp_dir is None:
+                self.temp_dir = tempfile.mkdtemp(prefix="pairwise_distances_")
+
+            path = os.path.join(self.temp_dir, str(self.n_computations))
+            os.makedirs(path)
+            self.n_computations += 1
+
+        data = [np.frombuffer(sequence.encode("utf-32-le"), dtype=np.uint32) for sequence in sequences]
+        offsets = np.zeros(len(data) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(codes) for codes in data])
+
+        np.save(os.path.join(path, "codes.npy"), np.concatenate(data) if data else np.zeros(0, dtype=np.uint32))
+        np.save(os.path.join(path, "offsets.npy"), offsets)
+
+        return path
+
+    def row_blocks(self, n, first_column=0):
+        # Blocks with a similar number of pairs, several per worker so the load is balanced
+        counts = row_pair_counts(n, first_column)
+        pairs_per_block = max(1, int(counts.sum()) // (self.workers * 8))
+
+        blocks = []
+        start = 0
+        block_pairs = 0
+        for i, count in enumerate(counts):
+            block_pairs += count
+            if block_pairs >= pairs_per_block or i == n - 1:
+                if block_pairs > 0:
+                    blocks.append((start, i + 1))
+                start = i + 1
+                block_pairs = 0
+
+        return blocks
+
+    def pairwise_levenshtein(self, sequences, desc=None, known_distances=None):
+        """
+        Computes the Levenshtein distance between every pair of sequences.
+
+        Args:
+            sequences (list): Strings, or lists of hashable items (e.g. actions).
+            desc (str): Description of the progress bar (no progress bar if None).
+            known_distances (np.ndarray): Condensed distance matrix of the first sequences, if it is already known.
+                Only the pairs that involve the rest of the sequences are computed.
+
+        Returns:
+            np.ndarray: Condensed distance matrix (int64), with the distance of the pair (i, j), i < j, at
+            condensed_offset(i, n) + (j - i - 1).
+        """
+        n = len(sequences)
+        sequences = encode_sequences(sequences)
+        condensed = np.empty(condensed_size(n), dtype=np.int64)
+
+        if n < 2:
+            return condensed
+
+        n_known = 0
+        if known_distances is not None:
+            n_known = condensed_count(len(known_distances))
+            if n_known > n:
+                raise ValueError("There are more known distances than pairs of sequences.")
+            if n_known > 1:
+                # Rows of known sequences: the known columns are copied, the rest are computed
+                for i in range(n_known - 1):
+                    known_offset = condensed_offset(i, n_known)
+                    offset = condensed_offset(i, n)
+                    condensed[offset:offset + n_known - i - 1] = known_distances[known_offset:known_offset + n_known - i - 1]
+
+        counts = row_pair_counts(n, n_known)
+
+        def store_rows(start, distances):
+            position = 0
+            for i in range(start, n):
+                if position == len(distances):
+                    break
+                offset = condensed_offset(i, n) + max(i + 1, n_known) - i - 1
+                condensed[offset:offset + counts[i]] = distances[position:position + counts[i]]
+                position += counts[i]
+
+        progress_bar = tqdm(total=int(counts.sum()), desc=desc, ncols=80) if desc is not None else None
+
+        if self.workers == 1:
+            for start, stop in self.row_blocks(n, n_known):
+                distances = compute_rows(sequences, start, stop, n_known)
+                store_rows(start, distances)
+
+                if progress_bar is not None:
+                    progress_bar.update(len(distances))
+        else:
+            executor = self.get_executor()
+            path = self.share_sequences(sequences)
+
+            try:
+                futures = [executor.submit(compute_shared_rows, path, start, stop, n_known) for start, stop in self.row_blocks(n, n_known)]
+
+                for future in as_completed(futures):
+                    start, distances = future.result()
+                    store_rows(start, distances)
+
+                    if progress_bar is not None:
+                        progress_bar.update(len(distances))
+            finally:
+                shutil.rmtree(path, ignore_errors=True)
+
+        if progress_bar is not None:
+            progress_bar.close()
+
+        return condensed
+
+    def estimate_mean_levenshtein(self, sequences, max_pairs=None, ci_width=None, confidence=0.95, seed=None, batch_size=1000, desc=None):
+        """
+        Estimates the mean Levenshtein distance between the pairs of sequences from random pairs.
+
+        Pairs are drawn in batches until max_pairs have been used or the confidence interval is narrower than
+        ci_width. Without max_pairs, pairs are drawn until the interval is narrow enough (or, if neither is given, the
+        exact mean is computed). If as many pairs as the set has would be needed, the exact mean is computed instead.
+
+        Args:
+            sequences (list): Strings, or lists of hashable items (e.g. actions).
+            max_pairs (int): Maximum number of random pairs (no limit if None and ci_width is given).
+            ci_width (float): Width of the confidence interval at which the sampling stops.
+            confidence (float): Confidence level of the interval.
+            seed (int): Seed of the random pairs.
+            batch_size (int): Number of pairs drawn between two checks of the confidence interval.
+            desc (str): Description of the progress bar (no progress bar if None).
+
+        Returns:
+            DiversityEstimate: The estimated mean, the number of pairs used and the confidence interval.
+        """
+        n = len(sequences)
+        n_total_pairs = condensed_size(n)
+
+        if max_pairs is None and ci_width is None:
+            max_pairs = n_total_pairs
+
+        if (max_pairs is not None and max_pairs >= n_total_pairs) or n_total_pairs == 0:
+            return self.exact_mean_levenshtein(sequences, desc)
+
+        original_sequences = sequences
+        sequences = encode_sequences(sequences)
+        rng = np.random.default_rng(seed)
+        path = self.share_sequences(sequences) if self.workers != 1 else None
+        executor = self.get_executor() if path is not None else None
+
+        count = 0
+        total = 0.0
+        total_squares = 0.0
+        progress_bar = tqdm(total=max_pairs, desc=desc, ncols=80) if desc is not None else None
+
+        try:
+            while max_pairs is None or count < max_pairs:
+                # Drawing as many random pairs as the set has is more expensive than computing every pair
+                if max_pairs is None and count >= n_total_pairs:
+                    break
+
+                size = batch_size if max_pairs is None else min(batch_size, max_pairs - count)
+
+                # Uniform random pairs of different sequences
+                first = rng.integers(0, n, size)
+                second = rng.integers(0, n - 1, size)
+                second += second >= first
+
+                if path is None:
+                    distances = compute_pairs(sequences, first, second)
+                else:
+                    chunks = np.array_split(np.arange(size), self.workers)
+                    futures = [executor.submit(compute_shared_pairs, path, first[chunk], second[chunk]) for chunk in chunks if len(chunk) > 0]
+                    distances = np.concatenate([future.result() for future in futures])
+
+                count += size
+                total += float(distances.sum())
+                total_squares += float((distances.astype(float) ** 2).sum())
+
+                if progress_bar is not None:
+                    progress_bar.update(size)
+
+                mean, ci = confidence_interval(count, total, total_squares, confidence)
+
+                if ci_width is not None and ci[1] - ci[0] <= ci_width:
+                    break
+        finally:
+            if path is not None:
+                shutil.rmtree(path, ignore_errors=True)
+
+            if progress_bar is not None:
+                progress_bar.close()
+
+        if max_pairs is None and ci[1] - ci[0] > ci_width:
+            return self.exact_mean_levenshtein(original_sequences, desc)
+
+        return DiversityEstimate(value=mean, n_pairs=count, ci=ci)
+
+    def exact_mean_levenshtein(self, sequences, desc=None):
+        condensed = self.pairwise_levenshtein(sequences, desc)
+        return DiversityEstimate(value=mean_distance(condensed), n_pairs=len(condensed))
+
+def pairwise_levenshtein(sequences, workers=None, desc=None):
+    """
+    Computes the condensed Levenshtein distance matrix of the sequences with a temporary PairwiseDistanceEngine.
+    """
+    with PairwiseDistanceEngine(workers) as engine:
+        return engine.pairwise_levenshtein(sequences, desc)
+
+def mean_distance(condensed):
+    """
+    Mean of a condensed distance matrix (0 if there are no pairs).
+    """
+    if len(condensed) == 0:
+        return 0
+
+    return int(condensed.sum()) / len(condensed)
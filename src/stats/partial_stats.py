@@ -0,0 +1,70 @@
+import os
+import ast
+import pandas as pd
+
+from stats.level_stats import LevelStats
+from stats.level_stats_table import LevelStatsTable, FLAG_COLUMNS
+
+# Extension of the files with the stats of the levels of a set that is still being evaluated (not .csv, so they are
+# not loaded as the stats of a generator)
+PARTIAL_STATS_EXTENSION = ".partial"
+
+def partial_stats_path(output_folder, generator_name, suffix="_initial_stats"):
+    return os.path.join(output_folder, generator_name + suffix + PARTIAL_STATS_EXTENSION)
+
+class PartialStatsFile:
+    """
+    CSV file where the stats of the levels of a set are appended as they are evaluated (in the order of the files),
+    with the same columns as the CSV stats files. A run that stops in the middle of a set keeps the levels evaluated
+    so far, and the next evaluation of the set reuses them (see GeneratorStats.reusable_levels). The file is removed
+    once the stats of the set have been saved.
+
+    Args:
+        path (str): Path of the file (see partial_stats_path).
+    """
+    def __init__(self, path):
+        self.path = path
+        self.started = False
+
+    def load(self):
+        """
+        Returns the stats written by a previous run (LevelStatsTable), or None if there are none or they cannot be read.
+        """
+        if not os.path.exists(self.path):
+            return None
+
+        try:
+            df = pd.read_csv(self.path)
+        except (OSError, ValueError) as e:
+            print(f"WARNING: {self.path} could not be read: {e}. Its levels are evaluated again.")
+            return None
+
+        levels_stats = LevelStatsTable()
+        for _, row in df.iterrows():
+            levels_stats.append(LevelStats(
+                level_name = row["level_name"],
+                level = row["level"],
+                actions = row["actions"] if isinstance(row["actions"], str) else "", # Levels without actions are read as NaN
+                characteristics = ast.literal_eval(row["characteristics"]),
+                **{column: row[column] if column in df.columns else False for column in FLAG_COLUMNS}
+            ))
+
+        return levels_stats
+
+    def append(self, levels_stats):
+        """
+        Appends the stats of a batch of levels (LevelStats or rows of a LevelStatsTable). The first batch of a run
+        replaces the stats written by a previous one, which have been loaded before.
+        """
+        table = LevelStatsTable()
+        for level_stats in levels_stats:
+            table.append(level_stats)
+
+        with open(self.path, "a" if self.started else "w", newline="") as f:
+            table.to_dataframe().to_csv(f, header=not self.started, index=False)
+
+        self.started = True
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import resource
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import psutil
+
+# When True, the stages of the evaluation are timed (set by --profile)
+enabled = False
+
+# Seconds between two samples of the CPU time and the memory of a simulation process launched for a single level
+sample_interval = 0.05
+
+# Per-level costs written in the stats files: wall time and CPU time (of this process and of the simulation
+# process) of the evaluation of the level, CPU time of the simulation process and peak RSS of the simulation process
+COST_COLUMNS = ["evaluation_time", "evaluation_cpu_time", "simulation_cpu_time", "simulation_peak_rss_mb"]
+
+_local = threading.local()
+
+class StageTiming:
+    """
+    Wall and CPU time (of the thread) of a stage, available once the stage has finished.
+    """
+    __slots__ = ("wall_time", "cpu_time")
+
+    def __init__(self):
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+
+class Profile:
+    """
+    Wall and CPU time of every stage of the evaluation of a set of levels, and cost of the evaluation of each level.
+
+    Stages are nested (e.g. "level;simulation" is the simulation inside the evaluation of a level) and their times
+    are accumulated by every thread that runs them, so the time of a stage run by several threads at the same time
+    can be longer than the wall time of the whole evaluation. The CPU time is the one of the thread that runs the
+    stage (the CPU time of the simulation processes is recorded apart, per level).
+
+    Args:
+        name (str): Name of the profile (e.g. the name of the generator).
+    """
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.level_costs = {}
+        self.simulation_cpu_time = 0.0
+        self.simulation_peak_rss_mb = 0.0
+
+    def record(self, path, wall_time, cpu_time):
+        with self.lock:
+            stage = self.stages.setdefault(path, [0, 0.0, 0.0])
+            stage[0] += 1
+            stage[1] += wall_time
+            stage[2] += cpu_time
+
+    def add_level_cost(self, level_name, evaluation_time=0.0, evaluation_cpu_time=0.0, simulation_cpu_time=0.0, simulation_peak_rss_mb=0.0):
+        with self.lock:
+            cost = self.level_costs.setdefault(level_name, [0.0, 0.0, 0.0, 0.0])
+            cost[0] += evaluation_time
+            cost[1] += evaluation_cpu_time + simulation_cpu_time
+            cost[2] += simulation_cpu_time
+            cost[3] = max(cost[3], simulation_peak_rss_mb)
+
+            self.simulation_cpu_time += simulation_cpu_time
+            self.simulation_peak_rss_mb = max(self.simulation_peak_rss_mb, simulation_peak_rss_mb)
+
+    def level_costs_dataframe(self):
+        """
+        Costs of the levels evaluated in this run, with a "level_name" column and the COST_COLUMNS (None if no level
+        has been evaluated).
+        """
+        if not self.level_costs:
+            return None
+
+        with self.lock:
+            costs = np.array(list(self.level_costs.values()), dtype=np.float64).reshape(-1, len(COST_COLUMNS))
+            df = pd.DataFrame(costs, columns=COST_COLUMNS)
+            df.insert(0, "level_name", list(self.level_costs.keys()))
+
+        return df
+
+    def summary(self):
+        """
+        Summary of the profile as a dictionary that can be saved as JSON: the calls, wall time and CPU time of every
+        stage, statistics of the per-level costs and the memory used.
+        """
+        with self.lock:
+            stages = {path: {"calls": calls, "wall_time": wall_time, "cpu_time": cpu_time} for path, (calls, wall_time, cpu_time) in sorted(self.stages.items())}
+
+        summary = {
+            "name": self.name,
+            "wall_time": time.perf_counter() - self.start,
+            "stages": stages,
+            "simulation_cpu_time": self.simulation_cpu_time,
+            "simulation_peak_rss_mb": self.simulation_peak_rss_mb,
+            # ru_maxrss is in KB on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "rss_mb": psutil.Process(os.getpid()).memory_info().rss / 1024 ** 2,
+        }
+
+        costs = self.level_costs_dataframe()
+        if costs is not None:
+            summary["levels"] = {"count": len(costs)}
+            for column in COST_COLUMNS:
+                values = costs[column].to_numpy()
+                summary["levels"][column] = {"total": float(values.sum()), "mean": float(values.mean()), "p50": float(np.percentile(values, 50)), \
+                                             "p95": float(np.percentile(values, 95)), "max": float(values.max())}
+
+        return summary
+
+    def folded_stacks(self):
+        """
+        Lines in the folded stack format of flame graphs ("name;stage;substage microseconds"), with the wall time of
+        every stage that is not spent in its substages.
+        """
+        with self.lock:
+            wall_times = {path: wall_time for path, (_, wall_time, _) in self.stages.items()}
+
+        self_times = dict(wall_times)
+        for path, wall_time in wall_times.items():
+            parent = path.rpartition(";")[0]
+            if parent in self_times:
+                self_times[parent] -= wall_time
+
+        return [f"{self.name};{path} {max(0, round(self_time * 1e6))}" for path, self_time in sorted(self_times.items())]
+
+    def save(self, output_folder):
+        """
+        Saves the summary (<name>_profile.json) and the folded stacks (<name>_profile.folded) of the profile.
+        """
+        with open(os.path.join(output_folder, self.name + "_profile.json"), "w") as f:
+            json.dump(self.summary(), f, indent=4)
+
+        with open(os.path.join(output_folder, self.name + "_profile.folded"), "w") as f:
+            f.write("\n".join(self.folded_stacks()) + "\n")
+
+def current_profile():
+    return getattr(_local, "profile", None)
+
+@contextmanager
+def activate(profile):
+    """
+    Records the stages run by this thread inside the block in the profile (nothing is recorded if it is None).
+    """
+    previous_profile = current_profile()
+    _local.profile = profile
+    try:
+        yield profile
+    finally:
+        _local.profile = previous_profile
+
+@contextmanager
+def stage(name):
+    """
+    Records the wall and CPU time of the block as a stage of the active profile (nested in the stage that contains
+    it). Yields a StageTiming, filled when the block finishes.
+    """
+    timing = StageTiming()
+    profile = current_profile()
+
+    if profile is None:
+        yield timing
+        return
+
+    stack = getattr(_local, "stack", [])
+    _local.stack = stack + [name]
+    start_wall_time = time.perf_counter()
+    start_cpu_time = time.thread_time()
+
+    try:
+        yield timing
+    finally:
+        timing.wall_time = time.perf_counter() - start_wall_time
+        timing.cpu_time = time.thread_time() - start_cpu_time
+        profile.record(";".join(_local.stack), timing.wall_time, timing.cpu_time)
+        _local.stack = stack
+
+@contextmanager
+def level(profile, level_name):
+    """
+    Records the evaluation of a level in the profile: its stages (as substages of "level") and its cost, which
+    includes the usage of the simulation processes reported with record_simulation_usage.
+    """
+    if profile is None:
+        yield
+        return
+
+    previous = (current_profile(), getattr(_local, "stack", []), getattr(_local, "level_usage", None))
+    _local.profile = profile
+    _local.stack = []
+    _local.level_usage = [0.0, 0.0]
+
+    try:
+        with stage("level") as timing:
+            yield
+    finally:
+        simulation_cpu_time, simulation_peak_rss_mb = _local.level_usage
+        _local.profile, _local.stack, _local.level_usage = previous
+        profile.add_level_cost(level_name, timing.wall_time, timing.cpu_time, simulation_cpu_time, simulation_peak_rss_mb)
+
+def is_profiling_level():
+    return getattr(_local, "level_usage", None) is not None
+
+def record_simulation_usage(cpu_time, peak_rss_mb):
+    """
+    Adds the CPU time and the peak RSS of a simulation process to the level being evaluated by this thread.
+    """
+    usage = getattr(_local, "level_usage", None)
+    if usage is not None:
+        usage[0] += cpu_time
+        usage[1] = max(usage[1], peak_rss_mb)
@@ -0,0 +1,197 @@
+import re
+import atexit
+import asyncio
+import threading
+import psutil
+
+import stats.profiling as profiling
+
+# Maximum wall-clock time (in seconds) of the simulation of a level. None means no limit
+timeout = 300
+
+# Number of times a failed simulation process is launched again (timed out simulations are not retried)
+max_retries = 2
+
+# Seconds waited before the first retry, doubled at every new retry
+retry_backoff = 1.0
+
+# Memory (in MB) that all the simulation processes can reserve at the same time. None means 75% of the available RAM
+memory_budget_mb = None
+
+class SimulationTimeoutError(RuntimeError):
+    """
+    Raised when the simulation of a level takes longer than the timeout.
+    """
+    pass
+
+class SimulationProcessError(RuntimeError):
+    """
+    Raised when a simulation process fails every time it is launched.
+    """
+    pass
+
+def jvm_memory_mb(ram_limit):
+    """
+    Memory (in MB) reserved by a JVM launched with the given -Xmx option (e.g. "-Xmx512m").
+    """
+    match = re.fullmatch(r"-Xmx(\d+)([kKmMgG]?)", ram_limit)
+    if match is None:
+        raise ValueError(f"Invalid JVM memory limit: {ram_limit}")
+
+    value, unit = int(match.group(1)), match.group(2).lower()
+    return {"k": value / 1024, "m": value, "g": value * 1024, "": value / 1024 ** 2}[unit]
+
+def default_memory_budget_mb(max_ram_usage=0.75):
+    return psutil.virtual_memory().available * max_ram_usage / 1024 ** 2
+
+class SimulationOrchestrator:
+    """
+    Launches simulation processes from an asyncio event loop running in a background thread.
+
+    Every process reserves its memory (e.g. the -Xmx of a JVM) from a total budget before being launched, so the
+    number of processes running at the same time is limited by the memory they can use, not by the number of
+    threads. Processes that exceed the wall-clock timeout are killed, and processes that cannot be launched or exit
+    with an error are launched again after an exponential backoff.
+
+    The evaluation threads call run, which blocks until the result of the process is available.
+
+    Args:
+        memory_budget_mb (float): Memory (in MB) that all the processes can reserve at the same time.
+        timeout (float): Maximum wall-clock time (in seconds) of each process (no limit if None).
+        max_retries (int): Number of times a failed process is launched again.
+        retry_backoff (float): Seconds waited before the first retry, doubled at every new retry.
+    """
+    def __init__(self, memory_budget_mb, timeout=None, max_retries=2, retry_backoff=1.0):
+        self.memory_budget_mb = memory_budget_mb
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.memory_in_use_mb = 0
+        self.n_timeouts = 0
+        self.n_retries = 0
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="simulation-orchestrator", daemon=True)
+        self.thread.start()
+
+        # The condition belongs to the loop, so it is created inside it
+        self.memory_condition = asyncio.run_coroutine_threadsafe(self.create_condition(), self.loop).result()
+
+    async def create_condition(self):
+        return asyncio.Condition()
+
+    async def reserve_memory(self, memory_mb):
+        async with self.memory_condition:
+            # A process that needs more than the whole budget is launched alone
+            await self.memory_condition.wait_for(lambda: self.memory_in_use_mb == 0 or self.memory_in_use_mb + memory_mb <= self.memory_budget_mb)
+            self.memory_in_use_mb += memory_mb
+
+    async def free_memory(self, memory_mb):
+        async with self.memory_condition:
+            self.memory_in_use_mb -= memory_mb
+            self.memory_condition.notify_all()
+
+    async def monitor_process(self, pid, usage):
+        """
+        Samples the CPU time and the RSS of a process until it finishes, storing the last CPU time and the peak RSS
+        (in MB) in usage.
+        """
+        try:
+            process = psutil.Process(pid)
+            while True:
+                cpu_times = process.cpu_times()
+                usage["cpu_time"] = cpu_times.user + cpu_times.system
+                usage["peak_rss_mb"] = max(usage.get("peak_rss_mb", 0.0), process.memory_info().rss / 1024 ** 2)
+                await asyncio.sleep(profiling.sample_interval)
+        except psutil.Error:
+            pass # The process has finished
+
+    async def run_process(self, command, memory_mb, input=None, usage=None):
+        """
+        Runs a process until it succeeds, is killed by the timeout or fails max_retries + 1 times.
+        If a usage dictionary is given, the CPU time and the peak RSS of the last process are sampled into it.
+
+        Returns:
+            str: The standard output of the process.
+        """
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                self.n_retries += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+
+            await self.reserve_memory(memory_mb)
+            try:
+                try:
+                    process = await asyncio.create_subprocess_exec(*command, stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL, \
+                                                                   stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+                except OSError as e:
+                    error = f"Unable to launch the process: {e}"
+                    continue
+
+                monitor = asyncio.ensure_future(self.monitor_process(process.pid, usage)) if usage is not None else None
+
+                try:
+                    stdout, stderr = await asyncio.wait_for(process.communicate(input.encode() if input is not None else None), self.timeout)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                    self.n_timeouts += 1
+                    raise SimulationTimeoutError(f"Simulation killed after {self.timeout} seconds.")
+                finally:
+                    if monitor is not None:
+                        monitor.cancel()
+
+                if process.returncode == 0:
+                    return stdout.decode()
+
+                error = stderr.decode().strip() or f"Exit code {process.returncode}"
+            finally:
+                await self.free_memory(memory_mb)
+
+        raise SimulationProcessError(error)
+
+    def run(self, command, memory_mb, input=None):
+        """
+        Blocking version of run_process, to be called from any thread except the one of the event loop. If the thread
+        is evaluating a level with profiling, the usage of the process is added to the cost of the level.
+        """
+        if not profiling.is_profiling_level():
+            return asyncio.run_coroutine_threadsafe(self.run_process(command, memory_mb, input), self.loop).result()
+
+        usage = {}
+        try:
+            return asyncio.run_coroutine_threadsafe(self.run_process(command, memory_mb, input, usage), self.loop).result()
+        finally:
+            profiling.record_simulation_usage(usage.get("cpu_time", 0.0), usage.get("peak_rss_mb", 0.0))
+
+    def shutdown(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+_orchestrator = None
+_orchestrator_lock = threading.Lock()
+
+def get_orchestrator():
+    """
+    Returns the orchestrator shared by every simulation, creating it (with the settings of this module) the first time.
+    """
+    global _orchestrator
+
+    with _orchestrator_lock:
+        if _orchestrator is None:
+            budget = memory_budget_mb if memory_budget_mb is not None else default_memory_budget_mb()
+            _orchestrator = SimulationOrchestrator(budget, timeout, max_retries, retry_backoff)
+
+        return _orchestrator
+
+@atexit.register
+def shutdown_orchestrator():
+    global _orchestrator
+
+    with _orchestrator_lock:
+        orchestrator = _orchestrator
+        _orchestrator = None
+
+    if orchestrator is not None:
+        orchestrator.shutdown()
@@ -0,0 +1,124 @@
+import json
+import numpy as np
+import pandas as pd
+
+from stats.level_stats_table import LevelStatsTable, FLAG_COLUMNS
+from stats.profiling import COST_COLUMNS
+
+FORMAT_VERSION = 2
+
+def save_stats_npz(path, metadata, table, generation_times=None, level_costs=None):
+    """
+    Saves the stats of a set of levels as columns of a .npz file.
+
+    The metadata is stored as a JSON document and the columns of the LevelStatsTable as arrays: the flags as boolean
+    columns, the characteristics as a float matrix (with the mask of the values that are present), and the level
+    strings and the actions as packed buffers with the offsets of every level.
+
+    Args:
+        path (str): Path of the .npz file.
+        metadata (dict): Metadata of the set of levels (the same as the header of the CSV files).
+        table (LevelStatsTable): The stats of the levels.
+        generation_times (pd.DataFrame): Generation times, with "level_name" and "generation_time" columns.
+        level_costs (pd.DataFrame): Costs of the evaluation of the levels, with "level_name" and COST_COLUMNS columns.
+    """
+    characteristic_names, characteristics, characteristics_present = table.characteristics_matrix()
+
+    columns = {
+        "format_version": np.array(FORMAT_VERSION),
+        "metadata": np.array(json.dumps(metadata)),
+        "level_name": np.array(table.level_names, dtype=str),
+        "levels_data": table.levels_data.values,
+        "levels_offsets": table.levels_offsets.values,
+        "actions_data": table.actions_data.values,
+        "actions_offsets": table.actions_offsets.values,
+        "characteristic_names": np.array(characteristic_names, dtype=str),
+        "characteristics": characteristics,
+        "characteristics_present": characteristics_present,
+    }
+
+    for column in FLAG_COLUMNS:
+        columns[column] = table.flag(column)
+
+    if generation_times is not None:
+        columns["times_level_name"] = generation_times["level_name"].to_numpy(dtype=str)
+        columns["times_generation_time"] = generation_times["generation_time"].to_numpy()
+
+    if level_costs is not None:
+        columns["costs_level_name"] = level_costs["level_name"].to_numpy(dtype=str)
+        for column in COST_COLUMNS:
+            columns["costs_" + column] = level_costs[column].to_numpy(dtype=np.float64)
+
+    with open(path, "wb") as f:
+        np.savez(f, **columns)
+
+def load_stats_npz(path):
+    """
+    Loads a .npz file written by save_stats_npz.
+
+    Returns:
+        tuple: The metadata (dict), the stats of the levels (LevelStatsTable), the generation times and the costs of
+        the levels (pd.DataFrame, or None if they were not saved).
+    """
+    with np.load(path, allow_pickle=False) as data:
+        format_version = int(data["format_version"])
+        if format_version > FORMAT_VERSION:
+            raise ValueError(f"{path} was written by a newer version (format {format_version}).")
+
+        metadata = json.loads(str(data["metadata"]))
+        n_levels = len(data["level_name"])
+        characteristic_names = data["characteristic_names"].tolist()
+
+        if format_version == 1:
+            # Files of the first version only stored which levels have characteristics
+            characteristics_present = np.repeat(data["has_characteristics"][:, None], len(characteristic_names), axis=1)
+        else:
+            characteristics_present = data["characteristics_present"]
+
+        table = LevelStatsTable.from_columns(
+            level_names = data["level_name"].tolist(),
+            levels_data = data["levels_data"],
+            levels_offsets = data["levels_offsets"],
+            actions_data = data["actions_data"],
+            actions_offsets = data["actions_offsets"],
+            flags = {column: data[column] if column in data else np.zeros(n_levels, dtype=bool) for column in FLAG_COLUMNS}, # timed_out and simulation_failed are not present in older files
+            characteristic_names = characteristic_names,
+            # The number of names is needed to reshape the matrix of sets without levels
+            characteristics_values = data["characteristics"].reshape(n_levels, len(characteristic_names)),
+            characteristics_present = characteristics_present.reshape(n_levels, len(characteristic_names)),
+        )
+
+        generation_times = None
+        if "times_level_name" in data:
+            generation_times = pd.DataFrame({"level_name": data["times_level_name"], "generation_time": data["times_generation_time"]})
+
+        level_costs = None
+        if "costs_level_name" in data:
+            level_costs = pd.DataFrame({"level_name": data["costs_level_name"]} | {column: data["costs_" + column] for column in COST_COLUMNS})
+
+    return metadata, table, generation_times, level_costs
+
+def load_stats_npz_characteristics(path):
+    """
+    Loads only the characteristics of a .npz file written by save_stats_npz.
+
+    Returns:
+        tuple: The (names, values, present) characteristics matrix (see LevelStatsTable.characteristics_matrix), or
+        None if the generator is ignored.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        if json.loads(str(data["metadata"])).get("Ignore"):
+            return None
+
+        names = data["characteristic_names"].tolist()
+        n_levels = len(data["level_name"])
+
+        # The number of levels is needed to reshape the matrix of sets without characteristics (e.g. without valid levels)
+        values = data["characteristics"].reshape(n_levels, len(names))
+
+        if int(data["format_version"]) == 1:
+            present = np.repeat(data["has_characteristics"][:, None], len(names), axis=1)
+        else:
+            present = data["characteristics_present"].reshape(n_levels, len(names))
+
+    return names, values, present